@@ -0,0 +1,85 @@
+"""Micro-benchmark of `parse_steps` and `StepParser` against the regex implementation of `parse_steps`.
+
+For every input it times parsing the complete text once with each of them, and parsing it while it
+is streamed in small chunks: the regex parser has to re-parse the whole text received so far after
+every chunk, `StepParser` consumes each chunk once.
+
+Usage:
+    python -m benchmarks.bench_step_parser --chunk_size 4 --repeat 5
+"""
+import argparse
+import time
+from typing import Callable, Dict, List
+
+from src.step_parser import StepParser
+from src.utils import parse_steps, parse_steps_regex
+
+def evolved_output(num_steps: int, words: int = 40) -> str:
+    body = " ".join(f"word{i}" for i in range(words))
+    steps = [f"Step {i}:\n#Step Name {i}#\n{body}\n" for i in range(1, num_steps)]
+    steps.append(f"Step {num_steps}:\n#Finally Rewritten Instruction#\n{body}\n")
+    return "```Optimized Instruction\n" + "\n".join(steps) + "```\n\nThis rewrite adds constraints and an example."
+
+def inputs() -> Dict[str, str]:
+    return {
+        "typical (4 steps)": evolved_output(4),
+        "long (40 steps)": evolved_output(40),
+        "large (1000 steps)": evolved_output(1000),
+        # Names that never close: every marker is scanned for a closing '#'
+        "unclosed names": "```\n" + "".join(f"Step {i}: #name {i} " + "x " * 20 for i in range(2000)) + "\n```",
+        # Many runs of backticks and partial markers between real steps
+        "backticks and near-markers": "```\n" + "".join(f"Step {i}: `` ``` Step Step{i} Step {i}x: ```` " for i in range(2000)) + "\n```",
+        # Long digit runs that never become a marker
+        "digit runs": "Step 1: start " + "".join("Step " + "9" * 200 + " " for _ in range(500)),
+        "no steps": "word " * 20000,
+    }
+
+def best_of(repeat: int, function: Callable[[], object]) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def chunks_of(text: str, size: int) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def stream_regex(chunks: List[str]) -> None:
+    received = ""
+    for chunk in chunks:
+        received += chunk
+        parse_steps_regex(received)
+
+def whole_parser(text: str) -> None:
+    parser = StepParser(final_step=None)
+    parser.feed(text)
+    parser.steps()
+
+def stream_parser(chunks: List[str]) -> None:
+    parser = StepParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.steps()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parse_steps and StepParser against the regex parse_steps")
+    parser.add_argument("--chunk_size", type=int, default=4, help="Characters per streamed chunk (about one token)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions; the best is reported")
+    parser.add_argument("--max_streamed_chars", type=int, default=20_000, help="Skip the streaming regex timing for longer inputs, where it is quadratic")
+    args = parser.parse_args()
+
+    print(f"{'input':<28} {'chars':>8} {'steps':>6} {'regex (ms)':>11} {'parse_steps':>12} {'StepParser':>11} {'regex streamed':>15} {'parser streamed':>16}")
+    for name, text in inputs().items():
+        assert parse_steps(text) == parse_steps_regex(text), name
+        chunks = chunks_of(text, args.chunk_size)
+        full_regex = best_of(args.repeat, lambda: parse_steps_regex(text))
+        full_parse_steps = best_of(args.repeat, lambda: parse_steps(text))
+        full_parser = best_of(args.repeat, lambda: whole_parser(text))
+        streamed_parser = best_of(args.repeat, lambda: stream_parser(chunks))
+        streamed_regex = best_of(1, lambda: stream_regex(chunks)) if len(text) <= args.max_streamed_chars else None
+        print(f"{name:<28} {len(text):>8} {len(parse_steps(text)):>6} {full_regex * 1e3:>11.3f} {full_parse_steps * 1e3:>12.3f} {full_parser * 1e3:>11.3f} "
+              f"{'-' if streamed_regex is None else format(streamed_regex * 1e3, '.1f'):>15} {streamed_parser * 1e3:>16.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""Local OpenAI-compatible chat completions server for hermetic tests and benchmarks.
+
+The server answers `POST /v1/chat/completions` with canned responses chosen from the prompt, in the
+formats the pipeline expects: step-formatted rewrites and methods that `parse_steps` accepts,
+trajectory verdicts for the analyzer and plain answers for everything else. Latency and failures are
+drawn from configurable distributions so that throughput can be measured repeatably. `max_tokens`,
+`stop` and streamed (server-sent events) responses are supported.
+
+Usage:
+    python -m benchmarks.mock_server --port 8001 --latency lognormal:0.5,0.4 --error_rate 0.01
+    VLLM_BACKEND=http://127.0.0.1:8001/v1 python run_evol.py --generator vllm ...
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+CASE_REGEX = re.compile(r"^Case (\d+):", re.MULTILINE)
+INSTRUCTION_MARKER = "#Instruction#: "
+# Tokens as streamed: each word with the whitespace before it
+TOKEN_REGEX = re.compile(r"\s*\S+")
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Parse a latency distribution in seconds: `const:S`, `uniform:LOW,HIGH` or `lognormal:MEDIAN,SIGMA`."""
+    kind, _, args = spec.partition(":")
+    params = [float(value) for value in args.split(",")] if args else []
+    if kind == "const" and len(params) == 1:
+        return lambda rng: params[0]
+    if kind == "uniform" and len(params) == 2:
+        return lambda rng: rng.uniform(params[0], params[1])
+    if kind == "lognormal" and len(params) == 2:
+        mu = math.log(params[0])
+        return lambda rng: rng.lognormvariate(mu, params[1])
+    raise ValueError(f"Invalid latency distribution {spec!r}; expected const:S, uniform:LOW,HIGH or lognormal:MEDIAN,SIGMA")
+
+def count_tokens(text: str) -> int:
+    return len(text.split())
+
+def apply_limits(text: str, max_tokens: Optional[int], stop: Optional[List[str]]) -> Tuple[str, str]:
+    """Cut `text` at the first `stop` sequence and after `max_tokens` tokens, returning (text, finish_reason)."""
+    finish_reason = "stop"
+    positions = [text.find(sequence) for sequence in stop or [] if sequence and sequence in text]
+    if positions:
+        text = text[:min(positions)]
+    if max_tokens is not None:
+        tokens = TOKEN_REGEX.findall(text)
+        if len(tokens) > max_tokens:
+            text = "".join(tokens[:max_tokens])
+            finish_reason = "length"
+    return text, finish_reason
+
+class MockChatServer:
+    """OpenAI-compatible chat completions endpoint with synthetic latency, failures and outputs.
+
+    Each request waits `latency` (a distribution from `parse_latency`) plus `seconds_per_token` per
+    completion token. A fraction `straggler_rate` of requests is slowed down `straggler_factor` times.
+    `error_rate` of the requests fail with HTTP 500 and `rate_limit_rate` with HTTP 429 and a
+    Retry-After header. Like a server with a fixed number of slots, requests arriving while `capacity`
+    are in flight fail with HTTP 429, and like a batching server past its throughput, latency grows in
+    proportion to the requests in flight beyond `saturation`. `fail_rate` is the share of analyzer
+    verdicts that are failures.
+    `trailing_words` words of commentary follow the closing fence of rewrites and methods, as
+    chatty models add them. Streamed responses send one token per `seconds_per_token`, and a stream
+    the client closes early stops decoding.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: str = "const:0.01", seconds_per_token: float = 0.0,
+                 straggler_rate: float = 0.0, straggler_factor: float = 10.0, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 capacity: Optional[int] = None, saturation: Optional[int] = None, fail_rate: float = 0.3, answer_words: int = 200, trailing_words: int = 0, seed: Optional[int] = 0) -> None:
+        self.host = host
+        self.port = port
+        self.latency = parse_latency(latency)
+        self.seconds_per_token = seconds_per_token
+        self.straggler_rate = straggler_rate
+        self.straggler_factor = straggler_factor
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.capacity = capacity
+        self.saturation = saturation
+        self.fail_rate = fail_rate
+        self.answer_words = answer_words
+        self.trailing_words = trailing_words
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self.requests_by_kind: Dict[str, int] = {}
+        self.streamed_tokens = 0
+        self.aborted_streams = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[asyncio.Task] = set()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self) -> "MockChatServer":
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            for task in self._connections:
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> "MockChatServer":
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    @contextmanager
+    def run_in_thread(self) -> Iterator["MockChatServer"]:
+        """Serve from a background thread with its own event loop, so the server does not compete with the client's loop."""
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def serve() -> None:
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            started.set()
+            loop.run_forever()
+            loop.run_until_complete(self.close())
+            loop.close()
+
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        started.wait()
+        try:
+            yield self
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+
+    def reset_stats(self) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.requests_by_kind = {}
+        self.streamed_tokens = 0
+        self.aborted_streams = 0
+        self.peak_in_flight = self.in_flight
+
+    # Responses
+
+    def respond(self, prompt: str) -> Tuple[str, str]:
+        """Return (kind, text) of a canned response for `prompt`."""
+        rng = self.rng
+        if "Evolution Trajectories:" in prompt:
+            cases = CASE_REGEX.findall(prompt)
+            return "analyze_batch", "\n".join(f"Case {case}: {self.verdict()}" for case in cases)
+        if "Evolution Trajectory:" in prompt:
+            return "analyze", self.verdict()
+        if "Instruction Method Optimizer" in prompt:
+            extra = [f"Step {i}:\n#{name}#\n{self.words(12)}\n" for i, name in enumerate(rng.sample(["Scope", "Constraints", "Context", "Edge Cases", "Depth"], rng.randint(0, 2)), start=3)]
+            last = 3 + len(extra)
+            text = (f"```Optimized Method\nStep 1:\n#Methods List#\n{self.words(20)}\n\nStep 2:\n#Plan#\n{self.words(15)}\n\n"
+                    + "\n".join(extra)
+                    + f"\nStep {last}:\n#Rewritten Instruction#\n{self.words(15)}\n\nStep {last + 1}:\n#Finally Rewritten Instruction#\n{self.words(15)}\n```")
+            return "optimize", text + self.trailing()
+        position = prompt.rfind(INSTRUCTION_MARKER)
+        if position != -1:
+            instruction = prompt[position + len(INSTRUCTION_MARKER):].strip()
+            text = (f"```Optimized Instruction\nStep 1:\n#Methods List#\n{self.words(20)}\n\nStep 2:\n#Plan#\n{self.words(15)}\n\n"
+                    f"Step 3:\n#Rewritten Instruction#\n{instruction} {self.words(10)}\n\n"
+                    f"Step 4:\n#Finally Rewritten Instruction#\n{instruction} {self.words(12)}\n```")
+            return "evolve", text + self.trailing()
+        return "answer", self.words(self.answer_words)
+
+    def verdict(self) -> str:
+        if self.rng.random() < self.fail_rate:
+            return f"### FAILED - Reason: {self.words(8)}"
+        return "### PASSED"
+
+    def trailing(self) -> str:
+        return f"\n\nThis rewrite makes the instruction more complex. {self.words(self.trailing_words)}" if self.trailing_words else ""
+
+    def words(self, count: int) -> str:
+        return " ".join(f"w{self.rng.randrange(5000)}" for _ in range(count))
+
+    def completion(self, body: Dict[str, Any]) -> Tuple[Dict[str, Any], float]:
+        messages = body.get("messages", [])
+        prompt = messages[-1]["content"] if messages else ""
+        n = int(body.get("n") or 1)
+        choices = []
+        completion_tokens = 0
+        kind = "answer"
+        stop = body.get("stop")
+        stop = [stop] if isinstance(stop, str) else stop
+        for index in range(n):
+            kind, text = self.respond(prompt)
+            text, finish_reason = apply_limits(text, body.get("max_tokens") or body.get("max_completion_tokens"), stop)
+            completion_tokens += count_tokens(text)
+            choices.append({"index": index, "message": {"role": "assistant", "content": text}, "finish_reason": finish_reason})
+        self.requests_by_kind[kind] = self.requests_by_kind.get(kind, 0) + 1
+        prompt_tokens = sum(count_tokens(message.get("content") or "") for message in messages)
+
+        delay = self.latency(self.rng) + self.seconds_per_token * completion_tokens / n
+        if self.rng.random() < self.straggler_rate:
+            delay *= self.straggler_factor
+        if self.saturation and self.in_flight > self.saturation:
+            delay *= self.in_flight / self.saturation
+        response = {
+            "id": f"chatcmpl-mock-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": choices,
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+        }
+        return response, delay
+
+    async def stream_events(self, response: Dict[str, Any], delay: float, include_usage: bool) -> AsyncIterator[str]:
+        """Server-sent event payloads of `response`: after `delay`, every choice receives one token per step."""
+        base = {"id": response["id"], "object": "chat.completion.chunk", "created": response["created"], "model": response["model"]}
+        tokens = [TOKEN_REGEX.findall(choice["message"]["content"]) for choice in response["choices"]]
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        finished = False
+        try:
+            # Time to first token; the per-token part of `delay` is spent while streaming
+            steps = max(map(len, tokens), default=0)
+            await asyncio.sleep(max(0.0, delay - self.seconds_per_token * steps))
+            start = time.monotonic()
+            for step in range(steps):
+                chunk_choices = [{"index": index, "delta": {"content": choice_tokens[step]}, "finish_reason": None}
+                                 for index, choice_tokens in enumerate(tokens) if step < len(choice_tokens)]
+                self.streamed_tokens += len(chunk_choices)
+                yield json.dumps({**base, "choices": chunk_choices})
+                # Paced against the start of the stream, so that timer overshoot does not add up
+                wait = start + (step + 1) * self.seconds_per_token - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            yield json.dumps({**base, "choices": [{"index": choice["index"], "delta": {}, "finish_reason": choice["finish_reason"]} for choice in response["choices"]]})
+            if include_usage:
+                yield json.dumps({**base, "choices": [], "usage": response["usage"]})
+            yield "[DONE]"
+            finished = True
+        finally:
+            self.in_flight -= 1
+            if not finished:
+                self.aborted_streams += 1
+
+    # HTTP
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, payload, extra_headers = await self._route(method, path, body)
+                if isinstance(payload, dict):
+                    data = json.dumps(payload).encode("utf-8")
+                    head = [f"HTTP/1.1 {status}", "Content-Type: application/json", f"Content-Length: {len(data)}", "Connection: keep-alive"]
+                    head += [f"{name}: {value}" for name, value in extra_headers.items()]
+                    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+                    await writer.drain()
+                else:
+                    await self._write_stream(writer, status, payload)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # Closing the server; end the connection quietly
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _write_stream(self, writer: asyncio.StreamWriter, status: str, events: AsyncIterator[str]) -> None:
+        head = [f"HTTP/1.1 {status}", "Content-Type: text/event-stream", "Transfer-Encoding: chunked", "Connection: keep-alive"]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+        try:
+            async for event in events:
+                data = f"data: {event}\n\n".encode("utf-8")
+                writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+                # Raises once the client has closed the stream, which ends decoding like a real server
+                await writer.drain()
+                if writer.is_closing():
+                    raise ConnectionResetError("stream closed by the client")
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            await events.aclose()
+
+    async def _route(self, method: str, path: str, body: bytes) -> Tuple[str, Any, Dict[str, str]]:
+        path = path.split("?", 1)[0]
+        if method == "GET" and path.endswith("/models"):
+            return "200 OK", {"object": "list", "data": [{"id": "mock", "object": "model"}]}, {}
+        if method != "POST" or not path.endswith("/chat/completions"):
+            return "404 Not Found", {"error": {"message": f"{method} {path} not found"}}, {}
+
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            body = json.loads(body)
+            response, delay = self.completion(body)
+            draw = self.rng.random()
+            if draw < self.rate_limit_rate or (self.capacity is not None and self.in_flight > self.capacity):
+                self.errors += 1
+                await asyncio.sleep(min(delay, 0.01))
+                return "429 Too Many Requests", {"error": {"message": "rate limited", "type": "rate_limit_error"}}, {"Retry-After": "0.05"}
+            if draw < self.rate_limit_rate + self.error_rate:
+                self.errors += 1
+                await asyncio.sleep(delay)
+                return "500 Internal Server Error", {"error": {"message": "mock server error", "type": "server_error"}}, {}
+            if body.get("stream"):
+                include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+                return "200 OK", self.stream_events(response, delay, include_usage), {}
+            await asyncio.sleep(delay)
+            return "200 OK", response, {}
+        finally:
+            self.in_flight -= 1
+
+async def serve(args: argparse.Namespace) -> None:
+    server = MockChatServer(host=args.host, port=args.port, latency=args.latency, seconds_per_token=args.seconds_per_token,
+                            straggler_rate=args.straggler_rate, straggler_factor=args.straggler_factor, error_rate=args.error_rate,
+                            rate_limit_rate=args.rate_limit_rate, capacity=args.capacity, saturation=args.saturation, fail_rate=args.fail_rate, answer_words=args.answer_words,
+                            trailing_words=args.trailing_words, seed=args.seed)
+    await server.start()
+    print(f"Mock chat completions server listening on {server.base_url}")
+    await asyncio.Event().wait()
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", type=str, default="const:0.01", help="Base latency distribution: const:S, uniform:LOW,HIGH or lognormal:MEDIAN,SIGMA (seconds)")
+    parser.add_argument("--seconds_per_token", type=float, default=0.0, help="Additional latency per completion token")
+    parser.add_argument("--straggler_rate", type=float, default=0.0, help="Fraction of requests slowed down by --straggler_factor")
+    parser.add_argument("--straggler_factor", type=float, default=10.0, help="Slowdown of straggler requests")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Fraction of requests failing with HTTP 500")
+    parser.add_argument("--rate_limit_rate", type=float, default=0.0, help="Fraction of requests failing with HTTP 429")
+    parser.add_argument("--capacity", type=int, default=None, help="Requests in flight above which new requests fail with HTTP 429. Unlimited if not set.")
+    parser.add_argument("--saturation", type=int, default=None, help="Requests in flight above which latency grows in proportion to the number in flight. Disabled if not set.")
+    parser.add_argument("--fail_rate", type=float, default=0.3, help="Fraction of analyzer verdicts that are failures")
+    parser.add_argument("--answer_words", type=int, default=200, help="Length of plain answers in words")
+    parser.add_argument("--trailing_words", type=int, default=0, help="Words of commentary after the closing fence of rewrites and methods")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of latencies, failures and outputs")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a mock OpenAI-compatible chat completions server")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    add_server_arguments(parser)
+    asyncio.run(serve(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Offline throughput benchmarks of the pipeline against the mock chat completions server.
+
+Runs `AutoEvol.run`, `EvolOptimizer.optimize` and `gen_answers.process_data` over a grid of
+concurrency and pipeline parameters and reports items/sec, LLM calls per item and tail latency.
+
+Usage:
+    python -m benchmarks.run_benchmarks --num_instructions 40 --max_in_flight 8 32 --num_methods 3 5 --latency lognormal:0.05,0.5
+    python -m benchmarks.run_benchmarks --stream false true --seconds_per_token 0.002 --trailing_words 150
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.mock_server import MockChatServer, add_server_arguments
+from src import AutoEvol
+from src.analyzers import TrajectoryAnalyzer
+from src.checkpoint import read_jsonl
+from src.evaluator import FailureDetectorEvaluator
+from src.evolvers import RecurrentEvolver
+from src.evolvers.recurrent_evolver import INITIAL_EVOLVE_METHOD
+from src.generators import AdaptiveConcurrencyGenerator, InstrumentedGenerator, ResilientGenerator, create_generator, role_limits
+from src.generators.limits import parse_role_values
+from src.metrics import MetricsRegistry
+from src.optimizers.evol_optimizer import EvolOptimizer
+from src.utils import imap_unordered
+
+SCENARIOS = ("autoevol", "optimizer", "gen_answers")
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(q * len(values))) - 1))]
+
+def synthetic_instructions(count: int, prefix: str = "Instruction") -> List[str]:
+    return [f"{prefix} {i}: explain how topic {i} relates to topic {i + 1} with an example" for i in range(count)]
+
+def make_generator(base_url: str, metrics: MetricsRegistry, params: Dict[str, Any]) -> ResilientGenerator:
+    # Same stack as run_evol.py
+    limits = role_limits(params["max_tokens"], stop_after_fence=params["stream"])
+    backend = create_generator("vllm", "mock", base_url=base_url, max_retries=0, max_connections=params["max_connections"], limits=limits, stream=params["stream"])
+    generator = InstrumentedGenerator(backend, metrics)
+    if params["adaptive_concurrency"]:
+        generator = AdaptiveConcurrencyGenerator(generator, max_limit=params["max_connections"])
+    return ResilientGenerator(generator, max_retries=params["max_retries"], hedge_percentile=params["hedge_percentile"])
+
+def make_components(generator, params: Dict[str, Any]) -> Dict[str, Any]:
+    evaluator = FailureDetectorEvaluator()
+    return {
+        'generator': generator,
+        'evolver': RecurrentEvolver(generator),
+        'analyzer': TrajectoryAnalyzer(generator, batched=params["batched_analysis"]),
+        'evaluator': evaluator,
+        'optimizer': EvolOptimizer(generator, evaluator),
+        'dev_set': synthetic_instructions(params["dev_set_size"], prefix="Dev instruction"),
+    }
+
+async def bench_autoevol(base_url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    metrics = MetricsRegistry()
+    auto_evol = AutoEvol(make_components(make_generator(base_url, metrics, params), params))
+    instructions = synthetic_instructions(params["num_instructions"])
+
+    start = time.monotonic()
+    results = await auto_evol.run(instructions, batch_size=params["max_in_flight"], num_methods=params["num_methods"],
+                                  max_concurrent_batches=1, evolve_epoch=params["evolve_epoch"])
+    elapsed = time.monotonic() - start
+    # Instructions whose requests still failed after retries come back as None
+    completed = [result for result in results if result is not None]
+    return summarize(elapsed, [result["total_time"] for result in completed], metrics, failed_items=len(results) - len(completed))
+
+async def bench_optimizer(base_url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    metrics = MetricsRegistry()
+    components = make_components(make_generator(base_url, metrics, params), params)
+    instructions = synthetic_instructions(params["num_instructions"])
+    # Mixed analyzer feedback, with the repeated verdicts the analyzer produces in practice
+    feedback = ["### PASSED"] * (params["num_methods"] - params["num_methods"] // 2) + [f"### FAILED - Reason: too similar {i}" for i in range(params["num_methods"] // 2)]
+
+    async def optimize(instruction: str) -> Optional[float]:
+        start = time.monotonic()
+        try:
+            await components['optimizer'].optimize(
+                INITIAL_EVOLVE_METHOD.replace("{{instruction}}", instruction),
+                feedback=feedback,
+                evolver=components['evolver'],
+                development_set=components['dev_set'] or [instruction],
+            )
+        except Exception:
+            # Requests that still fail after retries fail the item, as in AutoEvol.run
+            return None
+        return time.monotonic() - start
+
+    start = time.monotonic()
+    latencies = [latency async for _, latency in imap_unordered(optimize, instructions, params["max_in_flight"])]
+    elapsed = time.monotonic() - start
+    completed = [latency for latency in latencies if latency is not None]
+    return summarize(elapsed, completed, metrics, failed_items=len(latencies) - len(completed))
+
+async def bench_gen_answers(base_url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    import gen_answers
+
+    with tempfile.TemporaryDirectory() as directory:
+        input_file = os.path.join(directory, "evolved.jsonl")
+        with open(input_file, "w", encoding="utf-8") as f:
+            for instruction in synthetic_instructions(params["num_instructions"]):
+                f.write(json.dumps({"original_instruction": instruction, "final_instruction": instruction}) + "\n")
+
+        previous_backend = os.environ.get("VLLM_BACKEND")
+        os.environ["VLLM_BACKEND"] = base_url
+        try:
+            start = time.monotonic()
+            output_file = os.path.join(directory, "answers.jsonl")
+            metrics = await gen_answers.process_data("mock", "vllm", input_file, params["max_in_flight"], output_file,
+                                                     max_retries=params["max_retries"], hedge_percentile=params["hedge_percentile"], max_connections=params["max_connections"],
+                                                     adaptive_concurrency=params["adaptive_concurrency"])
+            elapsed = time.monotonic() - start
+            # Failed answers are not written
+            answered = sum(1 for _ in read_jsonl(output_file))
+        finally:
+            if previous_backend is None:
+                del os.environ["VLLM_BACKEND"]
+            else:
+                os.environ["VLLM_BACKEND"] = previous_backend
+
+    answer = metrics.snapshot()["roles"].get("answer", {})
+    # Each answer is one call, so the item latency percentiles are those of the calls
+    item_latencies = {f"item_p{q}": answer.get(f"latency_p{q}") for q in (50, 95, 99)}
+    return {**summarize(elapsed, [], metrics, answered, failed_items=params["num_instructions"] - answered), **item_latencies}
+
+def summarize(elapsed: float, item_latencies: List[float], metrics: MetricsRegistry, num_items: Optional[int] = None, failed_items: int = 0) -> Dict[str, Any]:
+    # Rates are per completed item; `failed_items` are reported separately
+    snapshot = metrics.snapshot()
+    num_items = num_items if num_items is not None else len(item_latencies)
+    call_latencies = [stats["latency_p95"] for stats in snapshot["roles"].values() if stats["latency_p95"] is not None]
+    return {
+        "elapsed": elapsed,
+        "items_per_second": num_items / elapsed if elapsed > 0 else None,
+        "calls_per_item": snapshot["requests"] / num_items if num_items else None,
+        "completion_tokens_per_item": snapshot["completion_tokens"] / num_items if num_items else None,
+        "errors": snapshot["errors"],
+        "failed_items": failed_items,
+        "peak_in_flight_calls": snapshot["peak_in_flight"],
+        "item_p50": percentile(item_latencies, 0.50),
+        "item_p95": percentile(item_latencies, 0.95),
+        "item_p99": percentile(item_latencies, 0.99),
+        "call_p95": max(call_latencies) if call_latencies else None,
+        "roles": {name: stats["requests"] for name, stats in snapshot["roles"].items()},
+    }
+
+BENCHMARKS = {"autoevol": bench_autoevol, "optimizer": bench_optimizer, "gen_answers": bench_gen_answers}
+
+def parameter_grid(args: argparse.Namespace, scenario: str) -> List[Dict[str, Any]]:
+    # gen_answers only depends on the number of requests in flight
+    num_methods = args.num_methods if scenario != "gen_answers" else [None]
+    dev_set_size = args.dev_set_size if scenario != "gen_answers" else [0]
+    batched_analysis = args.batched_analysis if scenario == "autoevol" else [False]
+    # Answers have no closing fence to stop at
+    stream = args.stream if scenario != "gen_answers" else [False]
+    return [
+        {"max_in_flight": max_in_flight, "num_methods": methods, "dev_set_size": dev_size, "batched_analysis": batched, "stream": streamed,
+         "num_instructions": args.num_instructions, "evolve_epoch": args.evolve_epoch, "max_retries": args.max_retries, "hedge_percentile": args.hedge_percentile,
+         "max_connections": args.max_connections, "max_tokens": args.max_tokens, "adaptive_concurrency": args.adaptive_concurrency}
+        for max_in_flight, methods, dev_size, batched, streamed in itertools.product(args.max_in_flight, num_methods, dev_set_size, batched_analysis, stream)
+    ]
+
+def format_row(scenario: str, params: Dict[str, Any], result: Dict[str, Any]) -> str:
+    def number(value, spec):
+        return "-" if value is None else format(value, spec)
+    return (f"{scenario:<12} {params['max_in_flight']:>8} {number(params['num_methods'], 'd'):>7} {params['dev_set_size']:>4} {'y' if params['batched_analysis'] else 'n':>7} {'y' if params['stream'] else 'n':>6} "
+            f"{number(result['items_per_second'], '.2f'):>9} {number(result['calls_per_item'], '.1f'):>10} {number(result['item_p50'], '.3f'):>8} "
+            f"{number(result['item_p95'], '.3f'):>8} {number(result['item_p99'], '.3f'):>8} {number(result['call_p95'], '.3f'):>8} {result['errors']:>6} {result['failed_items']:>6}")
+
+HEADER = (f"{'scenario':<12} {'inflight':>8} {'methods':>7} {'dev':>4} {'batched':>7} {'stream':>6} {'items/s':>9} {'calls/item':>10} "
+          f"{'p50 (s)':>8} {'p95 (s)':>8} {'p99 (s)':>8} {'call p95':>8} {'errors':>6} {'failed':>6}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline throughput against a local mock chat completions server")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS), help="Benchmarks to run")
+    parser.add_argument("--num_instructions", type=int, default=40, help="Number of items processed per benchmark run")
+    parser.add_argument("--max_in_flight", type=int, nargs="+", default=[8, 32], help="Concurrency levels to benchmark")
+    parser.add_argument("--num_methods", type=int, nargs="+", default=[3], help="Numbers of evolved candidates per instruction to benchmark")
+    parser.add_argument("--dev_set_size", type=int, nargs="+", default=[0], help="Dev set sizes to benchmark (0 uses the instruction itself)")
+    parser.add_argument("--batched_analysis", type=lambda value: value.lower() in ("1", "true", "yes", "y"), nargs="+", default=[False], help="Batched analysis settings to benchmark, e.g. 'false true'")
+    parser.add_argument("--stream", type=lambda value: value.lower() in ("1", "true", "yes", "y"), nargs="+", default=[False], help="Early-stopping streaming settings to benchmark, e.g. 'false true'")
+    parser.add_argument("--max_tokens", type=str, nargs="+", default=None, metavar="ROLE=N", help="Per-role completion token caps, as in run_evol.py")
+    parser.add_argument("--evolve_epoch", type=int, default=1, help="Evolution epochs per instruction in the autoevol benchmark")
+    parser.add_argument("--max_retries", type=int, default=4, help="Retries of failed requests, as in run_evol.py")
+    parser.add_argument("--hedge_percentile", type=float, default=None, help="Hedge requests slower than this latency percentile, as in run_evol.py")
+    parser.add_argument("--max_connections", type=int, default=256, help="Size of the shared HTTP connection pool, as in run_evol.py")
+    parser.add_argument("--adaptive_concurrency", action="store_true", help="Adapt the requests in flight to the server, as in run_evol.py")
+    parser.add_argument("--base_url", type=str, default=None, help="Benchmark an already running OpenAI-compatible server instead of starting the mock server")
+    parser.add_argument("--output", type=str, default=None, help="Write all results as JSON to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the progress output of the benchmarked code")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    try:
+        args.max_tokens = parse_role_values(args.max_tokens, int)
+    except ValueError as e:
+        parser.error(str(e))
+
+    server = None if args.base_url else MockChatServer(
+        latency=args.latency, seconds_per_token=args.seconds_per_token, straggler_rate=args.straggler_rate, straggler_factor=args.straggler_factor,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, capacity=args.capacity, saturation=args.saturation, fail_rate=args.fail_rate, answer_words=args.answer_words,
+        trailing_words=args.trailing_words, seed=args.seed)
+
+    results = []
+    with server.run_in_thread() if server is not None else contextlib.nullcontext():
+        base_url = args.base_url or server.base_url
+        print(HEADER)
+        for scenario in args.scenarios:
+            for params in parameter_grid(args, scenario):
+                if server is not None:
+                    server.reset_stats()
+                with contextlib.ExitStack() as stack:
+                    if not args.verbose:
+                        # Progress bars and per-run summaries of the benchmarked code
+                        stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+                        stack.enter_context(contextlib.redirect_stderr(io.StringIO()))
+                    result = asyncio.run(BENCHMARKS[scenario](base_url, params))
+                if server is not None:
+                    result["server_requests"] = server.requests
+                    result["server_errors"] = server.errors
+                    result["server_aborted_streams"] = server.aborted_streams
+                results.append({"scenario": scenario, "params": params, "result": result})
+                print(format_row(scenario, params, result), flush=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import os
+import json
+import shutil
+import asyncio
+import argparse
+from src.checkpoint import JsonlWriter, read_jsonl
+from src.records import methods_path
+from src.dedup import DEDUP_MODES, NearDuplicateIndex, deduplicate
+
+async def write_records(records, output_file):
+    open(output_file, 'w').close()
+    async with JsonlWriter(output_file) as writer:
+        writer.write_many(records)
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove near-duplicate evolved instructions from the JSONL output of run_evol.py")
+    parser.add_argument("--input_file", type=str, required=True, help="JSONL output of run_evol.py (or merge_shards.py)")
+    parser.add_argument("--output_file", type=str, required=True, help="Where to write the deduplicated JSONL")
+    parser.add_argument("--field", type=str, default="final_instruction", help="Field of each record compared for near-duplicates. Records without it are kept.")
+    parser.add_argument("--mode", type=str, default="keep_one", choices=DEDUP_MODES, help="Keep the first record of each cluster (keep_one), or drop every record that has a near-duplicate (drop)")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Estimated Jaccard similarity of character shingles above which two records are near-duplicates")
+    parser.add_argument("--num_perm", type=int, default=128, help="Number of MinHash permutations")
+    parser.add_argument("--shingle_size", type=int, default=5, help="Characters per shingle")
+    parser.add_argument("--stats_file", type=str, default=None, help="Write the cluster statistics as JSON to this file")
+
+    args = parser.parse_args()
+    try:
+        index = NearDuplicateIndex(threshold=args.threshold, num_perm=args.num_perm, shingle_size=args.shingle_size)
+    except ValueError as e:
+        parser.error(str(e))
+
+    records = list(read_jsonl(args.input_file))
+    compared = [record for record in records if isinstance(record.get(args.field), str)]
+    kept = {id(record) for record in deduplicate(compared, index, mode=args.mode, key=lambda record: record[args.field])}
+    output = [record for record in records if id(record) in kept or not isinstance(record.get(args.field), str)]
+
+    stats = index.stats()
+    print(json.dumps(stats, indent=2))
+    print(f"Kept {len(output)} of {len(records)} records ({len(records) - len(compared)} without {args.field!r})")
+    if args.stats_file:
+        with open(args.stats_file, 'w') as f:
+            json.dump(stats, f, indent=2)
+
+    asyncio.run(write_records(output, args.output_file))
+    print(f"Deduplicated results saved to {args.output_file}")
+    # Compact records reference methods in a table next to the output file
+    if os.path.exists(methods_path(args.input_file)) and methods_path(args.input_file) != methods_path(args.output_file):
+        shutil.copyfile(methods_path(args.input_file), methods_path(args.output_file))
+
+if __name__ == "__main__":
+    main()
@@ -1,94 +1,131 @@
 import asyncio
 import json
 import argparse
-from typing import List, Dict
-from src.generators import OpenRouterGenerator, VLLMGenerator, BaseGenerator
-from datasets import load_dataset
+from typing import Dict, Iterator, Optional
+from src.generators import create_generator, AdaptiveConcurrencyGenerator, BaseGenerator, CachedGenerator, InstrumentedGenerator, ResilientGenerator
+from src.checkpoint import JsonlWriter, read_jsonl
+from src.utils import imap_unordered, iterate_in_thread
+from src.metrics import MetricsRegistry, role
 from tqdm import tqdm
-import time
-from os import getenv
+import os
 
-async def process_batch(generator: BaseGenerator, batch: List[str], system_prompt: str) -> List[Dict]:
-    tasks = []
-    for item in batch:
-        try:
-            task = generator.agenerate(item, system_prompt, temperature=0.5)
-            tasks.append(task)
-        except:
-            task = 'error'
-            tasks.append(task)
-    results = await asyncio.gather(*tasks)
-    
-    processed_items = []
-    for item, result in zip(batch, results):
-        processed_item = {
-            'conversations': [
-                {"from": "human", "value": item},
-                {"from": "gpt", "value": result}
-            ]
-        }
-        processed_items.append(processed_item)
-    
-    return processed_items
+SYSTEM_PROMPT = "You are a helpful assistant. Answer the question from the user. Give full solution and explaination."
 
-async def process_data(model:str, generator_str: str, file_path: str, batch_size: int, output_file: str):
-    # Initialize OpenRouterGenerator
-    generator = (
-        VLLMGenerator(model=model, base_url=getenv('VLLM_BACKEND') or 'http://localhost:8000/v1') 
-        if generator_str == 'vllm' 
-        else OpenRouterGenerator(model=model))
-    
-    # Load data
-    if '.json' not in file_path:
-        data = load_dataset(file_path)['train']  # Assuming the main split is named 'train'
-    else:
+def iter_records(file_path: str) -> Iterator[Dict]:
+    # JSONL files and Hugging Face datasets are streamed; a JSON array has to be parsed in one go
+    if file_path.endswith('.jsonl'):
+        yield from read_jsonl(file_path)
+    elif file_path.endswith('.json'):
         with open(file_path, 'r') as file:
-            data = json.load(file)
-            
-    start_idx = 0
-    
-    # Calculate total number of batches
-    total_batches = (len(data) + batch_size - start_idx - 1) // batch_size
-    
-    instructions = []
-    for sample in data:
-        convo = sample['conversations']
-        if convo[0]['from'] == 'human':
-            user = convo[0]['value']
-        else:
-            user = convo[1]['value']
-        
-        instructions.append(user)            
-        
-        
-    # Process in batches
-    all_results = []
-    with tqdm(total=total_batches, desc="Processing batches") as pbar:
-        for i in range(0, len(data), batch_size):
-            batch = instructions[i+start_idx:i+batch_size+start_idx]
-            processed_batch = await process_batch(generator, batch, "You are a helpful assistant. Answer the question from the user. Give full solution and explaination.")
-            
-            # Extend results and save
-            all_results.extend(processed_batch)
-            
-            # Save and overwrite for each batch
-            with open(output_file, 'w') as f:
-                json.dump(all_results, f, indent=2, ensure_ascii=False)
-            
-            pbar.update(1)
-            time.sleep(5)
+            yield from json.load(file)
+    else:
+        from datasets import load_dataset
+        yield from load_dataset(file_path, streaming=True)['train']  # Assuming the main split is named 'train'
+
+def get_instruction(sample: Dict) -> Optional[str]:
+    # Accepts ShareGPT conversations as well as run_evol.py output records
+    if 'final_instruction' in sample:
+        return sample['final_instruction']
+    convo = sample['conversations']
+    if convo[0]['from'] == 'human':
+        return convo[0]['value']
+    return convo[1]['value']
+
+async def answer_instruction(generator: BaseGenerator, instruction: str, system_prompt: str) -> Optional[Dict]:
+    try:
+        result = await generator.agenerate(instruction, system_prompt, temperature=0.5)
+    except Exception as e:
+        print(f"Error: failed to answer instruction: {e}")
+        return None
+    return {
+        'conversations': [
+            {"from": "human", "value": instruction},
+            {"from": "gpt", "value": result}
+        ]
+    }
+
+async def process_data(model:str, generator_str: str, file_path: str, max_in_flight: int, output_file: str, cache_dir: str = None, resume: bool = False, metrics_file: str = None,
+                       max_retries: int = 4, hedge_percentile: float = None, max_connections: int = 256, http2: bool = False,
+                       adaptive_concurrency: bool = False, initial_concurrency: int = 16, min_concurrency: int = 1, max_concurrency: int = None,
+                       latency_tolerance: float = 2.0):
+    generator = create_generator(generator_str, model, max_retries=0, max_connections=max_connections, http2=http2)
+    metrics = MetricsRegistry()
+    generator = InstrumentedGenerator(generator, metrics)
+    adaptive = None
+    if adaptive_concurrency:
+        max_concurrency = max_concurrency or max_connections
+        adaptive = generator = AdaptiveConcurrencyGenerator(generator, initial_limit=min(initial_concurrency, max_concurrency), min_limit=min_concurrency,
+                                                            max_limit=max_concurrency, latency_tolerance=latency_tolerance)
+        metrics.gauge("concurrency_limit", lambda: round(adaptive.limit, 1))
+    generator = ResilientGenerator(generator, max_retries=max_retries, hedge_percentile=hedge_percentile)
+    if cache_dir:
+        generator = CachedGenerator(generator, cache_dir=cache_dir)
+
+    completed = set()
+    if resume and os.path.exists(output_file):
+        completed = {record['conversations'][0]['value'] for record in read_jsonl(output_file) if record.get('conversations')}
+        print(f"Resuming: {len(completed)} instructions already answered")
+    elif not resume:
+        open(output_file, 'w').close()
+
+    instructions = (
+        instruction for instruction in map(get_instruction, iter_records(file_path))
+        if instruction is not None and instruction not in completed
+    )
+
+    # Keep `max_in_flight` requests running at all times and write answers in input order as soon as
+    # every earlier answer is done. Failed answers are not written, so a resumed run retries them.
+    next_index = 0
+    finished: Dict[int, Optional[Dict]] = {}
+    with tqdm(desc="Answering instructions") as pbar, role("answer"):
+        async with JsonlWriter(output_file) as writer:
+            # Records are read in a worker thread, so that a slow source does not stall the requests in flight
+            async for index, record in imap_unordered(lambda instruction: answer_instruction(generator, instruction, SYSTEM_PROMPT), iterate_in_thread(instructions), max_in_flight):
+                finished[index] = record
+                while next_index in finished:
+                    record = finished.pop(next_index)
+                    if record is not None:
+                        writer.write(record)
+                    next_index += 1
+                pbar.update(1)
+
+    print(metrics.summary())
+    if adaptive is not None:
+        print(adaptive.summary())
+    if metrics_file:
+        metrics.dump(metrics_file)
+    return metrics
 
 def main():
     parser = argparse.ArgumentParser(description="Process data using OpenRouterGenerator")
     parser.add_argument("--model", type=str, required=True, help="Model use to evol instructions.")
-    parser.add_argument("--generator", type=str, required=True, choices=['openrouter', 'vllm'], help="Type of generator to use.")
-    parser.add_argument("--data_path", required=True, help="Path to the JSON file or Hugging Face dataset repo")
-    parser.add_argument("--batch_size", type=int, default=10, help="Batch size for processing")
-    parser.add_argument("--output", default="final_evolved_data.json", help="Output file path")
-    
+    parser.add_argument("--generator", type=str, required=True, choices=['openrouter', 'vllm', 'openai'], help="Type of generator to use.")
+    parser.add_argument("--data_path", required=True, help="Path to a JSON/JSONL file (ShareGPT or run_evol.py output) or Hugging Face dataset repo")
+    parser.add_argument("--batch_size", type=int, default=10, help="Number of requests kept in flight")
+    parser.add_argument("--output", default="final_evolved_data.jsonl", help="Output JSONL file path")
+    parser.add_argument("--cache_dir", type=str, default=None, help="Directory for a persistent LLM response cache. Disabled if not set.")
+    parser.add_argument("--resume", action="store_true", help="Skip instructions already answered in the output file and append to it")
+    parser.add_argument("--metrics_file", type=str, default=None, help="Write request, token and latency metrics as JSON to this file at the end")
+    parser.add_argument("--max_retries", type=int, default=4, help="Retries of a request after a rate limit, timeout, connection error or 5xx response")
+    parser.add_argument("--max_connections", type=int, default=256, help="Size of the HTTP connection pool shared by all requests to the backend")
+    parser.add_argument("--http2", action="store_true", help="Use HTTP/2 for backend requests (requires the h2 package)")
+    parser.add_argument("--hedge_percentile", type=float, default=None, help="Send a duplicate of a request that has been running longer than this percentile of recent latencies and use the first answer")
+    parser.add_argument("--adaptive_concurrency", action="store_true", help="Adapt the number of requests sent to the backend to its latency and rate limits, between --min_concurrency and --max_concurrency. No more than --batch_size are ever in flight.")
+    parser.add_argument("--initial_concurrency", type=int, default=16, help="With --adaptive_concurrency, number of requests in flight at the start of the run")
+    parser.add_argument("--min_concurrency", type=int, default=1, help="With --adaptive_concurrency, lowest limit of requests in flight")
+    parser.add_argument("--max_concurrency", type=int, default=None, help="With --adaptive_concurrency, highest limit of requests in flight. Defaults to --max_connections.")
+    parser.add_argument("--latency_tolerance", type=float, default=2.0, help="With --adaptive_concurrency, back off when the recent latency exceeds this multiple of the lowest sustained latency")
+
     args = parser.parse_args()
-    
-    asyncio.run(process_data(args.model, args.generator, args.data_path, args.batch_size, args.output))
+    if args.adaptive_concurrency:
+        max_concurrency = args.max_concurrency or args.max_connections
+        if not 1 <= args.min_concurrency <= min(args.initial_concurrency, max_concurrency):
+            parser.error(f"--min_concurrency must be at least 1 and at most --initial_concurrency and --max_concurrency, got {args.min_concurrency}")
+        if args.latency_tolerance <= 1:
+            parser.error(f"--latency_tolerance must be greater than 1, got {args.latency_tolerance}")
+
+    asyncio.run(process_data(args.model, args.generator, args.data_path, args.batch_size, args.output, args.cache_dir, args.resume, args.metrics_file, args.max_retries, args.hedge_percentile, args.max_connections, args.http2, args.adaptive_concurrency,
+                             args.initial_concurrency, args.min_concurrency, args.max_concurrency, args.latency_tolerance))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,80 @@
+import os
+import sys
+import asyncio
+import argparse
+from src.checkpoint import JsonlWriter, read_jsonl
+from src.records import MethodTable, methods_path
+from src.dedup import DEDUP_MODES, NearDuplicateIndex, deduplicate
+from src.sharding import find_shard_paths, merge_records, shard_path
+
+async def write_records(records, output_file):
+    open(output_file, 'w').close()
+    async with JsonlWriter(output_file) as writer:
+        writer.write_many(records)
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge and validate the per-shard outputs of run_evol.py --num_shards")
+    parser.add_argument("--output_file", type=str, required=True, help="The --output_file passed to every shard. Shard files are found next to it.")
+    parser.add_argument("--num_shards", type=int, default=None, help="Number of shards of the run. Required if shard files of several runs are present.")
+    parser.add_argument("--merged_file", type=str, default=None, help="Where to write the merged JSONL. Defaults to --output_file.")
+    parser.add_argument("--dataset", type=str, default=None, help="Dataset of the run. When set, instructions that no shard finished are reported.")
+    parser.add_argument("--dev_set_size", type=int, default=-1, help="Dev set size of the run (only used with --dataset)")
+    parser.add_argument("--streaming", action="store_true", help="Stream --dataset instead of downloading it up front (only used with --dataset)")
+    parser.add_argument("--dedup", type=str, default=None, choices=DEDUP_MODES, help="The --dedup mode of the run (only used with --dataset)")
+    parser.add_argument("--dedup_threshold", type=float, default=0.8, help="The --dedup_threshold of the run (only used with --dedup)")
+    parser.add_argument("--dedup_num_perm", type=int, default=128, help="The --dedup_num_perm of the run (only used with --dedup)")
+    parser.add_argument("--dedup_shingle_size", type=int, default=5, help="The --dedup_shingle_size of the run (only used with --dedup)")
+    parser.add_argument("--allow_incomplete", action="store_true", help="Write the merged file even if shards or instructions are missing")
+
+    args = parser.parse_args()
+
+    found = find_shard_paths(args.output_file)
+    if args.num_shards is None:
+        if len(found) != 1:
+            parser.error(f"found shard files for num_shards in {sorted(found)}; pass --num_shards" if found else f"no shard files found for {args.output_file}")
+        args.num_shards = next(iter(found))
+    shard_paths = found.get(args.num_shards, {})
+
+    expected = None
+    if args.dataset:
+        from src.data import load_instructions
+        expected, _ = load_instructions(args.dataset, dev_set_size=args.dev_set_size, streaming=args.streaming)
+        if args.dedup:
+            # Near-duplicates the run skipped are not missing
+            index = NearDuplicateIndex(threshold=args.dedup_threshold, num_perm=args.dedup_num_perm, shingle_size=args.dedup_shingle_size)
+            expected = deduplicate(expected, index, mode=args.dedup)
+
+    report = merge_records(
+        {index: read_jsonl(path) for index, path in shard_paths.items()},
+        args.num_shards,
+        expected=expected,
+    )
+
+    print(f"Shards found: {len(shard_paths)} of {args.num_shards}")
+    print(f"Merged instructions: {len(report['records'])}")
+    for name in ("missing_shards", "duplicates", "misplaced", "missing", "unexpected"):
+        if name in report:
+            print(f"{name.replace('_', ' ').capitalize()}: {len(report[name])}")
+    for index in report["missing_shards"]:
+        print(f"  missing shard {index}: {shard_path(args.output_file, args.num_shards, index)}")
+
+    incomplete = bool(report["missing_shards"] or report.get("missing"))
+    if incomplete and not args.allow_incomplete:
+        print("Not writing the merged file: the run is incomplete. Rerun the missing shards with --resume, or pass --allow_incomplete.")
+        sys.exit(1)
+
+    merged_file = args.merged_file or args.output_file
+    asyncio.run(write_records(report["records"], merged_file))
+    print(f"Merged results saved to {merged_file}")
+
+    # Method tables of runs with --output_verbosity compact or minimal
+    method_files = [methods_path(path) for _, path in sorted(shard_paths.items()) if os.path.exists(methods_path(path))]
+    if method_files:
+        table = MethodTable()
+        for path in method_files:
+            table.load(read_jsonl(path))
+        asyncio.run(write_records(table.records(), methods_path(merged_file)))
+        print(f"Merged {len(table)} methods into {methods_path(merged_file)}")
+
+if __name__ == "__main__":
+    main()
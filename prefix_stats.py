@@ -0,0 +1,27 @@
+import json
+import argparse
+from src.checkpoint import read_jsonl
+from src.prompt_stats import shared_prefix_stats, approximate_tokenize
+
+def main():
+    parser = argparse.ArgumentParser(description="Report how much of a run's prompt traffic is a shared prefix that the backend can reuse")
+    parser.add_argument("--prompt_log", required=True, help="JSONL prompt log written by run_evol.py --log_prompts")
+    parser.add_argument("--tokenizer", type=str, default=None, help="Hugging Face tokenizer to count tokens with. Defaults to an approximate word-level tokenizer.")
+    parser.add_argument("--block_size", type=int, default=16, help="Prefix cache block size in tokens (vLLM default is 16)")
+    
+    args = parser.parse_args()
+    
+    tokenize = approximate_tokenize
+    if args.tokenizer:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer, trust_remote_code=True)
+        tokenize = lambda text: tokenizer.encode(text, add_special_tokens=False)
+    
+    prompts = ((record.get("system_prompt"), record["prompt"]) for record in read_jsonl(args.prompt_log))
+    stats = shared_prefix_stats(prompts, tokenize=tokenize, block_size=args.block_size)
+    
+    print(json.dumps(stats, indent=2))
+    print(f"{stats['shared_prefix_fraction']:.1%} of {stats['total_tokens']} prompt tokens across {stats['num_prompts']} prompts are a prefix shared with an earlier prompt")
+
+if __name__ == "__main__":
+    main()
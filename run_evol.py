@@ -1,123 +1,270 @@
+import os
 import time
-import json
 import asyncio
+import contextlib
 import argparse
-from datasets import load_dataset
-from src.generators import OpenRouterGenerator, VLLMGenerator
+import operator
+from tqdm import tqdm
+from src.generators import create_generator, role_limits, AdaptiveConcurrencyGenerator, CachedGenerator, InstrumentedGenerator, LoadBalancedGenerator, RecordingGenerator, ResilientGenerator, TracedGenerator
+from src.generators.limits import parse_role_values
 from src.evolvers import RecurrentEvolver
 from src.analyzers import TrajectoryAnalyzer
-from src.evaluator import FailureDetectorEvaluator, RewardModelEvaluator
+from src.evaluator import FailureDetectorEvaluator
 from src.optimizers.evol_optimizer import EvolOptimizer
 from src import AutoEvol
-from os import getenv
+from src.checkpoint import JsonlWriter, load_completed, read_jsonl
+from src.data import load_instructions
+from src.records import VERBOSITY_LEVELS, MethodTable, methods_path
+from src.dedup import DEDUP_MODES, NearDuplicateIndex, deduplicate
+from src.sharding import shard_instructions, shard_path, validate_shard
+from src.metrics import MetricsRegistry, report_periodically
+from src.tracing import Tracer
+from src.utils import iterate_in_thread
 
-def load_and_process_dataset(dataset_name, dev_set_size=5):
-    # Load the dataset from Hugging Face
-    dataset = load_dataset(dataset_name)
+def load_and_process_dataset(dataset_name, dev_set_size=5, streaming=False, num_proc=None):
+    # Instructions are the first human turn of each sample; the train set is yielded lazily
+    return load_instructions(dataset_name, dev_set_size=dev_set_size, streaming=streaming, num_proc=num_proc)
     
-    # Assuming the dataset has a 'train' split. Adjust if needed.
-    if 'train' not in dataset:
-        raise ValueError(f"The dataset {dataset_name} does not have a 'train' split.")
-    
-    full_dataset = dataset['train']
-    
-    # Shuffle the dataset
-    full_dataset = full_dataset.shuffle(seed=42)
-    
-    # Ensure dev_set_size is not larger than the dataset
-    if dev_set_size > len(full_dataset):
-        raise ValueError(f"Specified dev set size ({dev_set_size}) is larger than the dataset size ({len(full_dataset)})")
-    full_filtered = []
-    for sample in full_dataset['conversations']:
-        for turn in sample:
-            if turn['from'] == 'system':
-                break
-            if turn['from'] == 'human':
-                full_filtered.append(turn['value'])
-                break
-    
-    if dev_set_size != -1:
-        # Split the dataset
-        train_instructions = full_filtered[dev_set_size:]
-        dev_instructions = full_filtered[:dev_set_size]
-        
-        return train_instructions, dev_instructions
-    else: 
-        return full_filtered, []
-    
-async def save_results(results, output_file):
-    with open(output_file, 'w') as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
-
 async def main():
     parser = argparse.ArgumentParser(description="Run AutoEvol with specified parameters")
-    parser.add_argument("--dataset", required=True, help="Name of the dataset on Hugging Face")
+    parser.add_argument("--dataset", required=True, help="Name of the dataset on Hugging Face, or a local JSON/JSONL/Parquet file")
     parser.add_argument("--model", type=str, required=True, help="Model use to evol instructions.")
-    parser.add_argument("--generator", type=str, required=True, choices=['openrouter', 'vllm'], help="Type of generator to use.")
+    parser.add_argument("--generator", type=str, required=True, choices=['openrouter', 'vllm', 'openai'], help="Type of generator to use.")
     parser.add_argument("--batch_size", type=int, required=True, help="Batch size for processing")
     parser.add_argument("--num_methods", type=int, required=True, help="Number of methods to use")
     parser.add_argument("--max_concurrent_batches", type=int, required=True, help="Maximum number of concurrent batches")
     parser.add_argument("--evolve_epoch", type=int, required=True, help="Maximum number of epoch for each instruction")
-    parser.add_argument("--output_file", type=str, required=True, help="Name of output file")
+    parser.add_argument("--output_file", type=str, required=True, help="Name of output JSONL file. Each finished instruction is appended as one line.")
     
     # Optional arguments
     parser.add_argument("--dev_set_size", type=int, default=-1, help="Maximum samples for dev set. Use -1 for no dev set.")
     parser.add_argument("--use_reward_model", action="store_true", help="Use reward model for evaluation")
+    parser.add_argument("--resume", action="store_true", help="Skip instructions already present in the output file and append to it")
+    parser.add_argument("--streaming", action="store_true", help="Stream the dataset instead of downloading and preprocessing it up front (shuffles within a buffer)")
+    parser.add_argument("--num_proc", type=int, default=None, help="Number of processes used to extract instructions from a non-streamed dataset")
+    parser.add_argument("--reward_model_device", type=str, default="cuda", help="Device of the reward model, e.g. 'cuda', 'cuda:1' or 'cpu'")
+    parser.add_argument("--reward_batch_size", type=int, default=16, help="Maximum number of responses scored in one reward model forward pass")
+    parser.add_argument("--reward_max_wait_ms", type=float, default=5.0, help="Maximum time to wait for a reward model batch to fill up")
+    parser.add_argument("--batched_analysis", action="store_true", help="Analyze all evolved candidates of an instruction in a single LLM call")
+    parser.add_argument("--successive_halving", action="store_true", help="Race optimizer candidates on growing dev subsets instead of evaluating all of them on the full dev set")
+    parser.add_argument("--halving_keep_fraction", type=float, default=0.5, help="Fraction of candidates kept after each successive halving round")
+    parser.add_argument("--halving_min_dev_size", type=int, default=2, help="Dev subset size of the first successive halving round")
+    parser.add_argument("--cache_dir", type=str, default=None, help="Directory for a persistent LLM response cache. Disabled if not set.")
+    parser.add_argument("--cache_size_gb", type=float, default=1.0, help="Maximum size of the response cache in GB")
+    parser.add_argument("--log_prompts", type=str, default=None, help="Append every prompt sent to the backend to this JSONL file (input of prefix_stats.py)")
+    parser.add_argument("--max_in_flight", type=int, default=None, help="Number of instructions evolved concurrently. Defaults to batch_size * max_concurrent_batches.")
+    parser.add_argument("--num_shards", type=int, default=1, help="Split the train set into this many deterministic shards, one per process or machine")
+    parser.add_argument("--shard_index", type=int, default=0, help="Shard processed by this run, in [0, num_shards). Results go to a per-shard output file.")
+    parser.add_argument("--metrics_interval", type=float, default=60, help="Print a summary of request, token and latency metrics every this many seconds. Use 0 to disable.")
+    parser.add_argument("--metrics_file", type=str, default=None, help="Write the metrics of the run as JSON to this file at the end of the run")
+    parser.add_argument("--trace_file", type=str, default=None, help="Write spans of sampled instructions to this file in Chrome trace-event JSON (open in Perfetto). Disabled if not set.")
+    parser.add_argument("--trace_sample_rate", type=float, default=0.05, help="Fraction of instructions traced when --trace_file is set")
+    parser.add_argument("--max_retries", type=int, default=4, help="Retries of a request after a rate limit, timeout, connection error or 5xx response")
+    parser.add_argument("--request_timeout", type=float, default=None, help="Timeout of a single request attempt in seconds. No timeout if not set.")
+    parser.add_argument("--max_connections", type=int, default=256, help="Size of the HTTP connection pool shared by all requests to the backend. All connections are kept alive.")
+    parser.add_argument("--keepalive_expiry", type=float, default=30.0, help="Seconds an idle pooled connection is kept open")
+    parser.add_argument("--http2", action="store_true", help="Use HTTP/2 for backend requests (requires the h2 package)")
+    parser.add_argument("--endpoints", type=str, nargs="+", default=None, metavar="URL", help="Base URLs of several replicas serving --model (vllm or openai generator). Each request goes to the healthy replica with the fewest requests in flight.")
+    parser.add_argument("--pin_instructions", action="store_true", help="With --endpoints, send all requests of one instruction to the same replica (unless it is overloaded or ejected) to reuse its prefix cache")
+    parser.add_argument("--eject_after", type=int, default=3, help="With --endpoints, stop using a replica after this many transient errors or timeouts in a row")
+    parser.add_argument("--eject_seconds", type=float, default=10.0, help="With --endpoints, how long a failing replica is ejected; doubles with every ejection in a row")
+    parser.add_argument("--stream", action="store_true", help="Stream rewrites and optimized methods and stop each one as soon as its closing code fence arrives")
+    parser.add_argument("--max_tokens", type=str, nargs="+", default=None, metavar="ROLE=N", help="Cap the completion tokens of a pipeline stage, e.g. 'analyzer=256 evolver=1024'")
+    parser.add_argument("--stop", type=str, nargs="+", default=None, metavar="ROLE=TEXT", help="Stop sequences of a pipeline stage, e.g. 'analyzer=\\n\\n'. Repeat a role for several sequences.")
+    parser.add_argument("--output_verbosity", type=str, default="full", choices=VERBOSITY_LEVELS, help="full: every rendered method and raw response. compact: methods are stored once in a table next to the output file and referenced by id, candidates keep only their rewritten instruction. minimal: only each stage's instruction.")
+    parser.add_argument("--dedup", type=str, default=None, choices=DEDUP_MODES, help="Remove near-duplicate train instructions before evolving them: keep the first of each cluster (keep_one), or drop every instruction that has a near-duplicate (drop, reads the train set twice). Disabled if not set.")
+    parser.add_argument("--dedup_threshold", type=float, default=0.8, help="Estimated Jaccard similarity of character shingles above which two instructions are near-duplicates")
+    parser.add_argument("--dedup_num_perm", type=int, default=128, help="Number of MinHash permutations; more are slower but estimate similarity more precisely")
+    parser.add_argument("--dedup_shingle_size", type=int, default=5, help="Characters per shingle")
+    parser.add_argument("--adaptive_concurrency", action="store_true", help="Adapt the number of requests in flight to the backend: raise it while latency stays flat, back off on rate limits, timeouts and latency spikes")
+    parser.add_argument("--initial_concurrency", type=int, default=16, help="With --adaptive_concurrency, number of requests in flight at the start of the run")
+    parser.add_argument("--min_concurrency", type=int, default=1, help="With --adaptive_concurrency, lowest limit of requests in flight")
+    parser.add_argument("--max_concurrency", type=int, default=None, help="With --adaptive_concurrency, highest limit of requests in flight. Defaults to --max_connections per endpoint.")
+    parser.add_argument("--latency_tolerance", type=float, default=2.0, help="With --adaptive_concurrency, back off when a stage's recent latency exceeds this multiple of its lowest sustained latency")
+    parser.add_argument("--hedge_percentile", type=float, default=None, help="Send a duplicate of a request that has been running longer than this percentile of recent latencies (e.g. 95) and use the first answer. Disabled if not set.")
     
     args = parser.parse_args()
+    validate_shard(args.num_shards, args.shard_index)
+    if args.endpoints and args.generator == "openrouter":
+        parser.error("--endpoints needs --generator vllm or openai")
+    try:
+        limits = role_limits(parse_role_values(args.max_tokens, int), parse_role_values(args.stop, multiple=True), stop_after_fence=args.stream)
+    except ValueError as e:
+        parser.error(str(e))
     
     # Load and process the dataset
-    train_set, dev_set = load_and_process_dataset(args.dataset, args.dev_set_size)
+    train_set, dev_set = load_and_process_dataset(args.dataset, args.dev_set_size, streaming=args.streaming, num_proc=args.num_proc)
     
-    generator = (
-    VLLMGenerator(model=args.model, base_url=getenv('VLLM_BACKEND') or 'http://localhost:8000/v1') 
-    if args.generator == 'vllm' 
-    else OpenRouterGenerator(model=args.model)
-    )
+    # Retries are handled by ResilientGenerator, not by the openai client. The vLLM endpoint is taken
+    # from the VLLM_BACKEND environment variable unless --endpoints lists several replicas.
+    pool_options = dict(max_retries=0, max_connections=args.max_connections, keepalive_expiry=args.keepalive_expiry, http2=args.http2,
+                        limits=limits, stream=args.stream)
+    balancer = None
+    if args.endpoints:
+        # Each replica gets its own connection pool. The balancer applies the attempt timeout itself,
+        # so that timeouts count against the replica that timed out.
+        balancer = LoadBalancedGenerator([create_generator(args.generator, args.model, base_url=url, **pool_options) for url in args.endpoints],
+                                         names=args.endpoints, pin=args.pin_instructions, eject_after=args.eject_after,
+                                         eject_seconds=args.eject_seconds, timeout=args.request_timeout)
+        backend = generator = balancer
+    else:
+        backend = generator = create_generator(args.generator, args.model, **pool_options)
+    # Innermost, so that every attempt is counted as a backend request and cache hits are not
+    metrics = MetricsRegistry()
+    generator = InstrumentedGenerator(generator, metrics)
+    # The attempt timeout is applied by the innermost layer that reacts to it
+    timeout = None if balancer else args.request_timeout
+    adaptive = None
+    if args.adaptive_concurrency:
+        # Below the retries, so that each attempt takes a slot and rate limits reach the limiter
+        max_concurrency = args.max_concurrency or args.max_connections * len(args.endpoints or [None])
+        try:
+            adaptive = generator = AdaptiveConcurrencyGenerator(generator, initial_limit=min(args.initial_concurrency, max_concurrency), min_limit=args.min_concurrency,
+                                                                max_limit=max_concurrency, latency_tolerance=args.latency_tolerance, timeout=timeout)
+        except ValueError as e:
+            parser.error(str(e))
+        timeout = None
+        metrics.gauge("concurrency_limit", lambda: round(adaptive.limit, 1))
+        metrics.gauge("concurrency_waiting", lambda: adaptive.waiting)
+    resilient = generator = ResilientGenerator(generator, max_retries=args.max_retries, timeout=timeout, hedge_percentile=args.hedge_percentile)
+    recorder = None
+    if args.log_prompts:
+        recorder = generator = RecordingGenerator(generator, args.log_prompts)
+    if args.cache_dir:
+        generator = CachedGenerator(generator, cache_dir=args.cache_dir, max_bytes=int(args.cache_size_gb * (1 << 30)))
+    tracer = None
+    if args.trace_file:
+        tracer = Tracer(sample_rate=args.trace_sample_rate)
+        generator = TracedGenerator(generator)
 
+    if args.use_reward_model:
+        # Imported here so that runs without a reward model never load torch and transformers
+        from src.evaluator import RewardModelEvaluator
+        evaluator = RewardModelEvaluator(device=args.reward_model_device, max_batch_size=args.reward_batch_size, max_wait_ms=args.reward_max_wait_ms)
+    else:
+        evaluator = FailureDetectorEvaluator()
 
     components = {
         'generator': generator,
         'evolver': RecurrentEvolver(generator),
-        'analyzer': TrajectoryAnalyzer(generator),
-        'evaluator': RewardModelEvaluator() if args.use_reward_model else FailureDetectorEvaluator(),
-        'dev_set': dev_set
+        'analyzer': TrajectoryAnalyzer(generator, batched=args.batched_analysis),
+        'evaluator': evaluator,
+        'dev_set': dev_set,
+        'tracer': tracer,
     }
-    components['optimizer'] = EvolOptimizer(generator, components['evaluator'])
+    components['optimizer'] = EvolOptimizer(
+        generator,
+        components['evaluator'],
+        successive_halving=args.successive_halving,
+        halving_keep_fraction=args.halving_keep_fraction,
+        halving_min_dev_size=args.halving_min_dev_size,
+    )
+    
+    # Methods are appended to the table file as they appear, so only their ids need to stay in memory
+    auto_evol = AutoEvol(components, verbosity=args.output_verbosity, methods=MethodTable(retain=False))
     
-    auto_evol = AutoEvol(components)
+    # Streamed datasets have no known size
+    train_size = operator.length_hint(train_set, -1)
+    dedup_index = None
+    if args.dedup:
+        # Before sharding, so that near-duplicates in different shards are found: every shard runs the
+        # same deterministic pass over the whole train set
+        try:
+            dedup_index = NearDuplicateIndex(threshold=args.dedup_threshold, num_perm=args.dedup_num_perm, shingle_size=args.dedup_shingle_size)
+        except ValueError as e:
+            parser.error(str(e))
+        train_set = deduplicate(train_set, dedup_index, mode=args.dedup)
+    if args.num_shards > 1:
+        # Every shard sees the same dev set; only the train set is partitioned, by instruction hash
+        train_set = shard_instructions(train_set, args.num_shards, args.shard_index)
+        if train_size != -1:
+            train_size = -(-train_size // args.num_shards)
+    train_size_str = str(train_size) if train_size != -1 else "unknown (streaming)"
+    if args.dedup and train_size != -1:
+        train_size_str = f"at most {train_size} (near-duplicates are removed as the train set is read)"
     
     print(f"Dataset: {args.dataset}")
     if args.dev_set_size != -1:
-        print(f"Train set size: {len(train_set)}, Dev set size: {len(dev_set)}")
+        print(f"Train set size: {train_size_str}, Dev set size: {len(dev_set)}")
     else:
-        print(f"Train set size: {len(train_set)}")
+        print(f"Train set size: {train_size_str}")
     print(f"Batch size: {args.batch_size}")
     print(f"Number of methods: {args.num_methods}")
     print(f"Max concurrent batches: {args.max_concurrent_batches}")
+    if args.num_shards > 1:
+        print(f"Shard: {args.shard_index} of {args.num_shards} (train set size is an estimate)")
+    
+    max_in_flight = args.max_in_flight or args.batch_size * args.max_concurrent_batches
+    print(f"Max in-flight instructions: {max_in_flight}")
     
     start_time = time.time()
     
-    output_file = args.output_file
-    all_results = []
+    output_file = shard_path(args.output_file, args.num_shards, args.shard_index)
+    # Methods referenced by compact records; each is appended once, before the first record using it
+    method_file = methods_path(output_file) if args.output_verbosity != "full" else None
+    if args.resume:
+        completed = load_completed(output_file)
+        train_set = (instruction for instruction in train_set if instruction not in completed)
+        if train_size != -1:
+            train_size = max(0, train_size - len(completed))
+        if method_file and os.path.exists(method_file):
+            auto_evol.methods.load(read_jsonl(method_file))
+        print(f"Resuming: {len(completed)} instructions already done")
+    else:
+        open(output_file, 'w').close()
+        if method_file:
+            open(method_file, 'w').close()
     
-    total_batches = (len(train_set) + args.batch_size - 1) // args.batch_size  # Calculate total number of batches
-
-    for i in range(0, len(train_set), args.batch_size):
-        batch = train_set[i:i+args.batch_size]
-        batch_results = await auto_evol.run(batch, batch_size=args.batch_size, num_methods=args.num_methods, max_concurrent_batches=args.max_concurrent_batches, evolve_epoch=args.evolve_epoch)
-        all_results.extend(batch_results)
-        
-        current_batch = i // args.batch_size + 1
-        print(f"Done batch {current_batch}/{total_batches}")  # New print statement for batch progress
-        print(f"Batch {current_batch} completed. Saving results...")
-        await save_results(all_results, output_file)
+    # With dedup, the train set size is only an upper bound
+    pbar = tqdm(total=train_size if train_size != -1 and not args.dedup else None, desc="Processing instructions")
+    reporter = asyncio.create_task(report_periodically(metrics, args.metrics_interval, tqdm.write)) if args.metrics_interval > 0 else None
+    if recorder is not None:
+        await recorder.open()
+    try:
+        async with JsonlWriter(output_file) as writer, (JsonlWriter(method_file) if method_file else contextlib.nullcontext()) as method_writer:
+            # Reading the dataset (remote shards, the shuffle buffer, dedup signatures) runs in a worker
+            # thread, so that it does not stall the requests in flight
+            async for result in auto_evol.stream(iterate_in_thread(train_set), num_methods=args.num_methods, max_in_flight=max_in_flight, evolve_epoch=args.evolve_epoch, pbar=pbar):
+                if method_writer is not None:
+                    new_methods = auto_evol.methods.pending()
+                    if new_methods:
+                        # The methods file is written by its own task; a record must not reach the
+                        # output file before the methods it refers to, or a crash would leave it dangling
+                        method_writer.write_many(new_methods)
+                        await method_writer.flush()
+                writer.write(result)
+    finally:
+        if reporter is not None:
+            reporter.cancel()
+        if recorder is not None:
+            await recorder.close()
+        pbar.close()
+        print(metrics.summary())
+        print(f"Retries: {resilient.retries}, hedged requests: {resilient.hedges} ({resilient.hedge_wins} answered first)")
+        if adaptive is not None:
+            print(adaptive.summary())
+        if balancer is not None:
+            print(f"Replicas:\n{balancer.summary()}")
+        if dedup_index is not None:
+            stats = dedup_index.stats()
+            removed = stats["num_duplicates"] if args.dedup == "keep_one" else stats["texts_in_duplicate_clusters"]
+            print(f"Near-duplicate instructions removed ({args.dedup}): {removed} of {stats['num_texts']} read, "
+                  f"in {stats['num_duplicate_clusters']} clusters (largest: {stats['largest_cluster']})")
+        if args.stream:
+            print(f"Streamed responses stopped at their closing fence: {backend.early_stops}")
+        if args.metrics_file:
+            metrics.dump(args.metrics_file)
+        if tracer is not None:
+            tracer.export(args.trace_file)
+            print(f"Trace of {tracer.traces_sampled} instructions saved to {args.trace_file}")
     
     end_time = time.time()
     total_time = end_time - start_time
     
     print(f"Total execution time: {total_time:.2f} seconds")
     print(f"Final results saved to {output_file}")
+    if method_file:
+        print(f"Methods referenced by the results saved to {method_file}")
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -1,2 +1,13 @@
-from .generators import *
-from .autoevol import AutoEvol
\ No newline at end of file
+import importlib
+
+from .autoevol import AutoEvol
+
+# Generators stay importable from the top-level package without loading their backends up front
+from .generators import __all__ as _GENERATORS
+
+__all__ = ["AutoEvol", *_GENERATORS]
+
+def __getattr__(name):
+    if name in _GENERATORS:
+        return getattr(importlib.import_module(".generators", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,5 +1,6 @@
 import asyncio
-from typing import List
+import re
+from typing import Dict, List
 
 from .base_analyzer import BaseAnalyzer
 from src.generators import BaseGenerator
@@ -30,11 +31,66 @@ Evolution Trajectory:
 {{evol_trajectory}}
 """
 
+TRAJECTORY_ANALYZER_BATCH_PROMPT = """
+The following list shows cases where an Instruction evolves into a more complex version of an Instruction.
+All cases start from the same Instruction: stage 0 represents the Instruction in its initial state, and stage 1 of each case requires an increase in complexity based on stage 0.
+
+Please check every case, identify cases that failed to evolve, and provide the reason why it fails.
+
+Please strictly output using the following format, do not add anything else to the response:
+
+***FORMAT INSTRUCTION***
+Output exactly one line per case, in order. For each case, choose one of the two options:
+Option 1 - If the case is evolving correctly, please strictly output:
+Case [case_number]: ### PASSED
+
+Option 2 - If the case did not evolve correctly, please strictly output:
+Case [case_number]: ### FAILED - Reason: [reason_of_fail]
+***END OF FORMAT INSTRUCTION***
+
+Evolution Trajectories:
+Stage 0: {{init_instruction}}
+
+{{cases}}
+"""
+
+CASE_VERDICT_REGEX = re.compile(r"^[\s*#]*Case\s+(\d+)\s*\**\s*[:.\-]\s*###\s*(PASSED|FAILED)([^\n]*)$", re.MULTILINE | re.IGNORECASE)
+
+def parse_case_verdicts(response: str, num_cases: int) -> Dict[int, str]:
+    # Map 0-based case index to its "### PASSED" / "### FAILED - Reason: ..." verdict
+    verdicts = {}
+    for match in CASE_VERDICT_REGEX.finditer(response or ""):
+        index = int(match.group(1)) - 1
+        if 0 <= index < num_cases and index not in verdicts:
+            verdicts[index] = f"### {match.group(2).upper()}{match.group(3).rstrip()}"
+    return verdicts
+
 class TrajectoryAnalyzer(BaseAnalyzer):
-    def __init__(self, generator: BaseGenerator) -> None:
+    def __init__(self, generator: BaseGenerator, batched: bool = False) -> None:
         self.generator = generator
+        self.batched = batched
         
     async def analyze_async(self, init_instruction: str, evolved_instructions: List[str]) -> List[str]:
+        if self.batched and len(evolved_instructions) > 1:
+            return await self.analyze_batch_async(init_instruction, evolved_instructions)
+        return await self.analyze_each_async(init_instruction, evolved_instructions)
+
+    async def analyze_batch_async(self, init_instruction: str, evolved_instructions: List[str]) -> List[str]:
+        # Judge all candidates in one call that carries the shared Stage 0 only once
+        cases = "\n\n".join(f"Case {i}:\nStage 1: {evolved_instruction}" for i, evolved_instruction in enumerate(evolved_instructions, start=1))
+        batch_prompt = TRAJECTORY_ANALYZER_BATCH_PROMPT.replace('{{init_instruction}}', init_instruction).replace('{{cases}}', cases)
+        response = await self.generator.agenerate(prompt=batch_prompt, system_prompt=TRAJECTORY_ANALYZER_SYSTEM_PROMPT, temperature=0.2)
+        verdicts = parse_case_verdicts(response, len(evolved_instructions))
+
+        # Only cases the model did not answer in the expected format are analyzed again one by one
+        missing = [i for i in range(len(evolved_instructions)) if i not in verdicts]
+        if missing:
+            retried = await self.analyze_each_async(init_instruction, [evolved_instructions[i] for i in missing])
+            verdicts.update(zip(missing, retried))
+
+        return [verdicts[i] for i in range(len(evolved_instructions))]
+
+    async def analyze_each_async(self, init_instruction: str, evolved_instructions: List[str]) -> List[str]:
         async def generate_single(evolved_instruction):
             trajectory_str = f"""
             Stage 0: {init_instruction}
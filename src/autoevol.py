@@ -1,19 +1,29 @@
 import asyncio
 import time
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, AsyncIterable, AsyncIterator, Optional, Union
 from src.evolvers.recurrent_evolver import INITIAL_EVOLVE_METHOD
-from .utils import parse_steps
+from .utils import parse_steps, imap_unordered
+from .generators.balanced import route_by
+from .records import VERBOSITY_LEVELS, MethodTable, compact_stage, method_entry
+from .metrics import role
+from .tracing import span
 from tqdm import tqdm
 
 class AutoEvol:
-    def __init__(self, components: Dict[str, Any]):
+    def __init__(self, components: Dict[str, Any], verbosity: str = "full", methods: Optional[MethodTable] = None):
+        # Below "full", results reference their methods by id; the methods themselves are kept once in `methods`
+        if verbosity not in VERBOSITY_LEVELS:
+            raise ValueError(f"Unknown verbosity {verbosity!r}; expected one of {', '.join(VERBOSITY_LEVELS)}")
         self.components = components
+        self.verbosity = verbosity
+        self.methods = methods if methods is not None else MethodTable()
 
     async def process_instruction(self, instruction: str, num_methods: int, evolve_epoch: int = 2) -> Dict[str, Any]:
         start_time = time.time()
         instruction_stages = [instruction]
         methods = [INITIAL_EVOLVE_METHOD.replace("{{instruction}}", instruction_stages[0])]
         current_method = methods[0]
+        current_entry = method_entry(template=INITIAL_EVOLVE_METHOD)
 
         result = {
             "original_instruction": instruction,
@@ -32,26 +42,30 @@ class AutoEvol:
                 "final_evolved_instruction": ""
             }
             
-            evolved_instructions = await self.components['evolver'].evolve_async(instruction_stages[-1], current_method, n=num_methods)
+            with role("evolver"), span("evolve", stage=i + 1, n=num_methods):
+                evolved_instructions = await self.components['evolver'].evolve_async(instruction_stages[-1], current_method, n=num_methods)
             
-            feedbacks = await self.components['analyzer'].analyze_async(instruction_stages[-1], evolved_instructions)
+            with role("analyzer"), span("analyze", stage=i + 1):
+                feedbacks = await self.components['analyzer'].analyze_async(instruction_stages[-1], evolved_instructions)
             
             stage_result["evolved_instructions"] = evolved_instructions
             stage_result["feedbacks"] = feedbacks
 
-            optimized_method, _ = await self.components['optimizer'].optimize(
-                current_method, 
-                feedback=feedbacks, 
-                evolver=self.components['evolver'], 
-                development_set=self.components['dev_set'] if len(self.components['dev_set']) > 0 else [instruction_stages[-1]]
-            )
+            with role("optimizer"), span("optimize", stage=i + 1):
+                optimized_method, _ = await self.components['optimizer'].optimize(
+                    current_method, 
+                    feedback=feedbacks, 
+                    evolver=self.components['evolver'], 
+                    development_set=self.components['dev_set'] if len(self.components['dev_set']) > 0 else [instruction_stages[-1]]
+                )
             
             optimized_method_steps = parse_steps(optimized_method)
             optimized_method = self.components['evolver'].build_new_method(optimized_method_steps, instruction_stages[-1])
             
             stage_result["optimized_method"] = optimized_method
 
-            evolved_instruction = await self.components['generator'].agenerate(prompt=optimized_method, temperature=0.5)
+            with role("final_rewrite"), span("final_rewrite", stage=i + 1):
+                evolved_instruction = await self.components['generator'].agenerate(prompt=optimized_method, temperature=0.5)
             evolved_instruction_steps = parse_steps(evolved_instruction)
             
             try:
@@ -68,36 +82,63 @@ class AutoEvol:
             stage_result["final_evolved_instruction"] = evolved_instruction
             stage_end_time = time.time()
             stage_result["stage_time"] = stage_end_time - stage_start_time
+            optimized_entry = method_entry(steps=optimized_method_steps)
+            if self.verbosity != "full":
+                stage_result = compact_stage(stage_result, self.methods.add(current_entry), self.methods.add(optimized_entry), self.verbosity)
+            current_entry = optimized_entry
             result["stages"].append(stage_result)
 
         result["final_instruction"] = instruction_stages[-1]
         end_time = time.time()
         result["total_time"] = end_time - start_time
+        if self.verbosity != "full":
+            result["verbosity"] = self.verbosity
         return result
-    
-    async def process_batch(self, batch: List[str], num_methods: int, evolve_epoch: int, pbar: tqdm) -> List[Dict[str, Any]]:
-        batch_results = await asyncio.gather(*[self.process_instruction(instruction, num_methods, evolve_epoch) for instruction in batch])
-        pbar.update(len(batch))
-        return batch_results
 
-    async def run(self, dataset: List[str], batch_size: int = 10, num_methods: int = 5, max_concurrent_batches: int = 2, evolve_epoch: int = 2) -> List[Dict[str, Any]]:
-        print(f"Starting dataset processing. Dataset size: {len(dataset)}, Max concurrent batches: {max_concurrent_batches}")
+    async def run_instruction(self, instruction: str, num_methods: int, evolve_epoch: int = 2) -> Optional[Dict[str, Any]]:
+        # One trace per instruction when a tracer is configured and samples it. An instruction whose
+        # requests still fail after the generator's retries is dropped instead of failing the run.
+        # Its requests are routed by the instruction, so a balancer can pin them to one replica.
+        tracer = self.components.get('tracer')
+        try:
+            with route_by(instruction):
+                if tracer is None:
+                    return await self.process_instruction(instruction, num_methods, evolve_epoch)
+                with tracer.trace("instruction", instruction=instruction[:200]):
+                    return await self.process_instruction(instruction, num_methods, evolve_epoch)
+        except Exception as e:
+            print(f"Error: failed to evolve instruction {instruction[:80]!r}: {type(e).__name__}: {e}")
+            return None
+    
+    async def stream(self, dataset: Union[Iterable[str], AsyncIterable[str]], num_methods: int = 5, max_in_flight: int = 10, evolve_epoch: int = 2, pbar: Optional[tqdm] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Evolve instructions from `dataset` with a fixed pool of `max_in_flight` instructions in progress.
+
+        A new instruction is started as soon as any in-flight one finishes, and results are yielded in
+        completion order, so a slow instruction never holds back the rest of the dataset. Failed
+        instructions are skipped, so that a resumed run retries them. Pass a blocking source, such as a
+        streamed dataset, through `src.utils.iterate_in_thread` so that reading it does not stall the event loop.
+        """
+        async for _, result in imap_unordered(lambda instruction: self.run_instruction(instruction, num_methods, evolve_epoch), dataset, max_in_flight):
+            if pbar is not None:
+                pbar.update(1)
+            if result is not None:
+                yield result
+
+    async def run(self, dataset: List[str], batch_size: int = 10, num_methods: int = 5, max_concurrent_batches: int = 2, evolve_epoch: int = 2) -> List[Optional[Dict[str, Any]]]:
+        max_in_flight = batch_size * max_concurrent_batches
+        print(f"Starting dataset processing. Dataset size: {len(dataset)}, Max in-flight instructions: {max_in_flight}")
         start_time = time.time()
 
-        batches = [dataset[i:i+batch_size] for i in range(0, len(dataset), batch_size)]
         pbar = tqdm(total=len(dataset), desc="Processing instructions")
-
-        semaphore = asyncio.Semaphore(max_concurrent_batches)
-
-        async def process_batch_with_semaphore(batch):
-            async with semaphore:
-                return await self.process_batch(batch, num_methods, evolve_epoch, pbar)
-
-        results = await asyncio.gather(*[process_batch_with_semaphore(batch) for batch in batches])
+        # Failed instructions are left as None
+        results = [None] * len(dataset)
+        async for index, result in imap_unordered(lambda instruction: self.run_instruction(instruction, num_methods, evolve_epoch), dataset, max_in_flight):
+            results[index] = result
+            pbar.update(1)
 
         pbar.close()
 
         end_time = time.time()
         total_time = end_time - start_time
         print(f"\nDataset processing complete. Total time: {total_time:.2f} seconds")
-        return [item for sublist in results for item in sublist]  # Flatten the list of batch results
\ No newline at end of file
+        return results
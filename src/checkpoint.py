@@ -0,0 +1,110 @@
+import asyncio
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    # Yield records from a JSONL file, ignoring a truncated last line left behind by a crash.
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def repair_jsonl(path: str) -> None:
+    """Truncate `path` after its last complete line so that new records are appended cleanly."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        data = f.read()
+        if not data or data.endswith(b'\n'):
+            return
+        f.truncate(data.rfind(b'\n') + 1)
+
+
+def load_completed(path: str, key: str = "original_instruction") -> Set[str]:
+    """Return the `key` values of every record already written to the checkpoint at `path`."""
+    if not os.path.exists(path):
+        return set()
+    return {record[key] for record in read_jsonl(path) if key in record}
+
+
+class JsonlWriter:
+    """Append-only JSONL writer that serializes and flushes records from a background task.
+
+    Usage:
+        async with JsonlWriter("results.jsonl") as writer:
+            writer.write(record)
+    """
+
+    def __init__(self, path: str, fsync: bool = False) -> None:
+        self.path = path
+        self.fsync = fsync
+        self.records_written = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._file = None
+
+    async def __aenter__(self) -> "JsonlWriter":
+        repair_jsonl(self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._drain())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self._queue.put_nowait(record)
+
+    def write_many(self, records: Iterable[Dict[str, Any]]) -> None:
+        for record in records:
+            self.write(record)
+
+    async def flush(self) -> None:
+        """Wait until every record written so far is in the file, e.g. before writing records that refer to them elsewhere."""
+        await self._queue.join()
+        if self._task.done():
+            # Raise the error that stopped the background task
+            self._task.result()
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+        self._file.close()
+
+    async def _drain(self) -> None:
+        done = False
+        while not done:
+            # Write everything that piled up while the previous flush was running in one go
+            records: List[Dict[str, Any]] = [await self._queue.get()]
+            while not self._queue.empty():
+                records.append(self._queue.get_nowait())
+            taken = len(records)
+            try:
+                if records[-1] is None:
+                    records.pop()
+                    done = True
+                if records:
+                    lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+                    await asyncio.to_thread(self._append, lines)
+                    self.records_written += len(records)
+            finally:
+                for _ in range(taken):
+                    self._queue.task_done()
+
+    def _append(self, lines: str) -> None:
+        self._file.write(lines)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
@@ -0,0 +1,85 @@
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+LOCAL_FORMATS = {".json": "json", ".jsonl": "json", ".parquet": "parquet"}
+
+def first_human_turn(conversations: List[Dict[str, str]]) -> Optional[str]:
+    # Samples that start with a system prompt are skipped
+    for turn in conversations:
+        if turn['from'] == 'system':
+            return None
+        if turn['from'] == 'human':
+            return turn['value']
+    return None
+
+def extract_instructions(batch: Dict[str, List[Any]]) -> Dict[str, List[Optional[str]]]:
+    return {"instruction": [first_human_turn(conversations) for conversations in batch["conversations"]]}
+
+def load_source(name_or_path: str, streaming: bool = False):
+    """Load the 'train' split of a Hugging Face dataset or of a local JSON/JSONL/Parquet file."""
+    from datasets import load_dataset
+
+    extension = os.path.splitext(name_or_path)[1].lower()
+    if os.path.isfile(name_or_path) and extension in LOCAL_FORMATS:
+        dataset = load_dataset(LOCAL_FORMATS[extension], data_files={"train": name_or_path}, streaming=streaming)
+    else:
+        dataset = load_dataset(name_or_path, streaming=streaming)
+
+    if 'train' not in dataset:
+        raise ValueError(f"The dataset {name_or_path} does not have a 'train' split.")
+    return dataset['train']
+
+class InstructionStream:
+    """Lazily iterates the instructions of a dataset produced by `load_instructions`.
+
+    Only the rows being consumed are held in memory. `len()` is not defined because streaming sources
+    have no known size; `operator.length_hint` returns the number of rows when it is known.
+    """
+
+    def __init__(self, dataset, num_rows: Optional[int] = None) -> None:
+        self.dataset = dataset
+        self.num_rows = num_rows
+
+    def __iter__(self) -> Iterator[str]:
+        for row in self.dataset:
+            yield row["instruction"]
+
+    def __length_hint__(self) -> int:
+        return self.num_rows if self.num_rows is not None else NotImplemented
+
+def load_instructions(name_or_path: str, dev_set_size: int = -1, streaming: bool = False, num_proc: Optional[int] = None,
+                      seed: int = 42, shuffle_buffer_size: int = 10000) -> Tuple[InstructionStream, List[str]]:
+    """Load a ShareGPT-style dataset and return (lazy train instructions, dev instructions).
+
+    The instruction of each sample is its first human turn. Without `streaming`, the dataset is shuffled
+    and the turns are extracted with `num_proc` worker processes into Arrow files on disk. With
+    `streaming`, rows are read, shuffled within a `shuffle_buffer_size` window and extracted on the fly,
+    so nothing is downloaded or materialized up front. The first `dev_set_size` instructions form the
+    dev set (-1 for no dev set).
+    """
+    dataset = load_source(name_or_path, streaming=streaming)
+
+    if streaming:
+        dataset = dataset.shuffle(seed=seed, buffer_size=shuffle_buffer_size)
+        dataset = dataset.map(extract_instructions, batched=True, remove_columns=dataset.column_names)
+        dataset = dataset.filter(lambda instruction: instruction is not None, input_columns="instruction")
+    else:
+        dataset = dataset.shuffle(seed=seed)
+        dataset = dataset.map(extract_instructions, batched=True, num_proc=num_proc, remove_columns=dataset.column_names)
+        dataset = dataset.filter(lambda instruction: instruction is not None, input_columns="instruction", num_proc=num_proc)
+
+    if dev_set_size == -1:
+        return InstructionStream(dataset, None if streaming else len(dataset)), []
+
+    if streaming:
+        dev_instructions = [row["instruction"] for row in dataset.take(dev_set_size)]
+        train_dataset = dataset.skip(dev_set_size)
+    else:
+        dev_instructions = list(dataset.select(range(min(dev_set_size, len(dataset))))["instruction"])
+        train_dataset = dataset.select(range(len(dev_instructions), len(dataset)))
+
+    # Ensure dev_set_size is not larger than the dataset
+    if len(dev_instructions) < dev_set_size:
+        raise ValueError(f"Specified dev set size ({dev_set_size}) is larger than the dataset size ({len(dev_instructions)})")
+
+    return InstructionStream(train_dataset, None if streaming else len(train_dataset)), dev_instructions
@@ -0,0 +1,213 @@
+import re
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+import numpy as np
+
+T = TypeVar("T")
+
+DEDUP_MODES = ("keep_one", "drop")
+
+# Punctuation and whitespace runs; texts that only differ in them are the same text
+SEPARATOR_REGEX = re.compile(r"[\W_]+")
+
+SHINGLE_PRIME = np.uint64(1099511628211)
+# Elements of one (permutations x shingles) block of hash values: 4M uint32, 16 MB
+MAX_BLOCK_ELEMENTS = 1 << 22
+
+# np.trapz was renamed to np.trapezoid in NumPy 2.0
+_trapezoid = getattr(np, "trapezoid", None) or np.trapz
+
+def normalize(text: str) -> str:
+    return SEPARATOR_REGEX.sub(" ", text.lower()).strip()
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    # splitmix64 finalizer, so that the upper 32 bits depend on every byte of the shingle
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """(bands, rows per band) whose LSH curve best separates pairs above and below `threshold`.
+
+    Minimizes the sum of the probabilities of a false positive (a pair less similar than `threshold`
+    sharing a band) and of a false negative (a pair at least that similar sharing no band).
+    """
+    similarity = np.linspace(0.0, 1.0, 201)
+    below, above = similarity <= threshold, similarity >= threshold
+    best, best_error = (1, num_perm), float("inf")
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            candidate = 1.0 - (1.0 - similarity ** rows) ** bands
+            error = _trapezoid(candidate[below], similarity[below]) + _trapezoid(1.0 - candidate[above], similarity[above])
+            if error < best_error:
+                best, best_error = (bands, rows), error
+    return best
+
+class MinHasher:
+    """MinHash signatures of normalized character shingles, computed for a whole batch of texts at once.
+
+    Texts are lowercased and their punctuation and whitespace collapsed to single spaces. Every
+    `shingle_size`-byte window of the UTF-8 text is hashed with one rolling polynomial over the batch,
+    and the `num_perm` hash functions are random linear permutations of those values, reduced to their
+    per-text minimum with `np.minimum.reduceat`. No Python code runs per shingle.
+    """
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1) -> None:
+        if num_perm < 1 or shingle_size < 1:
+            raise ValueError(f"num_perm and shingle_size must be at least 1, got {num_perm} and {shingle_size}")
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # Odd multipliers: every hash function is a permutation of the 32-bit shingle hashes
+        self._a = (rng.integers(0, 1 << 32, size=(num_perm, 1), dtype=np.uint64) | np.uint64(1)).astype(np.uint32)
+        self._b = rng.integers(0, 1 << 32, size=(num_perm, 1), dtype=np.uint64).astype(np.uint32)
+
+    def shingles(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(32-bit shingle hashes of all texts, offset of each text's first shingle). Every text has at least one shingle."""
+        size = self.shingle_size
+        # Texts shorter than one shingle are padded to exactly one; normalized text never contains NUL
+        encoded = [normalize(text).encode("utf-8").ljust(size, b"\0") for text in texts]
+        lengths = np.fromiter((len(data) for data in encoded), dtype=np.int64, count=len(encoded))
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+
+        windows = len(data) - size + 1
+        hashes = np.zeros(windows, dtype=np.uint64)
+        for j in range(size):
+            hashes = hashes * SHINGLE_PRIME + data[j:j + windows]
+
+        # Keep the windows that lie inside one text
+        counts = lengths - size + 1
+        offsets = np.zeros(len(texts), dtype=np.int64)
+        np.cumsum(counts[:-1], out=offsets[1:])
+        starts = np.cumsum(lengths) - lengths
+        positions = np.arange(counts.sum(), dtype=np.int64) + np.repeat(starts - offsets, counts)
+        return (_mix(hashes[positions]) >> np.uint64(32)).astype(np.uint32), offsets
+
+    def signatures(self, texts: Sequence[str]) -> np.ndarray:
+        """MinHash signatures of `texts` as a (len(texts), num_perm) uint32 array."""
+        if not texts:
+            return np.zeros((0, self.num_perm), dtype=np.uint32)
+        shingles, offsets = self.shingles(texts)
+        signatures = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        step = max(1, MAX_BLOCK_ELEMENTS // len(shingles))
+        for lo in range(0, self.num_perm, step):
+            hi = min(self.num_perm, lo + step)
+            # (a * x + b) mod 2^32 in place, in 32-bit arithmetic that is several times faster than 64-bit
+            values = self._a[lo:hi] * shingles[None, :]
+            values += self._b[lo:hi]
+            signatures[:, lo:hi] = np.minimum.reduceat(values, offsets, axis=1).T
+        return signatures
+
+class NearDuplicateIndex:
+    """Streaming MinHash LSH index that assigns every added text to a cluster of near-duplicates.
+
+    Texts are numbered in the order they are added. A text whose estimated Jaccard similarity to the
+    representative of an existing cluster is at least `threshold` joins that cluster; otherwise it
+    becomes the representative of a new one. Only representatives are stored, as their signature and
+    one bucket per LSH band, so memory grows with the number of distinct texts.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128, shingle_size: int = 5, seed: int = 1) -> None:
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError(f"threshold must be in (0, 1], got {threshold}")
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size, seed=seed)
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        self._buckets: List[Dict[int, int]] = [{} for _ in range(self.bands)]
+        self._signatures: Dict[int, np.ndarray] = {}
+        self._cluster_sizes: Dict[int, int] = {}
+        self.num_texts = 0
+
+    def add(self, texts: Sequence[str]) -> List[int]:
+        """Add `texts` and return the cluster of each, i.e. the number of its cluster's representative."""
+        signatures = self.hasher.signatures(texts)
+        keys = self._band_keys(signatures).tolist()
+        clusters = []
+        for signature, bands in zip(signatures, keys):
+            number = self.num_texts
+            self.num_texts += 1
+            cluster = self._find(signature, bands)
+            if cluster is None:
+                cluster = number
+                self._signatures[number] = signature
+                for buckets, key in zip(self._buckets, bands):
+                    buckets.setdefault(key, number)
+            else:
+                self._cluster_sizes[cluster] = self._cluster_sizes.get(cluster, 1) + 1
+            clusters.append(cluster)
+        return clusters
+
+    def cluster_size(self, cluster: int) -> int:
+        return self._cluster_sizes.get(cluster, 1)
+
+    def stats(self) -> Dict[str, Any]:
+        """Cluster statistics of the texts added so far."""
+        sizes = list(self._cluster_sizes.values())
+        duplicates = sum(sizes) - len(sizes)
+        histogram: Dict[int, int] = {}
+        for size in sizes:
+            histogram[size] = histogram.get(size, 0) + 1
+        return {
+            "num_texts": self.num_texts,
+            "num_unique": self.num_texts - duplicates,
+            "num_duplicates": duplicates,
+            "duplicate_fraction": duplicates / self.num_texts if self.num_texts else 0.0,
+            "num_duplicate_clusters": len(sizes),
+            "texts_in_duplicate_clusters": sum(sizes),
+            "largest_cluster": max(sizes, default=1 if self.num_texts else 0),
+            "cluster_size_histogram": dict(sorted(histogram.items())),
+        }
+
+    def _band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        keys = np.zeros((len(signatures), self.bands), dtype=np.uint64)
+        for row in range(self.rows):
+            keys = keys * SHINGLE_PRIME + signatures[:, row:self.bands * self.rows:self.rows]
+        return _mix(keys)
+
+    def _find(self, signature: np.ndarray, bands: List[int]) -> Optional[int]:
+        # Lowest-numbered representative sharing a band whose estimated similarity passes the threshold
+        candidates = {buckets[key] for buckets, key in zip(self._buckets, bands) if key in buckets}
+        for candidate in sorted(candidates):
+            if np.count_nonzero(self._signatures[candidate] == signature) >= self.threshold * len(signature):
+                return candidate
+        return None
+
+def _batches(items: Iterable[T], batch_size: int) -> Iterator[List[T]]:
+    batch: List[T] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def deduplicate(items: Iterable[T], index: NearDuplicateIndex, mode: str = "keep_one", key: Callable[[T], str] = lambda item: item,
+                batch_size: int = 1024) -> Iterator[T]:
+    """Lazily yield the `items` that survive near-duplicate removal of their `key` text.
+
+    `keep_one` yields the first item of every cluster in a single pass, so `items` may be a stream.
+    `drop` yields only items without any near-duplicate: the clusters are only known once every item
+    has been added to `index`, so `items` is iterated twice and must yield the same items in the same
+    order both times. Cluster statistics are available from `index.stats()` once iteration is done.
+    """
+    if mode not in DEDUP_MODES:
+        raise ValueError(f"Unknown dedup mode {mode!r}; expected one of {', '.join(DEDUP_MODES)}")
+    if mode == "keep_one":
+        for batch in _batches(items, batch_size):
+            first = index.num_texts
+            for number, (item, cluster) in enumerate(zip(batch, index.add([key(item) for item in batch])), first):
+                if cluster == number:
+                    yield item
+        return
+
+    if iter(items) is items:
+        raise ValueError("dedup mode 'drop' iterates the items twice; pass a collection or re-iterable dataset, not an iterator")
+    clusters = []
+    for batch in _batches(items, batch_size):
+        clusters.extend(index.add([key(item) for item in batch]))
+    for position, item in enumerate(items):
+        if position >= len(clusters):
+            raise ValueError("items changed between the two passes of dedup mode 'drop'")
+        if index.cluster_size(clusters[position]) == 1:
+            yield item
@@ -1,3 +1,16 @@
+import importlib
+
 from .base_evaluator import BaseEvaluator
 from .failure_detector_evaluator import FailureDetectorEvaluator
-from .reward_model_evaluator import RewardModelEvaluator
\ No newline at end of file
+
+# The reward model evaluator needs torch and transformers, so it is imported on first use
+_LAZY_EVALUATORS = {
+    "RewardModelEvaluator": ".reward_model_evaluator",
+}
+
+__all__ = ["BaseEvaluator", "FailureDetectorEvaluator", *_LAZY_EVALUATORS]
+
+def __getattr__(name):
+    if name in _LAZY_EVALUATORS:
+        return getattr(importlib.import_module(_LAZY_EVALUATORS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
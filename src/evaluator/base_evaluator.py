@@ -1,11 +1,28 @@
+import inspect
 from abc import ABC, abstractmethod
 from typing import List, Optional
 
 class BaseEvaluator(ABC):
+    # Whether a larger score from `score_methods` means a better method
+    higher_is_better: bool = True
+
     @abstractmethod
     def evaluate(self, instructions: List[str], responses: List[str]) -> float:
         pass
 
     @abstractmethod
-    def select_best_method(self, methods: List[str], instructions: List[str], responses: List[List[str]]) -> tuple:
-        pass
\ No newline at end of file
+    def select_best_method(self, methods: List[str], instructions: List[List[str]], responses: List[List[str]]) -> tuple:
+        # instructions[i] and responses[i] hold the dev-set instructions evolved by methods[i] and their responses
+        pass
+
+    async def score_methods(self, instructions: List[List[str]], responses: List[List[str]]) -> List[float]:
+        # Score every method on its own instructions/responses, used to rank candidates without picking one.
+        # Scores each method with `evaluate` (sync or async); evaluators that can score all methods in one
+        # pass override this
+        scores = []
+        for method_instructions, method_responses in zip(instructions, responses):
+            score = self.evaluate(method_instructions, method_responses)
+            if inspect.isawaitable(score):
+                score = await score
+            scores.append(score)
+        return scores
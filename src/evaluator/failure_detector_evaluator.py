@@ -1,38 +1,49 @@
 from .base_evaluator import BaseEvaluator
 from typing import List, Tuple
 import re
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 class FailureDetectorEvaluator(BaseEvaluator):
-    def __init__(self, max_workers: int = 4):
+    higher_is_better = False
+
+    def __init__(self):
         self.stagnant_pattern = re.compile(r'\b(understood|thank you|noted|got it|okay|alright)\b.*\?$', re.IGNORECASE)
         self.insufficient_pattern = re.compile(r'\b(sure|certainly|of course|happy to help)\b.*\?$|what do you mean|could you explain', re.IGNORECASE)
         self.loss_pattern = re.compile(r'please provide|need more information|could you clarify|what exactly', re.IGNORECASE)
-        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Single-pass equivalent of the three patterns above. The phrase alternatives can match anywhere,
+        # while the `.*\?$` alternatives can only match on the last line of a response ending with "?",
+        # so that line is the only text they need to look at. The leading lookahead lets the regex
+        # engine skip positions that cannot start a phrase.
+        self.phrase_pattern = re.compile(r'(?=[wcpn])(?:what (?:do you mean|exactly)|could you (?:explain|clarify)|please provide|need more information)', re.IGNORECASE)
+        self.question_pattern = re.compile(r'\b(understood|thank you|noted|got it|okay|alright|sure|certainly|of course|happy to help)\b.*\?$', re.IGNORECASE)
 
     def is_failure(self, response: str) -> bool:
-        return (
-            bool(self.stagnant_pattern.search(response)) or
-            bool(self.insufficient_pattern.search(response)) or
-            bool(self.loss_pattern.search(response))
-        )
+        if self.phrase_pattern.search(response):
+            return True
+        if response.endswith('?\n'):
+            response = response[:-1]
+        elif not response.endswith('?'):
+            return False
+        return self.question_pattern.search(response, response.rfind('\n') + 1) is not None
+
+    def evaluate_batch(self, responses: List[List[str]]) -> Tuple[List[float], List[List[bool]]]:
+        """Score a methods x responses matrix in one pass.
+
+        Returns the failure rate of each method and the failure flag of each response.
+        """
+        is_failure = self.is_failure
+        flags = [[is_failure(response) for response in method_responses] for method_responses in responses]
+        failure_rates = [sum(method_flags) / len(method_flags) if method_flags else 0.0 for method_flags in flags]
+        return failure_rates, flags
 
     def evaluate(self, instructions: List[str], responses: List[str]) -> float:
-        with self.executor as executor:
-            failure_futures = [executor.submit(self.is_failure, response) for response in responses]
-            failures = sum(future.result() for future in as_completed(failure_futures))
-        return failures / len(responses)
-
-    async def select_best_method(self, methods: List[str], instructions: List[str], responses: List[List[str]]) -> Tuple[str, float]:
-        evaluation_results = []
-        
-        with self.executor as executor:
-            futures = [executor.submit(self.evaluate, instructions, method_responses) 
-                       for method_responses in responses]
-            
-            for method, future in zip(methods, futures):
-                failure_rate = future.result()
-                evaluation_results.append((method, failure_rate))
-        
-        best_method, lowest_failure_rate = min(evaluation_results, key=lambda x: x[1])
-        return best_method, lowest_failure_rate
\ No newline at end of file
+        failure_rates, _ = self.evaluate_batch([responses])
+        return failure_rates[0]
+
+    async def score_methods(self, instructions: List[List[str]], responses: List[List[str]]) -> List[float]:
+        failure_rates, _ = self.evaluate_batch(responses)
+        return failure_rates
+
+    async def select_best_method(self, methods: List[str], instructions: List[List[str]], responses: List[List[str]]) -> Tuple[str, float]:
+        failure_rates, _ = self.evaluate_batch(responses)
+        best_index = min(range(len(methods)), key=failure_rates.__getitem__)
+        return methods[best_index], failure_rates[best_index]
@@ -1,43 +1,93 @@
 from .base_evaluator import BaseEvaluator
-from typing import List, Optional
+from .micro_batcher import MicroBatcher
+from typing import Any, Dict, List, Optional, Union
+from collections import OrderedDict
 import torch
 from transformers import AutoModel, AutoTokenizer
 from concurrent.futures import ThreadPoolExecutor
 import asyncio
+import hashlib
+import json
 
 
 class RewardModelEvaluator(BaseEvaluator):
-    def __init__(self, model: str = "internlm/internlm2-1_8b-reward"):
-        self.model = AutoModel.from_pretrained(
-            model,
-            device_map="cuda",
-            torch_dtype=torch.float16,
-            trust_remote_code=True,
-        )
-        self.tokenizer = AutoTokenizer.from_pretrained(model, trust_remote_code=True)
-        self.executor = ThreadPoolExecutor(max_workers=4)  # Adjust based on your GPU
+    def __init__(self, model: Union[str, Any] = "internlm/internlm2-1_8b-reward", device: str = "cuda", max_batch_size: int = 16, max_wait_ms: float = 5.0,
+                 cache_size: int = 100000, tokenizer: Optional[Any] = None):
+        self.device = device
+        if isinstance(model, str):
+            self.model = AutoModel.from_pretrained(
+                model,
+                device_map=device,
+                torch_dtype=torch.float16 if device.startswith("cuda") else torch.float32,
+                trust_remote_code=True,
+            )
+            self.tokenizer = tokenizer or AutoTokenizer.from_pretrained(model, trust_remote_code=True)
+        else:
+            # An already loaded reward model exposing get_score or get_scores
+            self.model = model
+            self.tokenizer = tokenizer
+        # A single worker keeps one forward pass on the device at a time; concurrency comes from batching
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.batcher = MicroBatcher(self.score_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, executor=self.executor)
+        # Content hash of (instruction, response) -> score, least recently used evicted first
+        self.cache_size = cache_size
+        self.score_cache: "OrderedDict[str, float]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    def score_batch(self, chats: List[List[Dict[str, str]]]) -> List[float]:
+        # One padded forward pass for the whole batch
+        with torch.no_grad():
+            if hasattr(self.model, "get_scores"):
+                scores = self.model.get_scores(self.tokenizer, chats)
+            else:
+                scores = [self.model.get_score(self.tokenizer, chat) for chat in chats]
+        # get_scores may return a tensor or an array rather than a list
+        if hasattr(scores, "tolist"):
+            scores = scores.tolist()
+        return [float(score) for score in list(scores)]
+
+    @staticmethod
+    def content_key(instruction: str, response: str) -> str:
+        return hashlib.sha256(json.dumps([instruction, response], ensure_ascii=False).encode("utf-8")).hexdigest()
 
     async def get_score(self, instruction: str, response: str) -> float:
+        key = self.content_key(instruction, response)
+        if key in self.score_cache:
+            self.score_cache.move_to_end(key)
+            return self.score_cache[key]
+        if key in self._pending:
+            return await asyncio.shield(self._pending[key])
+
         chat = [
             {"role": "user", "content": instruction},
             {"role": "assistant", "content": response}
         ]
-        loop = asyncio.get_event_loop()
-        score = await loop.run_in_executor(self.executor, self.model.get_score, self.tokenizer, chat)
-        torch.cuda.empty_cache()
+        future = asyncio.ensure_future(self.batcher.submit(chat))
+        self._pending[key] = future
+        try:
+            score = await asyncio.shield(future)
+        finally:
+            del self._pending[key]
+
+        self.score_cache[key] = score
+        while len(self.score_cache) > self.cache_size:
+            self.score_cache.popitem(last=False)
         return score
 
     async def evaluate(self, instructions: List[str], responses: List[str]) -> float:
-        scores = await asyncio.gather(*[self.get_score(instruction, response) 
+        scores = await asyncio.gather(*[self.get_score(instruction, response)
                                         for instruction, response in zip(instructions, responses)])
-        torch.cuda.empty_cache()
         return sum(scores) / len(scores)
 
-    async def select_best_method(self, methods: List[str], instructions: List[str], responses: List[List[str]]) -> tuple:
-        evaluation_tasks = [self.evaluate(instructions, method_responses) 
-                            for method_responses in responses]
-        scores = await asyncio.gather(*evaluation_tasks)
-        torch.cuda.empty_cache()
-        
+    async def score_methods(self, instructions: List[List[str]], responses: List[List[str]]) -> List[float]:
+        scores = await asyncio.gather(*[self.evaluate(method_instructions, method_responses)
+                                        for method_instructions, method_responses in zip(instructions, responses)])
+        if self.device.startswith("cuda"):
+            torch.cuda.empty_cache()
+        return list(scores)
+
+    async def select_best_method(self, methods: List[str], instructions: List[List[str]], responses: List[List[str]]) -> tuple:
+        scores = await self.score_methods(instructions, responses)
+
         best_index = max(range(len(scores)), key=scores.__getitem__)
-        return methods[best_index], scores[best_index]
\ No newline at end of file
+        return methods[best_index], scores[best_index]
@@ -16,8 +16,6 @@ Step 3: Please execute the plan step by step and provide the #Rewritten Instruct
 
 Step 4: Please carefully review the #Rewritten Instruction# and identify any unreasonable parts. Ensure that the #Rewritten Instruction# is only a more complex version of the #Instruction#, make sure that it only adds 10 to 20 words into the "#Instruction#". Just provide the #Finally Rewritten Instruction# without any explanation.
 
-#Instruction#: {{instruction}}
-
 REMEMBER that you are generating a more complex version of the instruction (or question), NOT answering #Instruction#. The #Finally Rewritten Instruction# should only add 10 to 20 words the #Instruction# below.
 
 **Output Instructions**
@@ -36,16 +34,18 @@ Step 3:
 Step 4:
 #Finally Rewritten Instruction#
 ```
+
+#Instruction#: {{instruction}}
 """
 
+# The rendered methods keep their static text first and the instruction last, so that prompts built
+# from the same method share the longest possible prefix for the backend's prefix cache.
 INTERATIVE_EVOLVE_METHOD = """
 You are an Instruction Rewriter that rewrites the given #Instruction# into a more complex version.
+REMEMBER that you are generating a more complex version of the instruction (or question), NOT answering #Instruction#. The #Finally Rewritten Instruction# should only add 10 to 20 words the #Instruction# below.
 Please follow the steps below to rewrite the given "#Instruction#" into a more complex version.
 
 {steps}
-#Instruction#: {instruction}
-
-REMEMBER that you are generating a more complex version of the instruction (or question), NOT answering #Instruction#. The #Finally Rewritten Instruction# should only add 10 to 20 words the #Instruction# below.
 
 **Output Instructions**
 Please generate the optimized instruction strictly using ONLY the given below format, do not add anything else:
@@ -53,6 +53,8 @@ Please generate the optimized instruction strictly using ONLY the given below fo
 ```Optimized Instruction
 {format_steps}
 ```
+
+#Instruction#: {instruction}
 """
 
 class RecurrentEvolver(BaseEvolver):
@@ -60,15 +62,10 @@ class RecurrentEvolver(BaseEvolver):
         self.generator = generator
         
     async def evolve_async(self, instruction: str, evolving_method: str = None, n: int = 1) -> List[str]:
-        evol_method = evolving_method if evolving_method else INITIAL_EVOLVE_METHOD.format(instruction=instruction)
-        
-        async def generate_single():
-            return await self.generator.agenerate(evol_method)
-        
-        tasks = [generate_single() for _ in range(n)]
-        results = await asyncio.gather(*tasks)
+        evol_method = evolving_method if evolving_method else INITIAL_EVOLVE_METHOD.replace("{{instruction}}", instruction)
         
-        return results
+        # All samples share one prompt, so request them together and let the backend reuse the prefill
+        return await self.generator.agenerate_n(evol_method, n=n)
     
     def evolve(self, instruction: str, evolving_method: str = None, n: int = 1) -> List[str]:
         return asyncio.run(self.evolve_async(instruction, evolving_method, n))
@@ -1,4 +1,26 @@
+import importlib
+
+from .adaptive import AdaptiveConcurrencyGenerator
+from .balanced import LoadBalancedGenerator, route_by
 from .base_generator import BaseGenerator
-from .openai import OpenAIGenerator
-from .openrouter import OpenRouterGenerator
-from .vllm import VLLMGenerator
\ No newline at end of file
+from .cached import CachedGenerator
+from .factory import create_generator, shared_http_client
+from .instrumented import InstrumentedGenerator
+from .limits import RoleLimits, role_limits
+from .recording import RecordingGenerator
+from .resilient import ResilientGenerator
+from .traced import TracedGenerator
+
+# Backends that pull in the openai client are imported on first use
+_LAZY_GENERATORS = {
+    "OpenAIGenerator": ".openai",
+    "OpenRouterGenerator": ".openrouter",
+    "VLLMGenerator": ".vllm",
+}
+
+__all__ = ["AdaptiveConcurrencyGenerator", "BaseGenerator", "CachedGenerator", "InstrumentedGenerator", "LoadBalancedGenerator", "RecordingGenerator", "ResilientGenerator", "RoleLimits", "TracedGenerator", "create_generator", "role_limits", "route_by", "shared_http_client", *_LAZY_GENERATORS]
+
+def __getattr__(name):
+    if name in _LAZY_GENERATORS:
+        return getattr(importlib.import_module(_LAZY_GENERATORS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,210 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from .base_generator import BaseGenerator
+from src.metrics import current_role
+
+# Responses of a backend that is over its capacity: rate limited, overloaded or too slow to answer
+OVERLOAD_STATUS_CODES = {408, 429, 503, 504}
+
+def is_overload(error: BaseException) -> bool:
+    """Rate limits, overload responses and timeouts say that the backend gets more requests than it can serve."""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in OVERLOAD_STATUS_CODES
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    # openai's APITimeoutError carries no status code
+    return type(error).__name__ == "APITimeoutError"
+
+class RoleLatency:
+    """Short-term latency of one role, compared to the lowest latency the role has sustained."""
+
+    def __init__(self, alpha: float, drift: float) -> None:
+        self.alpha = alpha
+        self.drift = drift
+        self.samples = 0
+        self.short: Optional[float] = None
+        self.baseline: Optional[float] = None
+
+    def add(self, latency: float) -> None:
+        self.samples += 1
+        self.short = latency if self.short is None else self.short + self.alpha * (latency - self.short)
+        self.baseline = self.short if self.baseline is None else min(self.baseline, self.short)
+
+    def relax(self) -> None:
+        # The baseline follows the short-term average down at once and up only slowly, so that a
+        # backend that became somewhat slower for good (e.g. longer prompts later in the run) is
+        # eventually accepted as the new normal
+        self.baseline += self.drift * (self.short - self.baseline)
+
+class AdaptiveConcurrencyGenerator(BaseGenerator):
+    """Limits the requests in flight to a generator with a limit that adapts to the backend (AIMD).
+
+    The limit starts at `initial_limit` and stays within [`min_limit`, `max_limit`]. While latency
+    stays flat, every successful request raises it: by one until the first backoff (slow start, which
+    doubles the limit every round trip), then by 1/limit, i.e. about one per round trip. Only requests
+    sent while at least half of the limit was in use raise it, so a pipeline that cannot fill the
+    limit does not inflate it. A rate limit, overload response or timeout (see `is_overload`), or a
+    latency spike, multiplies the limit by `backoff`. Requests sent before the last backoff do not
+    back off again, so a burst of 429s from one round trip shrinks the limit once.
+
+    Latency is tracked per metrics role, since answers take much longer than analyzer verdicts. A role's
+    latency spikes when its short-term average, and the latency of the request at hand, are more than
+    `latency_tolerance` times the lowest average it has sustained, once it has `min_samples` latencies.
+    That baseline only drifts up with requests sent while less than half of the limit was in use, and
+    is reset when latency spikes at `min_limit`, after which the limit grows as in slow start again.
+
+    Requests over the limit wait for a slot in arrival order. Wrap the backend below
+    `ResilientGenerator`, so that every attempt takes a slot and the limiter sees the errors that
+    retries would hide. `timeout` bounds each attempt, not counting the wait for a slot. Synchronous
+    calls are not limited.
+    """
+
+    def __init__(self, generator: BaseGenerator, initial_limit: int = 16, min_limit: int = 1, max_limit: int = 1024, backoff: float = 0.7,
+                 latency_tolerance: float = 2.0, min_samples: int = 20, latency_alpha: float = 0.05, baseline_drift: float = 0.0005,
+                 timeout: Optional[float] = None) -> None:
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError(f"Concurrency limits must satisfy 1 <= min_limit <= initial_limit <= max_limit, got {min_limit}, {initial_limit}, {max_limit}")
+        if not 0 < backoff < 1:
+            raise ValueError(f"backoff must be between 0 and 1, got {backoff}")
+        if latency_tolerance <= 1:
+            raise ValueError(f"latency_tolerance must be greater than 1, got {latency_tolerance}")
+        self.generator = generator
+        self.model = getattr(generator, 'model', type(generator).__name__)
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.min_samples = min_samples
+        self.latency_alpha = latency_alpha
+        self.baseline_drift = baseline_drift
+        self.timeout = timeout
+        self.latencies: Dict[str, RoleLatency] = {}
+        self.in_flight = 0
+        self.peak_limit = self.limit
+        self.increases = 0
+        self.backoffs: Dict[str, int] = {"overload": 0, "latency": 0}
+        self.slow_start = True
+        self._last_backoff = float("-inf")
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def early_stops(self) -> int:
+        return getattr(self.generator, "early_stops", 0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "peak_limit": self.peak_limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "increases": self.increases,
+            "backoffs": dict(self.backoffs),
+        }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (f"Concurrency limit: {stats['limit']:.1f} (peak {stats['peak_limit']:.1f}), "
+                f"backoffs: {stats['backoffs']['overload']} on rate limits or timeouts, {stats['backoffs']['latency']} on latency spikes")
+
+    def generate(self, prompt: str, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5) -> str:
+        return self.generator.generate(prompt, system_prompt, temperature)
+
+    async def agenerate(self, prompt: str, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5):
+        return await self.call(lambda: self.generator.agenerate(prompt, system_prompt, temperature))
+
+    async def agenerate_n(self, prompt: str, n: int = 1, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5) -> List[str]:
+        return await self.call(lambda: self.generator.agenerate_n(prompt, n, system_prompt, temperature))
+
+    async def call(self, request: Callable[[], Awaitable[Any]]) -> Any:
+        await self.acquire()
+        # Number in flight when the request was sent, including itself
+        load = self.in_flight
+        start = time.monotonic()
+        try:
+            if self.timeout is None:
+                result = await request()
+            else:
+                result = await asyncio.wait_for(request(), self.timeout)
+        except Exception as e:
+            # Cancellation, e.g. of a hedged duplicate whose twin answered first, is not an Exception
+            # and says nothing about the backend
+            if is_overload(e):
+                self.back_off("overload", start)
+            raise
+        finally:
+            self.release()
+        self.succeeded(current_role.get(), start, load)
+        return result
+
+    # Limit
+
+    def succeeded(self, role: str, start: float, load: int) -> None:
+        latency = self.latencies.setdefault(role, RoleLatency(self.latency_alpha, self.baseline_drift))
+        elapsed = time.monotonic() - start
+        latency.add(elapsed)
+        # The request itself must be slow too: the average lags behind, and requests sent after a
+        # backoff should not be blamed for the ones sent before it
+        threshold = self.latency_tolerance * latency.baseline
+        if latency.samples >= self.min_samples and latency.short > threshold and elapsed > threshold:
+            if self.limit <= self.min_limit:
+                # Slow even without load: accept the latency as the new baseline and probe again
+                latency.baseline = latency.short
+                self.slow_start = True
+            else:
+                self.back_off("latency", start)
+            return
+        if 2 * load >= self.limit:
+            self.limit = min(self.max_limit, self.limit + (1 if self.slow_start else 1 / self.limit))
+            self.peak_limit = max(self.peak_limit, self.limit)
+            self.increases += 1
+            self._wake()
+        else:
+            # Sent with capacity to spare, so the latency is the backend's own rather than the load's
+            latency.relax()
+
+    def back_off(self, reason: str, start: float) -> None:
+        if start < self._last_backoff:
+            # Sent under the limit before the last backoff, which already accounts for it
+            return
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        self.slow_start = False
+        self._last_backoff = time.monotonic()
+        self.backoffs[reason] += 1
+
+    # Slots
+
+    async def acquire(self) -> None:
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was granted just before the cancellation; hand it on
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
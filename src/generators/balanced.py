@@ -0,0 +1,178 @@
+import asyncio
+import contextvars
+import hashlib
+import math
+import random
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence
+
+from .base_generator import BaseGenerator
+from .resilient import is_retryable
+
+# Key of the work the current task belongs to, e.g. the instruction being evolved. With pinning, all
+# requests of one key go to the same endpoint. Tasks inherit it from the code that created them.
+current_route_key: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_route_key", default=None)
+
+@contextmanager
+def route_by(key: str) -> Iterator[None]:
+    """Route the requests made inside this block (and in tasks it creates) by `key`."""
+    token = current_route_key.set(key)
+    try:
+        yield
+    finally:
+        current_route_key.reset(token)
+
+class Endpoint:
+    def __init__(self, name: str, generator: BaseGenerator) -> None:
+        self.name = name
+        self.generator = generator
+        self.outstanding = 0
+        self.peak_outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.consecutive_ejections = 0
+        self.ejected_until = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "endpoint": self.name,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections,
+            "outstanding": self.outstanding,
+            "peak_outstanding": self.peak_outstanding,
+            "ejected": self.ejected_until > time.monotonic(),
+        }
+
+class LoadBalancedGenerator(BaseGenerator):
+    """Spreads requests over several replicas of the same model.
+
+    Each request goes to the healthy endpoint with the fewest requests in flight; ties are broken at
+    random. An endpoint that fails `eject_after` requests in a row with a transient error (see
+    `is_retryable`), including `timeout`, is ejected for `eject_seconds`, doubling with every
+    ejection in a row up to `max_eject_seconds`. The error is still raised, so that the caller's
+    retry (e.g. `ResilientGenerator`) picks another endpoint. When every endpoint is ejected, all of
+    them are used again.
+
+    With `pin`, the requests of one `route_by` key are sent to the same endpoint, chosen by
+    rendezvous hashing, so that e.g. the calls of one instruction's pipeline reuse that replica's
+    prefix cache. A pinned endpoint that is ejected, or that has more than `pin_load_factor` times
+    the mean number of requests in flight (and at least `pin_min_load`), is passed over for the next
+    one in the key's order, so pinning never overloads a replica.
+    """
+
+    def __init__(self, generators: Sequence[BaseGenerator], names: Optional[Sequence[str]] = None, pin: bool = False,
+                 pin_load_factor: float = 1.25, pin_min_load: int = 16, eject_after: int = 3, eject_seconds: float = 10.0, max_eject_seconds: float = 300.0,
+                 timeout: Optional[float] = None, seed: Optional[int] = None) -> None:
+        if not generators:
+            raise ValueError("LoadBalancedGenerator needs at least one generator")
+        if pin_load_factor < 1:
+            raise ValueError(f"pin_load_factor must be at least 1, got {pin_load_factor}")
+        names = list(names) if names is not None else [f"endpoint-{i}" for i in range(len(generators))]
+        self.endpoints = [Endpoint(name, generator) for name, generator in zip(names, generators)]
+        self.model = getattr(generators[0], 'model', type(generators[0]).__name__)
+        self.pin = pin
+        self.pin_load_factor = pin_load_factor
+        self.pin_min_load = pin_min_load
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self.timeout = timeout
+        self._random = random.Random(seed)
+
+    @property
+    def early_stops(self) -> int:
+        return sum(getattr(endpoint.generator, "early_stops", 0) for endpoint in self.endpoints)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [endpoint.to_dict() for endpoint in self.endpoints]
+
+    def summary(self) -> str:
+        return "\n".join(f"  {e['endpoint']:<40} {e['requests']:>7} req {e['failures']:>5} failed {e['ejections']:>3} ejections  "
+                         f"peak {e['peak_outstanding']} in flight{'  (ejected)' if e['ejected'] else ''}" for e in self.stats())
+
+    def generate(self, prompt: str, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5) -> str:
+        endpoint = self.choose()
+        self.started(endpoint)
+        try:
+            result = endpoint.generator.generate(prompt, system_prompt, temperature)
+        except Exception as e:
+            self.failed(endpoint, e)
+            raise
+        finally:
+            endpoint.outstanding -= 1
+        self.succeeded(endpoint)
+        return result
+
+    async def agenerate(self, prompt: str, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5):
+        return await self.call(lambda generator: generator.agenerate(prompt, system_prompt, temperature))
+
+    async def agenerate_n(self, prompt: str, n: int = 1, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5) -> List[str]:
+        return await self.call(lambda generator: generator.agenerate_n(prompt, n, system_prompt, temperature))
+
+    async def call(self, request: Callable[[BaseGenerator], Awaitable[Any]]) -> Any:
+        endpoint = self.choose()
+        self.started(endpoint)
+        try:
+            if self.timeout is None:
+                result = await request(endpoint.generator)
+            else:
+                result = await asyncio.wait_for(request(endpoint.generator), self.timeout)
+        except Exception as e:
+            # Cancellation, e.g. of a hedged duplicate whose twin answered first, is not an Exception
+            # and says nothing about the endpoint
+            self.failed(endpoint, e)
+            raise
+        finally:
+            endpoint.outstanding -= 1
+        self.succeeded(endpoint)
+        return result
+
+    # Routing
+
+    def choose(self) -> Endpoint:
+        now = time.monotonic()
+        healthy = [endpoint for endpoint in self.endpoints if endpoint.ejected_until <= now] or self.endpoints
+        key = current_route_key.get()
+        if self.pin and key is not None:
+            return self.pinned(key, healthy)
+        fewest = min(endpoint.outstanding for endpoint in healthy)
+        return self._random.choice([endpoint for endpoint in healthy if endpoint.outstanding == fewest])
+
+    def pinned(self, key: str, healthy: List[Endpoint]) -> Endpoint:
+        # Rendezvous order: every key ranks the endpoints by a hash of (key, endpoint), so removing an
+        # endpoint only moves the keys that were pinned to it
+        ranked = sorted(healthy, key=lambda endpoint: hashlib.sha1(f"{endpoint.name}\0{key}".encode("utf-8")).digest(), reverse=True)
+        # Bounded loads: below `pin_min_load` in flight a replica is far from saturated, so locality wins
+        capacity = max(self.pin_min_load, math.ceil(self.pin_load_factor * (sum(endpoint.outstanding for endpoint in healthy) + 1) / len(healthy)))
+        for endpoint in ranked:
+            if endpoint.outstanding < capacity:
+                return endpoint
+        return ranked[0]
+
+    # Health
+
+    def started(self, endpoint: Endpoint) -> None:
+        endpoint.requests += 1
+        endpoint.outstanding += 1
+        endpoint.peak_outstanding = max(endpoint.peak_outstanding, endpoint.outstanding)
+
+    def succeeded(self, endpoint: Endpoint) -> None:
+        endpoint.consecutive_failures = 0
+        endpoint.consecutive_ejections = 0
+
+    def failed(self, endpoint: Endpoint, error: BaseException) -> None:
+        if not is_retryable(error):
+            # The request was rejected on its own merits, e.g. a 400 for a prompt that is too long
+            return
+        endpoint.failures += 1
+        endpoint.consecutive_failures += 1
+        if endpoint.consecutive_failures >= self.eject_after:
+            duration = min(self.max_eject_seconds, self.eject_seconds * 2 ** endpoint.consecutive_ejections)
+            endpoint.ejected_until = time.monotonic() + duration
+            endpoint.ejections += 1
+            endpoint.consecutive_ejections += 1
+            endpoint.consecutive_failures = 0
@@ -1,5 +1,6 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import List, Optional
 
 class BaseGenerator(ABC):
     @abstractmethod
@@ -7,4 +8,8 @@ class BaseGenerator(ABC):
         pass
     
     async def agenerate(self, prompt: str, system_prompt: Optional[str] = "You are a helpful AI assistant.", temperature: Optional[float] = 0.5):
-        pass
\ No newline at end of file
+        pass
+
+    async def agenerate_n(self, prompt: str, n: int = 1, system_prompt: Optional[str] = "You are a helpful AI assistant.", temperature: Optional[float] = 0.5) -> List[str]:
+        # Backends that cannot return several completions for one request fan out to `n` identical requests
+        return list(await asyncio.gather(*[self.agenerate(prompt, system_prompt, temperature) for _ in range(n)]))
@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .base_generator import BaseGenerator
+
+# Sentinel returned by generators that swallow request errors; never worth caching
+ERROR_RESPONSE = 'error'
+
+# Access times are written in batches of this many hits, or with the next insert
+ACCESS_FLUSH_SIZE = 256
+# Entries deleted per eviction query
+EVICT_BATCH_SIZE = 256
+
+def is_cacheable(response: Optional[str]) -> bool:
+    return isinstance(response, str) and response != ERROR_RESPONSE
+
+class LeaderCancelled(Exception):
+    """The request a coalesced call was waiting on was cancelled by its own caller."""
+
+class CachedGenerator(BaseGenerator):
+    """Wraps any generator with a persistent, content-addressed response cache.
+
+    Responses are keyed on (model, system prompt, prompt, temperature) and stored in a SQLite file
+    under `cache_dir`. When the cache grows beyond `max_bytes`, the least recently used entries are
+    evicted. Identical requests that are in flight at the same time share a single upstream call.
+
+    Asynchronous calls run their SQLite work in a worker thread, so the event loop never waits on
+    the disk. A hit only reads: access times are kept in memory and written in batches.
+    """
+
+    def __init__(self, generator: BaseGenerator, cache_dir: str = ".evolkit_cache", max_bytes: int = 1 << 30) -> None:
+        self.generator = generator
+        self.model = getattr(generator, 'model', type(generator).__name__)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "responses.sqlite"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode, commits survive a crash of the process without an fsync each
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+        self._db.commit()
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._accessed: Dict[str, float] = {}
+
+    def cache_key(self, prompt: str, system_prompt: Optional[str], temperature: Optional[float], n: Optional[int] = None) -> str:
+        fields = [self.model, system_prompt, prompt, temperature]
+        if n is not None:
+            fields.append(n)
+        payload = json.dumps(fields, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._accessed[key] = time.time()
+            if len(self._accessed) >= ACCESS_FLUSH_SIZE:
+                self._flush_accessed()
+                self._db.commit()
+            return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        size = len(response.encode('utf-8'))
+        with self._lock:
+            self._flush_accessed()
+            previous = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, response, size, time.time()),
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._db.commit()
+
+    def _flush_accessed(self) -> None:
+        if self._accessed:
+            self._db.executemany("UPDATE responses SET accessed = ? WHERE key = ?", [(accessed, key) for key, accessed in self._accessed.items()])
+            self._accessed.clear()
+
+    def _evict(self) -> None:
+        # Drop least recently used entries until the cache is back to 90% of its budget
+        target = int(self.max_bytes * 0.9)
+        while self._total_bytes > target:
+            rows = self._db.execute("SELECT key, size FROM responses ORDER BY accessed ASC LIMIT ?", (EVICT_BATCH_SIZE,)).fetchall()
+            if not rows:
+                break
+            evicted = []
+            for key, size in rows:
+                if self._total_bytes <= target:
+                    break
+                evicted.append((key,))
+                self._total_bytes -= size
+            self._db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def generate(self, prompt: str, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5) -> str:
+        key = self.cache_key(prompt, system_prompt, temperature)
+        response = self.get(key)
+        if response is not None:
+            self.hits += 1
+            return response
+        self.misses += 1
+        response = self.generator.generate(prompt, system_prompt, temperature)
+        if is_cacheable(response):
+            self.put(key, response)
+        return response
+
+    async def agenerate(self, prompt: str, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5):
+        key = self.cache_key(prompt, system_prompt, temperature)
+        return await self._cached_call(
+            key,
+            lambda: self.generator.agenerate(prompt, system_prompt, temperature),
+            encode=lambda response: response if is_cacheable(response) else None,
+            decode=lambda response: response,
+        )
+
+    async def agenerate_n(self, prompt: str, n: int = 1, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5) -> List[str]:
+        # A set of `n` samples is cached as one entry, so the samples stay distinct on reruns
+        key = self.cache_key(prompt, system_prompt, temperature, n=n)
+        return await self._cached_call(
+            key,
+            lambda: self.generator.agenerate_n(prompt, n, system_prompt, temperature),
+            encode=lambda responses: json.dumps(responses, ensure_ascii=False) if all(map(is_cacheable, responses)) else None,
+            decode=json.loads,
+        )
+
+    async def _cached_call(self, key: str, call: Callable[[], Awaitable[Any]], encode: Callable[[Any], Optional[str]], decode: Callable[[str], Any]):
+        while True:
+            future = self._in_flight.get(key)
+            if future is not None:
+                try:
+                    result = await asyncio.shield(future)
+                except LeaderCancelled:
+                    # Make the request again, or wait for another caller that does
+                    continue
+                self.hits += 1
+                return result
+
+            cached = await asyncio.to_thread(self.get, key)
+            if cached is not None:
+                self.hits += 1
+                return decode(cached)
+            # Another caller may have started the request while the cache was being read
+            if key not in self._in_flight:
+                break
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            # Only this caller gave up, e.g. on a timeout; callers waiting on the request must not
+            # see its cancellation
+            future.set_exception(LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting on this request
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            encoded = encode(result)
+            if encoded is not None:
+                await asyncio.to_thread(self.put, key, encoded)
+            return result
+        finally:
+            del self._in_flight[key]
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_accessed()
+            self._db.commit()
+            self._db.close()
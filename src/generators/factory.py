@@ -0,0 +1,83 @@
+import asyncio
+import importlib
+import weakref
+from os import getenv
+from typing import Any, Dict, Optional, Tuple
+
+from .base_generator import BaseGenerator
+
+# provider -> (module, class)
+PROVIDERS = {
+    "openai": (".openai", "OpenAIGenerator"),
+    "openrouter": (".openrouter", "OpenRouterGenerator"),
+    "vllm": (".vllm", "VLLMGenerator"),
+}
+
+DEFAULT_BASE_URLS = {
+    "openai": "https://api.openai.com/v1",
+    "openrouter": "https://openrouter.ai/api/v1",
+}
+
+# Pools are bound to the event loop their connections were opened on, so they are shared per loop.
+# Pools created outside a running loop are kept separately.
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple, Any]]" = weakref.WeakKeyDictionary()
+_unbound_pools: Dict[Tuple, Any] = {}
+
+def _httpx():
+    try:
+        import httpx
+    except ImportError:
+        # Recent openai releases are built on the httpx2 fork
+        import httpx2 as httpx
+    return httpx
+
+def shared_http_client(base_url: str, max_connections: int = 256, max_keepalive_connections: Optional[int] = None,
+                       keepalive_expiry: float = 30.0, http2: bool = False, timeout: float = 600.0):
+    """Return the async HTTP connection pool for `base_url`, creating it on first use.
+
+    Every generator of the same endpoint and pool settings shares one pool, so concurrent requests reuse
+    warm keep-alive connections instead of each client opening its own. By default all
+    `max_connections` connections are kept alive, so that bursts do not close and reopen connections.
+    `http2` multiplexes requests over fewer connections; it needs the `h2` package.
+    """
+    try:
+        pools = _pools.setdefault(asyncio.get_running_loop(), {})
+    except RuntimeError:
+        pools = _unbound_pools
+    if max_keepalive_connections is None:
+        max_keepalive_connections = max_connections
+    key = (base_url.rstrip("/"), max_connections, max_keepalive_connections, keepalive_expiry, http2, timeout)
+    if key not in pools:
+        import openai
+        httpx = _httpx()
+        pools[key] = openai.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections, keepalive_expiry=keepalive_expiry),
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            http2=http2,
+        )
+    return pools[key]
+
+def create_generator(provider: str, model: str, base_url: Optional[str] = None, max_retries: int = 2, max_connections: int = 256,
+                     max_keepalive_connections: Optional[int] = None, keepalive_expiry: float = 30.0, http2: bool = False,
+                     timeout: float = 600.0, **kwargs: Any) -> BaseGenerator:
+    """Create a generator for `provider` ('openai', 'openrouter' or 'vllm') that sends requests through the shared pool of its endpoint.
+
+    The vLLM endpoint defaults to the VLLM_BACKEND environment variable, then http://localhost:8000/v1.
+    The OpenAI endpoint defaults to OPENAI_BASE_URL, then the public API; OpenRouter to its public API.
+    Extra keyword arguments are passed to the generator, e.g. `api_key`, or per-role `limits` and `stream`.
+    """
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown generator {provider!r}; expected one of {sorted(PROVIDERS)}")
+    if provider == "vllm":
+        base_url = base_url or getenv('VLLM_BACKEND') or 'http://localhost:8000/v1'
+    elif provider == "openai":
+        base_url = base_url or getenv("OPENAI_BASE_URL") or DEFAULT_BASE_URLS["openai"]
+    else:
+        base_url = base_url or DEFAULT_BASE_URLS[provider]
+    kwargs["base_url"] = base_url
+
+    http_client = shared_http_client(base_url, max_connections=max_connections, max_keepalive_connections=max_keepalive_connections,
+                                     keepalive_expiry=keepalive_expiry, http2=http2, timeout=timeout)
+    module, name = PROVIDERS[provider]
+    generator_class = getattr(importlib.import_module(module, __package__), name)
+    return generator_class(model=model, max_retries=max_retries, http_client=http_client, **kwargs)
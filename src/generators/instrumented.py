@@ -0,0 +1,29 @@
+from typing import List
+
+from .base_generator import BaseGenerator
+from src.metrics import MetricsRegistry
+
+class InstrumentedGenerator(BaseGenerator):
+    """Wraps a generator and records every call in a `MetricsRegistry`.
+
+    Calls are attributed to the role set with `src.metrics.role` by the calling stage. Token counts
+    come from the `usage` the backend reports through `src.metrics.record_usage`. Wrap the backend
+    directly, below any cache, so that only requests that actually reach it are counted.
+    """
+
+    def __init__(self, generator: BaseGenerator, registry: MetricsRegistry) -> None:
+        self.generator = generator
+        self.model = getattr(generator, 'model', type(generator).__name__)
+        self.registry = registry
+
+    def generate(self, prompt: str, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5) -> str:
+        with self.registry.measure():
+            return self.generator.generate(prompt, system_prompt, temperature)
+
+    async def agenerate(self, prompt: str, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5):
+        with self.registry.measure():
+            return await self.generator.agenerate(prompt, system_prompt, temperature)
+
+    async def agenerate_n(self, prompt: str, n: int = 1, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5) -> List[str]:
+        with self.registry.measure(samples=n):
+            return await self.generator.agenerate_n(prompt, n, system_prompt, temperature)
@@ -0,0 +1,65 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from src.step_parser import StepParser
+
+# Metrics roles of the pipeline stages (see `src.metrics.role`)
+ROLES = ("evolver", "analyzer", "optimizer", "final_rewrite", "dev_rewrite", "dev_answer", "answer", "other")
+
+# Roles whose response is one fenced block ("```Optimized Instruction" or "```Optimized Method") of
+# steps ending with #Finally Rewritten Instruction#; anything the model writes after the closing
+# fence is thrown away by `parse_steps`
+FENCED_ROLES = ("evolver", "optimizer", "final_rewrite", "dev_rewrite")
+
+class RoleLimits:
+    """Output limits of the requests made under one metrics role.
+
+    `max_tokens` and `stop` are sent with the request. `until` creates a detector for each streamed
+    response, e.g. `StepParser`: its `feed(chunk)` returns True once the response is complete. The
+    stream is then closed so that the server stops decoding, and the text is cut at its `end`.
+    """
+
+    def __init__(self, max_tokens: Optional[int] = None, stop: Optional[List[str]] = None,
+                 until: Optional[Callable[[], Any]] = None) -> None:
+        if max_tokens is not None and max_tokens < 1:
+            raise ValueError(f"max_tokens must be at least 1, got {max_tokens}")
+        self.max_tokens = max_tokens
+        self.stop = list(stop) if stop else None
+        self.until = until
+
+    def request_params(self) -> Dict[str, Any]:
+        params: Dict[str, Any] = {}
+        if self.max_tokens is not None:
+            params["max_tokens"] = self.max_tokens
+        if self.stop:
+            params["stop"] = self.stop
+        return params
+
+def role_limits(max_tokens: Optional[Dict[str, int]] = None, stop: Optional[Dict[str, List[str]]] = None,
+                stop_after_fence: bool = False) -> Dict[str, RoleLimits]:
+    """Build the per-role limits of a generator; with `stop_after_fence`, streamed responses of `FENCED_ROLES` end at the fence that closes their final step."""
+    max_tokens = max_tokens or {}
+    stop = stop or {}
+    roles = set(max_tokens) | set(stop) | (set(FENCED_ROLES) if stop_after_fence else set())
+    return {
+        name: RoleLimits(max_tokens=max_tokens.get(name), stop=stop.get(name),
+                         until=StepParser if stop_after_fence and name in FENCED_ROLES else None)
+        for name in roles
+    }
+
+def parse_role_values(values: Optional[Iterable[str]], convert: Callable[[str], Any] = str, multiple: bool = False) -> Dict[str, Any]:
+    """Parse `role=value` command line arguments. With `multiple`, repeated roles collect their values in a list.
+
+    Backslash escapes in values are decoded, so that e.g. `analyzer=\\n\\n` is a stop sequence of two newlines.
+    """
+    parsed: Dict[str, Any] = {}
+    for item in values or []:
+        name, separator, value = item.partition("=")
+        if not separator or name not in ROLES:
+            raise ValueError(f"Invalid value {item!r}; expected ROLE=VALUE with ROLE one of {', '.join(ROLES)}")
+        # unicode_escape decodes bytes as Latin-1; escaping the other characters first keeps non-ASCII text intact
+        value = convert(value.encode("latin-1", "backslashreplace").decode("unicode_escape"))
+        if multiple:
+            parsed.setdefault(name, []).append(value)
+        else:
+            parsed[name] = value
+    return parsed
@@ -1,23 +1,141 @@
-from typing import Optional
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from os import getenv
 
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 
 from .base_generator import BaseGenerator
+from .limits import RoleLimits
+from src.metrics import current_role, record_usage
 
 class OpenAIGenerator(BaseGenerator):
-    def __init__(self, model: str = "gpt-4", api_key: Optional[str] = None) -> None:
+    """Generator for any OpenAI-compatible chat completions endpoint.
+
+    `http_client` is the async HTTP client requests are sent through, e.g. a connection pool shared by
+    all generators of the same endpoint (see `src.generators.factory`). By default each generator gets
+    the openai client's own pool.
+
+    `limits` maps metrics roles to the `RoleLimits` of their requests. With `stream`, requests of roles
+    that have an `until` condition are streamed and closed as soon as the response is complete.
+    """
+
+    def __init__(self, model: str = "gpt-4", api_key: Optional[str] = None, base_url: Optional[str] = None, max_retries: int = 2, http_client=None,
+                 limits: Optional[Dict[str, RoleLimits]] = None, stream: bool = False) -> None:
         self.model = model
-        self.api_key = api_key if api_key else getenv("OPENAI_API_KEY")                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                               
-        self.client = OpenAI()
+        self.api_key = api_key if api_key else getenv("OPENAI_API_KEY")
+        self.client = OpenAI(base_url=base_url, api_key=self.api_key, max_retries=max_retries)
+        self.aclient = AsyncOpenAI(base_url=base_url, api_key=self.api_key, max_retries=max_retries, http_client=http_client)
+        self.limits = limits or {}
+        self.stream = stream
+        self.early_stops = 0
+
+    def request_options(self) -> Tuple[Dict[str, Any], Optional[Callable[[], Any]]]:
+        # (extra request parameters, completion detector factory) of the calling role
+        limits = self.limits.get(current_role.get())
+        if limits is None:
+            return {}, None
+        return limits.request_params(), limits.until if self.stream else None
 
     def generate(self, prompt: str, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.7):
+        params, _ = self.request_options()
         response = self.client.chat.completions.create(
             model=self.model,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": prompt}
             ],
-            temperature=temperature,)
+            temperature=temperature,
+            **params)
+        record_usage(response.usage)
         # print(response.choices[0].message.content) # For Debuging
-        return response.choices[0].message.content
\ No newline at end of file
+        return response.choices[0].message.content
+
+    async def agenerate(self, prompt: str, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.7):
+        # Errors are raised; wrap in ResilientGenerator to retry them
+        params, until = self.request_options()
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+        if until is not None:
+            return (await self.astream(messages, temperature, 1, until, params))[0]
+        response = await self.aclient.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            **params)
+        record_usage(response.usage)
+        return response.choices[0].message.content
+
+    async def agenerate_n(self, prompt: str, n: int = 1, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.7) -> List[str]:
+        # All `n` samples come from one request, so the shared prompt is only processed once
+        params, until = self.request_options()
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+        if until is not None:
+            results = await self.astream(messages, temperature, n, until, params)
+        else:
+            response = await self.aclient.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                n=n,
+                **params)
+            record_usage(response.usage)
+            results = [choice.message.content for choice in sorted(response.choices, key=lambda choice: choice.index)]
+        results = [result for result in results if result is not None]
+        if len(results) < n:
+            # Some servers return fewer choices than asked for; fetch the rest one by one
+            results += await BaseGenerator.agenerate_n(self, prompt, n - len(results), system_prompt, temperature)
+        return results
+
+    async def astream(self, messages: List[Dict[str, str]], temperature: float, n: int, until: Callable[[], Any],
+                      params: Dict[str, Any]) -> List[Optional[str]]:
+        """Stream `n` completions and close the stream as soon as the detectors made by `until` find all of them complete."""
+        stream = await self.aclient.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            n=n,
+            stream=True,
+            stream_options={"include_usage": True},
+            **params)
+        parts: List[Optional[List[str]]] = [None] * n
+        detectors = [until() for _ in range(n)]
+        done = [False] * n
+        stopped_early = False
+        chunks = 0
+        usage = None
+        try:
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                for choice in chunk.choices:
+                    index = choice.index
+                    if index >= n or done[index]:
+                        continue
+                    content = choice.delta.content if choice.delta is not None else None
+                    if content:
+                        chunks += 1
+                        if parts[index] is None:
+                            parts[index] = []
+                        parts[index].append(content)
+                        if detectors[index].feed(content):
+                            done[index] = stopped_early = True
+                    if choice.finish_reason is not None:
+                        parts[index] = parts[index] or []
+                        done[index] = True
+                if stopped_early and all(done):
+                    self.early_stops += 1
+                    break
+        finally:
+            await stream.close()
+        if usage is not None:
+            record_usage(usage)
+        else:
+            # A closed stream never gets to the final usage chunk; estimate one token per streamed chunk
+            record_usage(SimpleNamespace(completion_tokens=chunks), estimated=True)
+        texts = ["".join(text) if text is not None else None for text in parts]
+        return [text[:detector.end] if text is not None and detector.complete else text for text, detector in zip(texts, detectors)]
@@ -1,32 +1,25 @@
-from typing import Optional
+from typing import Dict, List, Optional
 from os import getenv
 
-from openai import OpenAI, AsyncOpenAI
+from .base_generator import BaseGenerator
+from .limits import RoleLimits
 from .openai import OpenAIGenerator
 
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
 class OpenRouterGenerator(OpenAIGenerator):
-    def __init__(self, model: str = "deepseek/deepseek-chat", api_key: Optional[str] = None) -> None:
-        self.model = model
-        self.api_key = api_key if api_key else getenv("OPENROUTER_API_KEY")
-        self.client = OpenAI(base_url="https://openrouter.ai/api/v1",
-                             api_key=self.api_key,)
-        
-        self.aclient = AsyncOpenAI(base_url="https://openrouter.ai/api/v1",
-                             api_key=self.api_key,)
+    def __init__(self, model: str = "deepseek/deepseek-chat", api_key: Optional[str] = None, max_retries: int = 2, http_client=None,
+                 limits: Optional[Dict[str, RoleLimits]] = None, stream: bool = False, base_url: str = OPENROUTER_BASE_URL) -> None:
+        super().__init__(model=model, api_key=api_key if api_key else getenv("OPENROUTER_API_KEY"), base_url=base_url,
+                         max_retries=max_retries, http_client=http_client, limits=limits, stream=stream)
         
     def generate(self, prompt: str, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5):
         return super().generate(prompt, system_prompt, temperature)
     
     async def agenerate(self, prompt: str, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.2):
-        try:
-            response = await self.aclient.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=temperature,)
-            # print(response.choices[0].message.content) # For Debuging
-            return response.choices[0].message.content
-        except:
-            return 'error'
\ No newline at end of file
+        # Errors are raised, not turned into an 'error' response; wrap in ResilientGenerator to retry them
+        return await super().agenerate(prompt, system_prompt, temperature)
+    
+    async def agenerate_n(self, prompt: str, n: int = 1, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.2) -> List[str]:
+        # Most OpenRouter providers ignore `n`, so samples are requested one by one
+        return await BaseGenerator.agenerate_n(self, prompt, n, system_prompt, temperature)
@@ -0,0 +1,55 @@
+from typing import List, Optional
+
+from .base_generator import BaseGenerator
+from src.checkpoint import JsonlWriter
+
+class RecordingGenerator(BaseGenerator):
+    """Wraps a generator and appends every prompt it sends to a JSONL log.
+
+    Each line holds the system prompt, the prompt and the number of samples requested. The log is
+    the input of `prefix_stats.py`, which measures how much of the traffic a prefix cache can reuse.
+    The log stays open and is written by a `JsonlWriter` task, so recording never blocks the event
+    loop; open it with `async with` (or `open()` and `close()`) before sending requests.
+
+    Usage:
+        async with RecordingGenerator(generator, "prompts.jsonl") as recorder:
+            await recorder.agenerate(prompt)
+    """
+
+    def __init__(self, generator: BaseGenerator, log_path: str) -> None:
+        self.generator = generator
+        self.model = getattr(generator, 'model', type(generator).__name__)
+        self.log_path = log_path
+        self._writer: Optional[JsonlWriter] = None
+
+    async def open(self) -> "RecordingGenerator":
+        self._writer = await JsonlWriter(self.log_path).__aenter__()
+        return self
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+
+    async def __aenter__(self) -> "RecordingGenerator":
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    def record(self, prompt: str, system_prompt: str, n: int = 1) -> None:
+        if self._writer is None:
+            raise RuntimeError("RecordingGenerator must be opened (async with, or open()) before sending requests")
+        self._writer.write({"system_prompt": system_prompt, "prompt": prompt, "n": n})
+
+    def generate(self, prompt: str, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5) -> str:
+        self.record(prompt, system_prompt)
+        return self.generator.generate(prompt, system_prompt, temperature)
+
+    async def agenerate(self, prompt: str, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5):
+        self.record(prompt, system_prompt)
+        return await self.generator.agenerate(prompt, system_prompt, temperature)
+
+    async def agenerate_n(self, prompt: str, n: int = 1, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5) -> List[str]:
+        self.record(prompt, system_prompt, n)
+        return await self.generator.agenerate_n(prompt, n, system_prompt, temperature)
@@ -0,0 +1,159 @@
+import asyncio
+import email.utils
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from .base_generator import BaseGenerator
+from src.metrics import current_role
+
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+def is_retryable(error: BaseException) -> bool:
+    """Rate limits, timeouts, connection errors and 5xx responses are transient; anything else is not."""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    # openai's APIConnectionError and APITimeoutError carry no status code
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the server asked us to wait in the Retry-After(-Ms) header of `error`'s response, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        date = email.utils.parsedate_to_datetime(value) if value else None
+        return max(0.0, date.timestamp() - time.time()) if date is not None else None
+
+class ResilientGenerator(BaseGenerator):
+    """Wraps a generator with classified retries and optional hedged requests.
+
+    Transient failures (see `is_retryable`) are retried up to `max_retries` times with full-jitter
+    exponential backoff starting at `base_delay` and capped at `max_delay`. A 429 response waits at
+    least as long as its Retry-After header asks. Other errors are raised immediately. `timeout` bounds
+    each attempt.
+
+    With `hedge_percentile` set, a duplicate request is sent when an attempt has been running longer
+    than that percentile of recent latencies, and the first answer wins; the other request is
+    cancelled. Latencies are tracked per metrics role, since e.g. answers take much longer than
+    analyzer verdicts, and hedging starts once a role has `hedge_min_samples` of them.
+
+    The wrapped backend should not retry on its own (e.g. `max_retries=0` on the openai client).
+    """
+
+    def __init__(self, generator: BaseGenerator, max_retries: int = 4, base_delay: float = 0.5, max_delay: float = 30.0,
+                 timeout: Optional[float] = None, hedge_percentile: Optional[float] = None, hedge_min_samples: int = 20,
+                 latency_window: int = 200) -> None:
+        if hedge_percentile is not None and not 0 < hedge_percentile < 100:
+            raise ValueError(f"hedge_percentile must be between 0 and 100, got {hedge_percentile}")
+        self.generator = generator
+        self.model = getattr(generator, 'model', type(generator).__name__)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.latency_window = latency_window
+        self.latencies: Dict[str, Deque[float]] = {}
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def generate(self, prompt: str, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5) -> str:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.generator.generate(prompt, system_prompt, temperature)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                self.retries += 1
+                time.sleep(self.backoff(attempt, e))
+
+    async def agenerate(self, prompt: str, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5):
+        return await self.call(lambda: self.generator.agenerate(prompt, system_prompt, temperature))
+
+    async def agenerate_n(self, prompt: str, n: int = 1, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5) -> List[str]:
+        return await self.call(lambda: self.generator.agenerate_n(prompt, n, system_prompt, temperature))
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        requested = retry_after(error)
+        if requested is not None:
+            # A little jitter on top, so that rate-limited requests do not all come back at once
+            delay = min(self.max_delay, requested) + random.uniform(0, self.base_delay)
+        return delay
+
+    async def call(self, request: Callable[[], Awaitable[Any]]) -> Any:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self.attempt(request)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self.backoff(attempt, e))
+
+    async def attempt(self, request: Callable[[], Awaitable[Any]]) -> Any:
+        role = current_role.get()
+        start = time.monotonic()
+        hedge_delay = self.hedge_delay(role)
+        if hedge_delay is None:
+            result = await self.timed(request)
+        else:
+            result = await self.hedged(request, hedge_delay)
+        latencies = self.latencies.setdefault(role, deque(maxlen=self.latency_window))
+        latencies.append(time.monotonic() - start)
+        return result
+
+    async def timed(self, request: Callable[[], Awaitable[Any]]) -> Any:
+        if self.timeout is None:
+            return await request()
+        return await asyncio.wait_for(request(), self.timeout)
+
+    def hedge_delay(self, role: str) -> Optional[float]:
+        if self.hedge_percentile is None:
+            return None
+        latencies = self.latencies.get(role)
+        if latencies is None or len(latencies) < self.hedge_min_samples:
+            return None
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))]
+
+    async def hedged(self, request: Callable[[], Awaitable[Any]], hedge_delay: float) -> Any:
+        primary = asyncio.ensure_future(self.timed(request))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done:
+                self.hedges += 1
+                tasks.append(asyncio.ensure_future(self.timed(request)))
+            while True:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                # Prefer a successful answer; only fail once every request has failed
+                succeeded = [task for task in done if task.exception() is None]
+                if succeeded:
+                    if primary not in succeeded:
+                        self.hedge_wins += 1
+                    return succeeded[0].result()
+                tasks = [task for task in tasks if task not in done]
+                if not tasks:
+                    return next(iter(done)).result()
+        finally:
+            for task in tasks:
+                task.cancel()
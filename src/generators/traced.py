@@ -0,0 +1,28 @@
+from typing import List
+
+from .base_generator import BaseGenerator
+from src.metrics import current_role
+from src.tracing import span
+
+class TracedGenerator(BaseGenerator):
+    """Wraps a generator and records every call as a span of the current trace.
+
+    Wrap the outermost generator so that the span covers everything the caller waits for, including
+    cache lookups and waiting on an identical in-flight request.
+    """
+
+    def __init__(self, generator: BaseGenerator) -> None:
+        self.generator = generator
+        self.model = getattr(generator, 'model', type(generator).__name__)
+
+    def generate(self, prompt: str, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5) -> str:
+        with span("generate", role=current_role.get(), prompt_chars=len(prompt)):
+            return self.generator.generate(prompt, system_prompt, temperature)
+
+    async def agenerate(self, prompt: str, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5):
+        with span("generate", role=current_role.get(), prompt_chars=len(prompt)):
+            return await self.generator.agenerate(prompt, system_prompt, temperature)
+
+    async def agenerate_n(self, prompt: str, n: int = 1, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5) -> List[str]:
+        with span("generate_n", role=current_role.get(), prompt_chars=len(prompt), n=n):
+            return await self.generator.agenerate_n(prompt, n, system_prompt, temperature)
@@ -1,27 +1,20 @@
-from typing import Optional
-from os import getenv
+from typing import Dict, List, Optional
 
-from openai import OpenAI, AsyncOpenAI
+from .limits import RoleLimits
 from .openai import OpenAIGenerator
 
 class VLLMGenerator(OpenAIGenerator):
-    def __init__(self, model: str = "deepseek/deepseek-chat", base_url: str = 'http://localhost:8000/v1') -> None:
-        self.model = model
+    def __init__(self, model: str = "deepseek/deepseek-chat", base_url: str = 'http://localhost:8000/v1', max_retries: int = 2, http_client=None,
+                 limits: Optional[Dict[str, RoleLimits]] = None, stream: bool = False) -> None:
         # self.api_key = api_key if api_key else 'test-abc1'
-        self.client = OpenAI(base_url=base_url, api_key='test-abc1')
-        
-        self.aclient = AsyncOpenAI(base_url=base_url, api_key='test-abc1')
+        super().__init__(model=model, api_key='test-abc1', base_url=base_url, max_retries=max_retries, http_client=http_client, limits=limits, stream=stream)
         
     def generate(self, prompt: str, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5):
         return super().generate(prompt, system_prompt, temperature)
     
     async def agenerate(self, prompt: str, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5):
-        response = await self.aclient.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=temperature,)
-        # print(response.choices[0].message.content) # For Debuging
-        return response.choices[0].message.content
\ No newline at end of file
+        return await super().agenerate(prompt, system_prompt, temperature)
+    
+    async def agenerate_n(self, prompt: str, n: int = 1, system_prompt: str = "You are a helpful AI assistant.", temperature: float = 0.5) -> List[str]:
+        # vLLM serves all `n` samples from a single prefill of the shared prompt
+        return await super().agenerate_n(prompt, n, system_prompt, temperature)
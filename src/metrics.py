@@ -0,0 +1,204 @@
+import asyncio
+import bisect
+import contextvars
+import json
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# Pipeline stage that issues the LLM calls made in the current task. Tasks inherit it from the code
+# that created them, so it only has to be set where a stage starts.
+current_role: contextvars.ContextVar[str] = contextvars.ContextVar("current_role", default="other")
+
+# Usage of the call being measured by the innermost InstrumentedGenerator, filled in by the backend
+_current_call: contextvars.ContextVar[Optional[Dict[str, int]]] = contextvars.ContextVar("current_call", default=None)
+
+# Upper bounds of the latency histogram buckets in seconds; the last bucket is unbounded
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0)
+
+@contextmanager
+def role(name: str) -> Iterator[None]:
+    """Attribute the LLM calls made inside this block (and in tasks it creates) to `name`."""
+    token = current_role.set(name)
+    try:
+        yield
+    finally:
+        current_role.reset(token)
+
+def record_usage(usage: Any, estimated: bool = False) -> None:
+    """Add the `usage` of a chat completion to the call currently being measured, if any.
+
+    Estimated usage, e.g. of a stream closed before the backend reported its usage, is only counted
+    in `estimated_completion_tokens`, so that the token counts stay those reported by the backend.
+    """
+    call = _current_call.get()
+    if call is None or usage is None:
+        return
+    if estimated:
+        call["estimated_completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+        return
+    call["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+    call["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+def record_failure() -> None:
+    """Count the call currently being measured as an error, for backends that do not raise on failure."""
+    call = _current_call.get()
+    if call is not None:
+        call["failures"] += 1
+
+class RoleStats:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.samples = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.estimated_completion_tokens = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def latency_quantile(self, q: float) -> Optional[float]:
+        # Upper bound of the bucket holding the q-quantile; the last bucket reports the maximum seen
+        completed = sum(self.latency_buckets)
+        if completed == 0:
+            return None
+        rank = q * completed
+        seen = 0
+        for i, count in enumerate(self.latency_buckets):
+            seen += count
+            if seen >= rank and count:
+                return min(LATENCY_BUCKETS[i], self.latency_max) if i < len(LATENCY_BUCKETS) else self.latency_max
+        return self.latency_max
+
+    def to_dict(self) -> Dict[str, Any]:
+        completed = sum(self.latency_buckets)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "samples": self.samples,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "estimated_completion_tokens": self.estimated_completion_tokens,
+            "latency_mean": self.latency_sum / completed if completed else None,
+            "latency_p50": self.latency_quantile(0.5),
+            "latency_p95": self.latency_quantile(0.95),
+            "latency_p99": self.latency_quantile(0.99),
+            "latency_max": self.latency_max if completed else None,
+            "latency_histogram": {
+                **{f"le_{bound:g}": count for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets)},
+                "le_inf": self.latency_buckets[-1],
+            },
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+        }
+
+class MetricsRegistry:
+    """Per-role request, error, latency, token and concurrency counters of a run.
+
+    Everything runs on the event loop thread, so plain counters are enough.
+    """
+
+    def __init__(self) -> None:
+        self.start_time = time.monotonic()
+        self.roles: Dict[str, RoleStats] = {}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.gauges: Dict[str, Callable[[], float]] = {}
+
+    def gauge(self, name: str, read: Callable[[], float]) -> None:
+        """Report the current value of `read()` as `name` in every snapshot, e.g. an adaptive concurrency limit."""
+        self.gauges[name] = read
+
+    def stats(self, name: str) -> RoleStats:
+        if name not in self.roles:
+            self.roles[name] = RoleStats()
+        return self.roles[name]
+
+    @contextmanager
+    def measure(self, samples: int = 1) -> Iterator[Dict[str, int]]:
+        """Measure one backend call of the current role. Yields the dict that `record_usage` fills in."""
+        stats = self.stats(current_role.get())
+        stats.requests += 1
+        stats.samples += samples
+        stats.in_flight += 1
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        call = {"prompt_tokens": 0, "completion_tokens": 0, "estimated_completion_tokens": 0, "failures": 0}
+        token = _current_call.set(call)
+        start = time.monotonic()
+        try:
+            yield call
+        except asyncio.CancelledError:
+            # e.g. the losing copy of a hedged request
+            stats.cancelled += 1
+            raise
+        except BaseException:
+            stats.errors += 1
+            raise
+        else:
+            if call["failures"]:
+                stats.errors += 1
+            latency = time.monotonic() - start
+            stats.latency_sum += latency
+            stats.latency_max = max(stats.latency_max, latency)
+            stats.latency_buckets[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+        finally:
+            _current_call.reset(token)
+            stats.in_flight -= 1
+            self.in_flight -= 1
+            stats.prompt_tokens += call["prompt_tokens"]
+            stats.completion_tokens += call["completion_tokens"]
+            stats.estimated_completion_tokens += call["estimated_completion_tokens"]
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.start_time
+        roles = {name: stats.to_dict() for name, stats in sorted(self.roles.items())}
+        completion_tokens = sum(stats.completion_tokens for stats in self.roles.values())
+        return {
+            "elapsed": elapsed,
+            "requests": sum(stats.requests for stats in self.roles.values()),
+            "errors": sum(stats.errors for stats in self.roles.values()),
+            "prompt_tokens": sum(stats.prompt_tokens for stats in self.roles.values()),
+            "completion_tokens": completion_tokens,
+            "completion_tokens_per_second": completion_tokens / elapsed if elapsed > 0 else 0.0,
+            "estimated_completion_tokens": sum(stats.estimated_completion_tokens for stats in self.roles.values()),
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "gauges": {name: read() for name, read in self.gauges.items()},
+            "roles": roles,
+        }
+
+    def summary(self) -> str:
+        snapshot = self.snapshot()
+        lines = [
+            f"[metrics] {snapshot['elapsed']:.0f}s: {snapshot['requests']} requests, {snapshot['errors']} errors, "
+            f"{snapshot['prompt_tokens']} prompt / {snapshot['completion_tokens']} completion tokens "
+            f"({snapshot['completion_tokens_per_second']:.1f} tok/s), {snapshot['in_flight']} in flight (peak {snapshot['peak_in_flight']})"
+        ]
+        if snapshot["estimated_completion_tokens"]:
+            lines[0] += f", about {snapshot['estimated_completion_tokens']} more completion tokens in streams closed early"
+        if snapshot["gauges"]:
+            lines.append("  " + " ".join(f"{name}={value:g}" for name, value in snapshot["gauges"].items()))
+        for name, stats in snapshot["roles"].items():
+            latency = "-" if stats["latency_mean"] is None else f"mean {stats['latency_mean']:.2f}s p50 {stats['latency_p50']:.2f}s p95 {stats['latency_p95']:.2f}s"
+            lines.append(
+                f"  {name:<14} {stats['requests']:>7} req {stats['errors']:>5} err {stats['prompt_tokens']:>10} in {stats['completion_tokens']:>10} out "
+                f"{stats['in_flight']:>4} in flight (peak {stats['peak_in_flight']})  {latency}"
+            )
+        return "\n".join(lines)
+
+    def dump(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+async def report_periodically(registry: MetricsRegistry, interval: float, write: Callable[[str], Any] = print) -> None:
+    """Write `registry.summary()` every `interval` seconds until cancelled."""
+    while True:
+        await asyncio.sleep(interval)
+        write(registry.summary())
@@ -3,18 +3,21 @@ from src.evolvers import RecurrentEvolver
 from src.evaluator import BaseEvaluator
 from src.generators import BaseGenerator
 from src.utils import parse_steps
+from src.metrics import role
+from src.tracing import span
 
-from typing import List, Optional
+from typing import List, Optional, Tuple
+from collections import Counter, OrderedDict
 import asyncio
+import json
+import math
 
+# Static guidance comes first and the per-request current method and feedback last, so that all
+# candidates of one optimization step share a long prompt prefix on the backend.
 METHOD_EVOL_PROMPT = """
-Feedback: {feedback}
 You are an Instruction Method Optimizer. Based on the feedback from the evolution failure case, optimize the method below to create a more effective instruction rewriting process without negatively impacting performance on other cases. Ensure that the complexity of the optimized method is not lower than the previous method.
 If the feedback is "### PASSED", then come up with a better method than the current one to create a more complex and effective instruction rewriting process. Remember that the new method should not be very similar to the current method, be creative with new steps for the new method.
 
-Current Method:
-{current_method}
-
 **Output Instructions**
 Add more steps to achieve the most refined method if needed, however, REMEMBER that the final step in your output has to be "#Finally Rewritten Instruction#" no matter how many steps are added.
 Please generate the optimized method strictly using ONLY the given below format, do not add anything else:
@@ -38,68 +41,146 @@ Step N:
 #Finally Rewritten Instruction#
 Do not generate new Instruction here, but please provide the process to write the final rewritten instruction. You are generating a guide to write a better instruction, NOT THE INSTRUCTION ITSELF.
 ```
+
+Current Method:
+{current_method}
+
+Feedback: {feedback}
 """
 
+ERROR_RESPONSE = "error response"
+
+def steps_key(steps: List[dict]) -> str:
+    # Candidates that parse to the same steps render to the same evolving method
+    return json.dumps([(step['step_name'], step['step_instruction']) for step in steps], ensure_ascii=False)
+
 class EvolOptimizer(BaseOptimizer):
-    def __init__(self, generator: BaseGenerator, evaluator: BaseEvaluator) -> None:
+    def __init__(self, generator: BaseGenerator, evaluator: BaseEvaluator, dev_cache_size: int = 100000,
+                 successive_halving: bool = False, halving_keep_fraction: float = 0.5, halving_min_dev_size: int = 2) -> None:
         self.generator = generator
         self.evaluator = evaluator
+        # Successive halving: score all candidates on a small dev subset, keep the best fraction and
+        # grow the subset for the survivors until one candidate is left or the full dev set is used
+        if not 0 < halving_keep_fraction < 1:
+            raise ValueError(f"halving_keep_fraction must be between 0 and 1, got {halving_keep_fraction}")
+        self.successive_halving = successive_halving
+        self.halving_keep_fraction = halving_keep_fraction
+        self.halving_min_dev_size = max(1, halving_min_dev_size)
+        # (steps key, dev instruction) -> task resolving to (evolved instruction, response), shared across the run
+        self.dev_cache_size = dev_cache_size
+        self.dev_cache: "OrderedDict[Tuple[str, str], asyncio.Task]" = OrderedDict()
 
     async def optimize(self, current_method: str, feedback: List[str], evolver: RecurrentEvolver, development_set: Optional[List] = None):
-        async def generate_and_evaluate(feedback_item):
-            optimized_prompt = METHOD_EVOL_PROMPT.format(current_method=current_method, feedback=feedback_item)
-            evolved_method = await self.generator.agenerate(optimized_prompt, temperature=0.5)
-
-            async def process_instruction(instruction):
-                async def generate_with_timeout(prompt, temperature):
-                    try:
-                        return await asyncio.wait_for(
-                            self.generator.agenerate(prompt=prompt, temperature=temperature),
-                            timeout=60.0  # 60 seconds timeout
-                        )
-                    except asyncio.TimeoutError:
-                        return None
-                try:
-                    parsed_steps = parse_steps(evolved_method)
-                    new_method = evolver.build_new_method(parsed_steps, instruction)
-                    
-                    evolved_instruction = await generate_with_timeout(new_method, 0.2)
-                    if evolved_instruction is None:
-                        # print('bad')
-                        return instruction, "error response"
-                    
-                    try:
-                        parsed_evolved_instruction = parse_steps(evolved_instruction)[-1]['step_instruction']
-                    except:
-                        fallback_response = await generate_with_timeout(instruction, 0.5)
-                        if fallback_response is None:
-                            # print('bad')
-                            return instruction, "error response"
-                        return instruction, fallback_response
-                    response = await generate_with_timeout(parsed_evolved_instruction, 0.5)
-                    if response is None:
-                        # print('bad')
-                        return instruction, "error response"
-                    
-                    # print('good')
-                    return parsed_evolved_instruction, response
-                except:
-                    # print('bad')
-                    return instruction, "error response"
-        
-
-            results = await asyncio.gather(*[process_instruction(instruction) for instruction in development_set])
-            evolved_instructions, responses = zip(*results)
-
-            return evolved_method, list(evolved_instructions), list(responses)
-
-        results = await asyncio.gather(*[generate_and_evaluate(item) for item in feedback])
+        # Identical feedback items produce identical prompts, so sample their candidates in one request
+        feedback_counts = Counter(feedback)
+        with span("sample_methods", n=len(feedback)):
+            candidate_groups = await asyncio.gather(*[
+                self.generator.agenerate_n(METHOD_EVOL_PROMPT.format(current_method=current_method, feedback=feedback_item), n=count, temperature=0.5)
+                for feedback_item, count in feedback_counts.items()
+            ])
+        candidate_methods = [method for group in candidate_groups for method in group]
+
+        # Only evaluate one candidate per distinct list of parsed steps
+        unique_candidates = {}
+        for method in candidate_methods:
+            unique_candidates.setdefault(steps_key(parse_steps(method)), method)
+        if len(unique_candidates) == 1:
+            return candidate_methods[0], candidate_methods
+
+        if self.successive_halving:
+            best_method = await self.select_by_successive_halving(list(unique_candidates.items()), evolver, development_set)
+            return best_method, candidate_methods
+
+        results = await asyncio.gather(*[self.evaluate_method(key, method, evolver, development_set) for key, method in unique_candidates.items()])
         evolved_methods, all_evolved_instructions, all_responses = zip(*results)
 
-        best_method, best_score = await self.evaluator.select_best_method(
-            evolved_methods, 
-            [instr for method_instructions in all_evolved_instructions for instr in method_instructions],
-            [resp for method_responses in all_responses for resp in method_responses]
-        )
-
-        return best_method, list(evolved_methods)
\ No newline at end of file
+        with span("select_best", candidates=len(evolved_methods)):
+            best_method, best_score = await self.evaluator.select_best_method(
+                list(evolved_methods), 
+                list(all_evolved_instructions),
+                list(all_responses)
+            )
+
+        return best_method, candidate_methods
+
+    async def evaluate_method(self, key: str, evolved_method: str, evolver: RecurrentEvolver, development_set: List[str]) -> Tuple[str, List[str], List[str]]:
+        parsed_steps = parse_steps(evolved_method)
+        with span("evaluate_candidate", dev_size=len(development_set)):
+            results = await asyncio.gather(*[self.evaluate_on_instruction(key, parsed_steps, instruction, evolver) for instruction in development_set])
+        evolved_instructions, responses = zip(*results)
+        return evolved_method, list(evolved_instructions), list(responses)
+
+    async def select_by_successive_halving(self, candidates: List[Tuple[str, str]], evolver: RecurrentEvolver, development_set: List[str]) -> str:
+        subset_size = min(self.halving_min_dev_size, len(development_set))
+        while True:
+            # Results for the instructions of earlier rounds come from the dev cache, so growing the subset
+            # only pays for the new instructions
+            subset = development_set[:subset_size]
+            with span("halving_round", candidates=len(candidates), dev_size=subset_size):
+                results = await asyncio.gather(*[self.evaluate_method(key, method, evolver, subset) for key, method in candidates])
+                scores = await self.evaluator.score_methods([instructions for _, instructions, _ in results], [responses for _, _, responses in results])
+            # Stable ranking, best first; ties keep the original candidate order
+            ranking = sorted(range(len(candidates)), key=lambda i: -scores[i] if self.evaluator.higher_is_better else scores[i])
+
+            if subset_size >= len(development_set):
+                return candidates[ranking[0]][1]
+
+            keep = max(1, math.ceil(len(candidates) * self.halving_keep_fraction))
+            if keep == 1:
+                return candidates[ranking[0]][1]
+            candidates = [candidates[i] for i in sorted(ranking[:keep])]
+            subset_size = min(len(development_set), math.ceil(subset_size / self.halving_keep_fraction))
+
+    async def evaluate_on_instruction(self, key: str, parsed_steps: List[dict], instruction: str, evolver: RecurrentEvolver) -> Tuple[str, str]:
+        # The dev set is fixed for the whole run, so each (method steps, dev instruction) pair is only run once
+        cache_key = (key, instruction)
+        task = self.dev_cache.get(cache_key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(self.run_on_instruction(parsed_steps, instruction, evolver))
+            self.dev_cache[cache_key] = task
+            while len(self.dev_cache) > self.dev_cache_size:
+                self.dev_cache.popitem(last=False)
+        else:
+            self.dev_cache.move_to_end(cache_key)
+
+        with span("dev_instruction", shared=shared):
+            result = await asyncio.shield(task)
+        if result[1] == ERROR_RESPONSE and self.dev_cache.get(cache_key) is task:
+            # Transient failures are retried the next time this pair comes up
+            del self.dev_cache[cache_key]
+        return result
+
+    async def run_on_instruction(self, parsed_steps: List[dict], instruction: str, evolver: RecurrentEvolver) -> Tuple[str, str]:
+        async def generate_with_timeout(prompt, temperature):
+            try:
+                return await asyncio.wait_for(
+                    self.generator.agenerate(prompt=prompt, temperature=temperature),
+                    timeout=60.0  # 60 seconds timeout
+                )
+            except asyncio.TimeoutError:
+                return None
+        try:
+            new_method = evolver.build_new_method(parsed_steps, instruction)
+            
+            with role("dev_rewrite"):
+                evolved_instruction = await generate_with_timeout(new_method, 0.2)
+            if evolved_instruction is None:
+                return instruction, ERROR_RESPONSE
+            
+            try:
+                parsed_evolved_instruction = parse_steps(evolved_instruction)[-1]['step_instruction']
+            except:
+                with role("dev_answer"):
+                    fallback_response = await generate_with_timeout(instruction, 0.5)
+                if fallback_response is None:
+                    return instruction, ERROR_RESPONSE
+                return instruction, fallback_response
+            with role("dev_answer"):
+                response = await generate_with_timeout(parsed_evolved_instruction, 0.5)
+            if response is None:
+                return instruction, ERROR_RESPONSE
+            
+            return parsed_evolved_instruction, response
+        except:
+            return instruction, ERROR_RESPONSE
@@ -0,0 +1,52 @@
+import re
+from typing import Callable, Dict, Iterable, List, Tuple
+
+TOKEN_REGEX = re.compile(r"\w+|[^\w\s]|\s+")
+
+def approximate_tokenize(text: str) -> List[str]:
+    # Words, punctuation and whitespace runs; close enough to BPE token counts for relative measurements
+    return TOKEN_REGEX.findall(text)
+
+def shared_prefix_stats(prompts: Iterable[Tuple[str, str]], tokenize: Callable[[str], List] = approximate_tokenize, block_size: int = 16) -> Dict[str, float]:
+    """Measure how many prompt tokens an automatic prefix cache could serve from earlier prompts.
+
+    Mirrors vLLM's block-level prefix caching: prompts are split into blocks of `block_size` tokens and a
+    block is a hit only if the same block, with the same full prefix before it, was seen earlier. The
+    cache is assumed to be large enough to never evict, so the result is an upper bound for the backend.
+
+    `prompts` yields (system_prompt, prompt) pairs in the order they were sent.
+    """
+    seen_blocks = set()
+    num_prompts = 0
+    total_tokens = 0
+    cached_tokens = 0
+    fully_cached_prompts = 0
+
+    for system_prompt, prompt in prompts:
+        tokens = tokenize(system_prompt or "") + tokenize(prompt)
+        num_prompts += 1
+        total_tokens += len(tokens)
+
+        parent = None
+        prompt_cached = 0
+        matching = True
+        for start in range(0, len(tokens) - block_size + 1, block_size):
+            block = (parent, tuple(tokens[start:start + block_size]))
+            parent = hash(block)
+            if matching and parent in seen_blocks:
+                prompt_cached += block_size
+            else:
+                matching = False
+                seen_blocks.add(parent)
+        cached_tokens += prompt_cached
+        if prompt_cached and prompt_cached == len(tokens) // block_size * block_size:
+            fully_cached_prompts += 1
+
+    return {
+        "num_prompts": num_prompts,
+        "total_tokens": total_tokens,
+        "cached_tokens": cached_tokens,
+        "shared_prefix_fraction": cached_tokens / total_tokens if total_tokens else 0.0,
+        "mean_tokens_per_prompt": total_tokens / num_prompts if num_prompts else 0.0,
+        "fully_cached_prompts": fully_cached_prompts,
+    }
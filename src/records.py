@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from .checkpoint import read_jsonl
+from .step_parser import FINAL_STEP_NAME
+from .utils import parse_steps
+
+# full: every prompt and raw response, as rendered. compact: methods are ids into a MethodTable and each
+# evolved candidate is reduced to its rewritten instruction. minimal: only the instruction of each stage.
+VERBOSITY_LEVELS = ("full", "compact", "minimal")
+
+def methods_path(output_path: str) -> str:
+    """Method table written next to a compact output file, e.g. evolved.jsonl -> evolved.methods.jsonl."""
+    root, extension = os.path.splitext(output_path)
+    return root + ".methods" + (extension or ".jsonl")
+
+def method_entry(template: Optional[str] = None, steps: Optional[List[Dict]] = None) -> Dict[str, Any]:
+    """Instruction-independent content of a method: a template with an {{instruction}} placeholder, or parsed steps."""
+    if template is not None:
+        return {"template": template}
+    return {"steps": [{"step_name": step["step_name"], "step_instruction": step["step_instruction"]} for step in steps]}
+
+def method_id(entry: Dict[str, Any]) -> str:
+    # Content address: identical methods get the same id in every process, shard and run
+    canonical = json.dumps(entry, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
+
+class MethodTable:
+    """Content-addressed store of the methods referenced by compact result records.
+
+    Each distinct method is kept once, however many stages and instructions use it. Methods added
+    since the last `pending()` call are returned by it, so they can be appended to the table file.
+    Without `retain`, only the ids of methods already returned by `pending()` are kept in memory,
+    which is enough to write each method once.
+    """
+
+    def __init__(self, retain: bool = True) -> None:
+        self.retain = retain
+        self.methods: Dict[str, Dict[str, Any]] = {}
+        self._ids: Set[str] = set()
+        self._pending: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, entry: Dict[str, Any]) -> str:
+        key = method_id(entry)
+        if key not in self._ids:
+            self._ids.add(key)
+            self.methods[key] = entry
+            self._pending.append(key)
+        return key
+
+    def get(self, key: str) -> Dict[str, Any]:
+        return self.methods[key]
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Table records ({"method_id": ..., **entry}) of the methods added since the last call."""
+        records = [{"method_id": key, **self.methods[key]} for key in self._pending]
+        if not self.retain:
+            for key in self._pending:
+                del self.methods[key]
+        self._pending = []
+        return records
+
+    def records(self) -> List[Dict[str, Any]]:
+        return [{"method_id": key, **entry} for key, entry in self.methods.items()]
+
+    def load(self, records: Iterable[Dict[str, Any]]) -> "MethodTable":
+        """Add already stored table records without marking them pending."""
+        for record in records:
+            self._ids.add(record["method_id"])
+            if self.retain:
+                self.methods[record["method_id"]] = {name: value for name, value in record.items() if name != "method_id"}
+        return self
+
+    @classmethod
+    def from_file(cls, path: str) -> "MethodTable":
+        table = cls()
+        if os.path.exists(path):
+            table.load(read_jsonl(path))
+        return table
+
+def final_step_instruction(response: str) -> str:
+    # The rewritten instruction of an evolver response, or the response itself if it does not parse
+    steps = parse_steps(response)
+    if steps and steps[-1]["step_name"] == FINAL_STEP_NAME:
+        return steps[-1]["step_instruction"]
+    return response
+
+def compact_stage(stage: Dict[str, Any], method: str, optimized_method: str, verbosity: str) -> Dict[str, Any]:
+    """Compact form of a full stage record, given the ids of its methods. The input instruction is left out: it is the previous stage's output."""
+    compact = {"stage": stage["stage"], "method": method, "optimized_method": optimized_method}
+    if verbosity == "compact":
+        compact["evolved_instructions"] = [final_step_instruction(response) for response in stage["evolved_instructions"]]
+        compact["feedbacks"] = stage["feedbacks"]
+    compact["final_evolved_instruction"] = stage["final_evolved_instruction"]
+    compact["stage_time"] = stage["stage_time"]
+    return compact
+
+def expand_record(record: Dict[str, Any], table: MethodTable, build_method: Optional[Callable[[List[Dict], str], str]] = None) -> Dict[str, Any]:
+    """Turn a compact or minimal record back into the layout of a full one.
+
+    Methods are re-rendered from the table with `build_method` (by default `RecurrentEvolver.build_new_method`).
+    Raw evolver responses are not stored in compact records; their rewritten instructions take their
+    place, and minimal records have no candidates or feedbacks at all.
+    """
+    if record.get("verbosity", "full") == "full":
+        return record
+    if build_method is None:
+        from .evolvers.recurrent_evolver import RecurrentEvolver
+        build_method = RecurrentEvolver(None).build_new_method
+
+    def render(key: str, instruction: str) -> str:
+        entry = table.get(key)
+        if "template" in entry:
+            return entry["template"].replace("{{instruction}}", instruction)
+        return build_method(entry["steps"], instruction)
+
+    stages = []
+    instruction = record["original_instruction"]
+    for stage in record["stages"]:
+        stages.append({
+            "stage": stage["stage"],
+            "input_instruction": instruction,
+            "method": render(stage["method"], instruction),
+            "evolved_instructions": stage.get("evolved_instructions", []),
+            "feedbacks": stage.get("feedbacks", []),
+            "optimized_method": render(stage["optimized_method"], instruction),
+            "final_evolved_instruction": stage["final_evolved_instruction"],
+            "stage_time": stage["stage_time"],
+        })
+        instruction = stage["final_evolved_instruction"]
+    expanded = {name: value for name, value in record.items() if name != "verbosity"}
+    expanded["stages"] = stages
+    return expanded
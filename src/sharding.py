@@ -0,0 +1,88 @@
+import glob
+import hashlib
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, Optional
+
+SHARD_SUFFIX = ".shard-{index:05d}-of-{num_shards:05d}"
+SHARD_SUFFIX_REGEX = re.compile(r"\.shard-(\d{5})-of-(\d{5})$")
+
+def shard_of(instruction: str, num_shards: int) -> int:
+    """Return the shard an instruction belongs to.
+
+    The shard only depends on the instruction text, so every process and machine agrees on it regardless
+    of dataset order, streaming, or Python's per-process hash seed.
+    """
+    digest = hashlib.sha1(instruction.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % num_shards
+
+def validate_shard(num_shards: int, shard_index: int) -> None:
+    if num_shards < 1:
+        raise ValueError(f"num_shards must be at least 1, got {num_shards}")
+    if not 0 <= shard_index < num_shards:
+        raise ValueError(f"shard_index must be in [0, {num_shards}), got {shard_index}")
+
+def shard_instructions(instructions: Iterable[str], num_shards: int, shard_index: int) -> Iterator[str]:
+    """Lazily yield the instructions of `instructions` that belong to shard `shard_index`."""
+    validate_shard(num_shards, shard_index)
+    if num_shards == 1:
+        yield from instructions
+        return
+    for instruction in instructions:
+        if shard_of(instruction, num_shards) == shard_index:
+            yield instruction
+
+def shard_path(path: str, num_shards: int, shard_index: int) -> str:
+    """Per-shard output path, e.g. results.jsonl -> results.shard-00001-of-00004.jsonl."""
+    if num_shards == 1:
+        return path
+    root, extension = os.path.splitext(path)
+    return root + SHARD_SUFFIX.format(index=shard_index, num_shards=num_shards) + extension
+
+def find_shard_paths(path: str) -> Dict[int, Dict[int, str]]:
+    """Find the shard files written for output `path`, grouped as {num_shards: {shard_index: path}}."""
+    root, extension = os.path.splitext(path)
+    found: Dict[int, Dict[int, str]] = {}
+    for candidate in glob.glob(glob.escape(root) + ".shard-*" + glob.escape(extension)):
+        match = SHARD_SUFFIX_REGEX.search(candidate[:len(candidate) - len(extension)])
+        if match:
+            found.setdefault(int(match.group(2)), {})[int(match.group(1))] = candidate
+    return found
+
+def merge_records(records_by_shard: Dict[int, Iterable[Dict]], num_shards: int, key: str = "original_instruction",
+                  expected: Optional[Iterable[str]] = None) -> Dict[str, List]:
+    """Combine shard outputs and report everything that does not add up.
+
+    Returns a dict with the merged `records` (first occurrence of each instruction, shards in index
+    order) and the problems found: `missing_shards`, `duplicates` (instructions seen more than once),
+    `misplaced` (instructions found in a shard they do not hash to) and, when the `expected`
+    instructions are given, `missing` and `unexpected` instructions.
+    """
+    records: List[Dict] = []
+    seen = set()
+    duplicates: List[str] = []
+    misplaced: List[str] = []
+    for shard_index in sorted(records_by_shard):
+        for record in records_by_shard[shard_index]:
+            instruction = record.get(key)
+            if instruction is None:
+                continue
+            if instruction in seen:
+                duplicates.append(instruction)
+                continue
+            seen.add(instruction)
+            if shard_of(instruction, num_shards) != shard_index:
+                misplaced.append(instruction)
+            records.append(record)
+
+    report = {
+        "records": records,
+        "missing_shards": [index for index in range(num_shards) if index not in records_by_shard],
+        "duplicates": duplicates,
+        "misplaced": misplaced,
+    }
+    if expected is not None:
+        expected = set(expected)
+        report["missing"] = sorted(expected - seen)
+        report["unexpected"] = sorted(seen - expected)
+    return report
@@ -0,0 +1,248 @@
+import bisect
+import io
+import re
+from typing import Dict, List, Optional, Tuple
+
+FINAL_STEP_NAME = "Finally Rewritten Instruction"
+
+MARKER_REGEX = re.compile(r"Step (\d+):")
+# A marker at the end of the text whose digits or colon may still arrive
+OPEN_MARKER_REGEX = re.compile(r"Step \d*\Z")
+DIGITS_REGEX = re.compile(r"\d*")
+BACKTICKS_REGEX = re.compile(r"`+")
+HASH_REGEX = re.compile(r"#")
+NONSPACE_REGEX = re.compile(r"\S")
+LINE_END_REGEX = re.compile(r"\n|\S")
+
+class StepParser:
+    """Incremental, single-pass parser of "Step N: #Name# instruction" outputs.
+
+    Feed the response as it is streamed; `steps()` returns exactly what `parse_steps` returns for the
+    text fed so far. Each chunk is scanned once for step markers, '#' and runs of backticks, and the
+    steps are read off these positions, so the total work is linear in the length of the response.
+
+    With `final_step` set, `feed` returns True as soon as the step of that name is complete, i.e. a
+    fence on a line of its own closes the fenced block right after it. `end` is then the position
+    just after that fence; the response can be cut there without changing its parsed steps. A fence
+    line inside the final step only counts once the code blocks opened in that step are closed.
+    """
+
+    def __init__(self, final_step: Optional[str] = FINAL_STEP_NAME) -> None:
+        self.final_step = final_step
+        self.complete = False
+        self.end: Optional[int] = None
+        self._text: Optional[str] = ""
+        self._buffer: Optional[io.StringIO] = None
+        self._size = 0
+        # Step markers as (start, position after the colon), '#' positions and runs of 3+ backticks as (start, length)
+        self._marker_starts: List[int] = []
+        self._marker_ends: List[int] = []
+        self._hashes: List[int] = []
+        self._runs: List[Tuple[int, int]] = []
+        self._run_starts: List[int] = []
+        # Partial "Step" prefix at the end of the text, or the start and digit count of an unfinished marker
+        self._marker_carry = ""
+        self._open_marker: Optional[int] = None
+        self._open_digits = 0
+        # Backtick run touching the end of the text
+        self._open_run: Optional[int] = None
+        self._open_run_length = 0
+        # Fences that may close the final step, waiting for the rest of their line; and the first
+        # marker of the fenced block whose step is not settled yet
+        self._candidates: List[Tuple[int, int]] = []
+        self._walk_marker: Optional[int] = None
+
+    def feed(self, chunk: str) -> bool:
+        if not chunk:
+            return self.complete
+        offset = self._size
+        self._append(chunk)
+        self._scan_markers(chunk, offset)
+        self._hashes.extend(offset + match.start() for match in HASH_REGEX.finditer(chunk))
+        self._scan_backticks(chunk, offset)
+        if self.final_step is not None and not self.complete:
+            self._check_candidates()
+        return self.complete
+
+    def steps(self) -> List[Dict]:
+        """The steps of the text fed so far, as `parse_steps` returns them."""
+        if self._text is None:
+            self._text = self._buffer.getvalue()
+        runs = self._runs
+        if self._open_run is not None and self._open_run_length >= 3:
+            runs = runs + [(self._open_run, self._open_run_length)]
+        lo, hi = 0, self._size
+        # The fenced region spans the first to the last "```", if they do not overlap
+        if runs and runs[-1][0] + runs[-1][1] - 3 >= runs[0][0] + 3:
+            lo, hi = runs[0][0] + 3, runs[-1][0] + runs[-1][1] - 3
+
+        steps = []
+        k = bisect.bisect_left(self._marker_starts, lo)
+        while k < len(self._marker_starts) and self._marker_ends[k] <= hi:
+            name, body_start, _ = self._step_head(k, hi)
+            next_k = bisect.bisect_left(self._marker_starts, body_start, k + 1)
+            body_end = self._marker_starts[next_k] if next_k < len(self._marker_starts) and self._marker_ends[next_k] <= hi else hi
+            steps.append({
+                "step_number": int(self._read(self._marker_starts[k] + 5, self._marker_ends[k] - 1)),
+                "step_name": name,
+                "step_instruction": self._read(body_start, body_end).strip(),
+            })
+            k = next_k
+        return steps
+
+    # Text
+
+    def _append(self, chunk: str) -> None:
+        # A single chunk, the common case of parsing a complete response, is kept as it is
+        if self._size == 0:
+            self._text = chunk
+        else:
+            if self._buffer is None:
+                self._buffer = io.StringIO()
+                self._buffer.write(self._text)
+            self._buffer.seek(self._size)
+            self._buffer.write(chunk)
+            self._text = None
+        self._size += len(chunk)
+
+    def _read(self, start: int, end: int) -> str:
+        if self._text is not None:
+            return self._text[start:end]
+        self._buffer.seek(start)
+        return self._buffer.read(max(0, end - start))
+
+    def _search(self, regex: "re.Pattern", start: int, end: int) -> Optional[int]:
+        # Position of the first match of a one-character `regex` in [start, end), read in small blocks
+        while start < end:
+            block = self._read(start, min(end, start + 64))
+            match = regex.search(block)
+            if match:
+                return start + match.start()
+            start += len(block)
+        return None
+
+    # Scanning
+
+    def _record_marker(self, start: int, end: int) -> None:
+        self._marker_starts.append(start)
+        self._marker_ends.append(end)
+
+    def _scan_markers(self, chunk: str, offset: int) -> None:
+        position = 0
+        if self._open_marker is not None:
+            digits = DIGITS_REGEX.match(chunk).end()
+            self._open_digits += digits
+            if digits == len(chunk):
+                return
+            if chunk[digits] == ":" and self._open_digits:
+                self._record_marker(self._open_marker, offset + digits + 1)
+            self._open_marker = None
+            position = digits
+
+        window = self._marker_carry + chunk[position:]
+        base = offset + position - len(self._marker_carry)
+        for match in MARKER_REGEX.finditer(window):
+            self._record_marker(base + match.start(), base + match.end())
+        self._marker_carry = ""
+        match = OPEN_MARKER_REGEX.search(window)
+        if match:
+            self._open_marker = base + match.start()
+            self._open_digits = match.end() - match.start() - 5
+            return
+        for length in (4, 3, 2, 1):
+            if window.endswith("Step"[:length]):
+                self._marker_carry = window[-length:]
+                return
+
+    def _scan_backticks(self, chunk: str, offset: int) -> None:
+        if self._open_run is not None and not chunk.startswith("`"):
+            # The run at the end of the previous chunk ended with it
+            if self._open_run_length >= 3:
+                self._add_run(self._open_run, self._open_run_length)
+            self._open_run = None
+        # str.find skips text without backticks much faster than a regex search
+        position = chunk.find("`")
+        while position != -1:
+            run_end = BACKTICKS_REGEX.match(chunk, position).end()
+            start, length = offset + position, run_end - position
+            if self._open_run is not None:
+                start, length = self._open_run, self._open_run_length + length
+                self._open_run = None
+            if run_end == len(chunk):
+                self._open_run, self._open_run_length = start, length
+            elif length >= 3:
+                self._add_run(start, length)
+            position = chunk.find("`", run_end)
+
+    def _add_run(self, start: int, length: int) -> None:
+        self._runs.append((start, length))
+        self._run_starts.append(start)
+        if self.final_step is not None and len(self._runs) > 1:
+            self._candidates.append((start, start + length))
+
+    # Completion of the final step
+
+    def _check_candidates(self) -> None:
+        while self._candidates:
+            start, end = self._candidates[0]
+            rest = self._search(LINE_END_REGEX, end, self._size)
+            if rest is None:
+                # The rest of the fence's line has not arrived yet
+                return
+            self._candidates.pop(0)
+            if self._read(rest, rest + 1) == "\n" and self._starts_line(start) and self._closes_final_step(start, end):
+                self.complete = True
+                self.end = end
+                self._candidates.clear()
+                return
+
+    def _starts_line(self, position: int) -> bool:
+        while position > 0:
+            block = self._read(max(0, position - 64), position)
+            newline = block.rfind("\n")
+            if block[newline + 1:].strip():
+                return False
+            if newline != -1:
+                return True
+            position -= len(block)
+        return True
+
+    def _closes_final_step(self, start: int, end: int) -> bool:
+        # The steps of the text cut at `end`: the fenced region ends at the last "```" of this run
+        lo, hi = self._runs[0][0] + 3, end - 3
+        if self._walk_marker is None:
+            self._walk_marker = bisect.bisect_left(self._marker_starts, lo)
+        k = self._walk_marker
+        while k < len(self._marker_starts) and self._marker_ends[k] <= hi:
+            name, body_start, settled = self._step_head(k, hi)
+            if not settled:
+                # A name that is still open: no '#' follows before `hi`, so no step up to `hi` has a name
+                return False
+            next_k = bisect.bisect_left(self._marker_starts, body_start, k + 1)
+            if next_k < len(self._marker_starts) and self._marker_ends[next_k] <= hi:
+                # Steps that end at the next marker stay the same however much text follows
+                self._walk_marker = k = next_k
+                continue
+            # Last step: the fence must not close a code block opened inside it
+            inner_runs = bisect.bisect_left(self._run_starts, start) - bisect.bisect_left(self._run_starts, body_start)
+            return name == self.final_step and inner_runs % 2 == 0
+        return False
+
+    def _step_head(self, k: int, hi: int) -> Tuple[str, int, bool]:
+        """(name, body start, settled) of the step at marker `k` in a region ending at `hi`.
+
+        Unsettled steps may still change if the region grows: their name has not been closed yet.
+        """
+        position = self._search(NONSPACE_REGEX, self._marker_ends[k], hi)
+        if position is None:
+            return "", hi, False
+        if self._read(position, position + 1) != "#":
+            return "", position, True
+        closing = bisect.bisect_right(self._hashes, position)
+        if closing == len(self._hashes) or self._hashes[closing] >= hi:
+            return "", position, False
+        closing = self._hashes[closing]
+        if closing == position + 1:
+            # "##" is not a name
+            return "", position, True
+        return self._read(position + 1, closing).strip(), closing + 1, True
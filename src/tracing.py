@@ -0,0 +1,93 @@
+import contextvars
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+class TraceContext:
+    __slots__ = ("tracer", "trace_id")
+
+    def __init__(self, tracer: "Tracer", trace_id: int) -> None:
+        self.tracer = tracer
+        self.trace_id = trace_id
+
+# Sampled trace of the current task, None when untraced. Tasks inherit it from the code that created
+# them, so spans opened in concurrently running children land on the same track as their parent.
+_current_trace: contextvars.ContextVar[Optional[TraceContext]] = contextvars.ContextVar("current_trace", default=None)
+
+class Tracer:
+    """Collects nested spans of sampled traces and exports them as Chrome trace-event JSON.
+
+    Each sampled `trace` (one per instruction) becomes its own track of nestable async slices, so
+    overlapping children, e.g. the concurrent dev-set calls of several optimizer candidates, are drawn
+    stacked under their parent in Perfetto or chrome://tracing. Unsampled traces cost one random
+    draw; spans opened under them do nothing. At most `max_spans` spans are kept.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, max_spans: int = 500_000, seed: Optional[int] = None) -> None:
+        if not 0 <= sample_rate <= 1:
+            raise ValueError(f"sample_rate must be between 0 and 1, got {sample_rate}")
+        self.sample_rate = sample_rate
+        self.max_spans = max_spans
+        # (trace id, name, start ns, end ns, args)
+        self.spans: List[Tuple[int, str, int, int, Dict[str, Any]]] = []
+        self.dropped_spans = 0
+        self.traces_sampled = 0
+        self._random = random.Random(seed)
+        self._next_trace_id = 1
+        self._pid = os.getpid()
+
+    @contextmanager
+    def trace(self, name: str, **args: Any) -> Iterator[None]:
+        """Start a new trace, recorded with probability `sample_rate`."""
+        if self.sample_rate < 1 and self._random.random() >= self.sample_rate:
+            yield
+            return
+        trace_id = self._next_trace_id
+        self._next_trace_id += 1
+        self.traces_sampled += 1
+        token = _current_trace.set(TraceContext(self, trace_id))
+        try:
+            with span(name, **args):
+                yield
+        finally:
+            _current_trace.reset(token)
+
+    def record(self, trace_id: int, name: str, start_ns: int, end_ns: int, args: Dict[str, Any]) -> None:
+        if len(self.spans) >= self.max_spans:
+            self.dropped_spans += 1
+            return
+        self.spans.append((trace_id, name, start_ns, end_ns, args))
+
+    def export(self, path: str) -> None:
+        """Write the collected spans to `path` in Chrome trace-event JSON format."""
+        # Spans are recorded when they end. The viewer needs begin/end events in time order, with
+        # enclosing spans opened before and closed after the spans they contain on timestamp ties.
+        keyed = []
+        for trace_id, name, start_ns, end_ns, args in self.spans:
+            event = {"cat": "evolkit", "name": name, "id": hex(trace_id), "pid": self._pid, "tid": trace_id}
+            keyed.append(((start_ns, 1, -end_ns), {**event, "ph": "b", "ts": start_ns / 1000, "args": args}))
+            keyed.append(((end_ns, 0, -start_ns), {**event, "ph": "e", "ts": end_ns / 1000}))
+        keyed.sort(key=lambda item: item[0])
+        metadata = [{"name": "process_name", "ph": "M", "pid": self._pid, "args": {"name": "EvolKit"}}]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": metadata + [event for _, event in keyed], "displayTimeUnit": "ms",
+                       "otherData": {"sample_rate": self.sample_rate, "traces": self.traces_sampled, "dropped_spans": self.dropped_spans}}, f)
+
+@contextmanager
+def span(name: str, **args: Any) -> Iterator[None]:
+    """Record the time spent in this block as a child of the current span, if the trace is sampled."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter_ns()
+    try:
+        yield
+    except BaseException as e:
+        args["error"] = type(e).__name__
+        raise
+    finally:
+        trace.tracer.record(trace.trace_id, name, start, time.perf_counter_ns(), args)
@@ -1,4 +1,5 @@
 import re
+import asyncio
 
 def parse_sections(string_example):
     # Use regular expressions to find sections
@@ -33,7 +34,34 @@ def parse_sections(string_example):
     
 #     return steps_list
 
+FENCED_CONTENT_REGEX = re.compile(r'```(.*)```', re.DOTALL)
+STEP_MARKER_REGEX = re.compile(r"Step (\d+):")
+STEP_HEADER_REGEX = re.compile(r"\s*(?:#([^#]+)#)?\s*")
+
 def parse_steps(example_string):
+    # Same result as parse_steps_regex, which scans ahead for the next marker at every character of a
+    # step. Here each marker is found by one search and the instruction is the text up to the next one.
+    # Streamed responses are parsed incrementally by StepParser instead.
+    content_match = FENCED_CONTENT_REGEX.search(example_string)
+    if content_match:
+        example_string = content_match.group(1).strip()
+
+    steps_list = []
+    marker = STEP_MARKER_REGEX.search(example_string)
+    while marker:
+        header = STEP_HEADER_REGEX.match(example_string, marker.end())
+        next_marker = STEP_MARKER_REGEX.search(example_string, header.end())
+        end = next_marker.start() if next_marker else len(example_string)
+        steps_list.append({
+            "step_number": int(marker.group(1)),
+            "step_name": header.group(1).strip() if header.group(1) else "",
+            "step_instruction": example_string[header.end():end].strip(),
+        })
+        marker = next_marker
+    return steps_list
+
+def parse_steps_regex(example_string):
+    # Reference implementation of parse_steps, kept for tests and benchmarks/bench_step_parser.py
     # Extract content inside the first pair of triple backticks
     content_match = re.search(r'```(.*)```', example_string, re.DOTALL)
     if content_match:
@@ -55,4 +83,78 @@ def parse_steps(example_string):
         }
         steps_list.append(step_dict)
     
-    return steps_list
\ No newline at end of file
+    return steps_list
+
+async def iterate_in_thread(items):
+    # Yield the items of a blocking iterable (e.g. a streamed dataset, whose reads hit the network and
+    # fill a shuffle buffer), advancing it in a worker thread so that the event loop keeps running
+    iterator = iter(items)
+    done = object()
+    while True:
+        item = await asyncio.to_thread(next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+async def imap_unordered(func, items, max_in_flight):
+    # Keep up to `max_in_flight` calls of `func` running, start the next item as soon
+    # as any call finishes and yield `(index, result)` pairs in completion order.
+    # `items` may be an async iterable, e.g. `iterate_in_thread(...)`: its next item is read while the
+    # calls run and only started once it is ready, so a slow source never blocks the running calls.
+    if max_in_flight < 1:
+        raise ValueError(f"max_in_flight must be at least 1, got {max_in_flight}")
+
+    is_async = hasattr(items, "__aiter__")
+    iterator = items.__aiter__() if is_async else iter(items)
+    pending = {}
+    next_index = 0
+    fetch = None
+    exhausted = False
+
+    def start(item):
+        nonlocal next_index
+        pending[asyncio.ensure_future(func(item))] = next_index
+        next_index += 1
+
+    def refill():
+        nonlocal fetch, exhausted
+        while not exhausted:
+            if not is_async:
+                if len(pending) >= max_in_flight:
+                    return
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    exhausted = True
+                    return
+                start(item)
+                continue
+            # Read one item ahead of the free slots
+            if fetch is None:
+                fetch = asyncio.ensure_future(iterator.__anext__())
+            if len(pending) >= max_in_flight or not fetch.done():
+                return
+            ready, fetch = fetch, None
+            try:
+                item = ready.result()
+            except StopAsyncIteration:
+                exhausted = True
+                return
+            start(item)
+
+    try:
+        refill()
+        while pending or not exhausted:
+            waiting = set(pending)
+            if fetch is not None and len(pending) < max_in_flight:
+                waiting.add(fetch)
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            finished = [(pending.pop(task), task) for task in done if task is not fetch]
+            refill()
+            for index, task in finished:
+                yield index, task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        if fetch is not None:
+            fetch.cancel()
@@ -1,4 +1,5 @@
 import pytest
+from src.generators.base_generator import BaseGenerator
 from src.generators.openai import OpenAIGenerator
 from src.generators.openrouter import OpenRouterGenerator
 from src.analyzers.trajectory_analyzer import TrajectoryAnalyzer
@@ -9,4 +10,34 @@ def test_analyzer():
     analyzer = TrajectoryAnalyzer(generator=generator)
     result = analyzer.analyze("x + 2 = 12, what is x?", ["What is x in the case of 40x^2 - 5 = 40?"])
     assert result is not None
-    assert len(result) > 0
\ No newline at end of file
+    assert len(result) > 0
+
+class ScriptedGenerator(BaseGenerator):
+    def __init__(self, batch_response):
+        self.batch_response = batch_response
+        self.prompts = []
+
+    def generate(self, prompt, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        raise NotImplementedError
+
+    async def agenerate(self, prompt, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        self.prompts.append(prompt)
+        if "Case 1:" in prompt:
+            return self.batch_response
+        return "### PASSED"
+
+def test_batched_analyzer_single_call():
+    generator = ScriptedGenerator("Case 1: ### PASSED\nCase 2: ### FAILED - Reason: answers the question\nCase 3: ### PASSED")
+    analyzer = TrajectoryAnalyzer(generator=generator, batched=True)
+    result = analyzer.analyze("x + 2 = 12, what is x?", ["a", "b", "c"])
+
+    assert result == ["### PASSED", "### FAILED - Reason: answers the question", "### PASSED"]
+    assert len(generator.prompts) == 1
+
+def test_batched_analyzer_falls_back_for_unparsed_cases():
+    generator = ScriptedGenerator("Case 2: ### FAILED - Reason: unchanged")
+    analyzer = TrajectoryAnalyzer(generator=generator, batched=True)
+    result = analyzer.analyze("x + 2 = 12, what is x?", ["a", "b", "c"])
+
+    assert result == ["### PASSED", "### FAILED - Reason: unchanged", "### PASSED"]
+    assert len(generator.prompts) == 3
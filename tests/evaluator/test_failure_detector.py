@@ -0,0 +1,29 @@
+import pytest
+from src.evaluator.failure_detector_evaluator import FailureDetectorEvaluator
+
+responses = [
+    ["Here is the full solution: x = 10.", "Could you clarify what you mean?"],
+    ["Understood, shall I continue?", "Please provide more details."],
+    ["The answer is 42.", "Sorting works by comparing neighbours."],
+]
+
+def test_evaluate_batch_matches_single_patterns():
+    evaluator = FailureDetectorEvaluator()
+    failure_rates, flags = evaluator.evaluate_batch(responses)
+
+    assert flags == [[False, True], [True, True], [False, False]]
+    assert failure_rates == [0.5, 1.0, 0.0]
+    for method_responses, method_flags in zip(responses, flags):
+        for response, flag in zip(method_responses, method_flags):
+            single = any(pattern.search(response) for pattern in (evaluator.stagnant_pattern, evaluator.insufficient_pattern, evaluator.loss_pattern))
+            assert flag == single
+
+@pytest.mark.asyncio
+async def test_select_best_method_is_reusable():
+    evaluator = FailureDetectorEvaluator()
+    methods = ["method a", "method b", "method c"]
+
+    for _ in range(3):
+        best_method, failure_rate = await evaluator.select_best_method(methods, [[], [], []], responses)
+        assert best_method == "method c"
+        assert failure_rate == 0.0
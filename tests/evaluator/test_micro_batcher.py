@@ -0,0 +1,33 @@
+import asyncio
+import pytest
+from src.evaluator.micro_batcher import MicroBatcher
+
+@pytest.mark.asyncio
+async def test_concurrent_submits_share_batches():
+    batches = []
+
+    def score_batch(items):
+        batches.append(list(items))
+        return [len(item) for item in items]
+
+    batcher = MicroBatcher(score_batch, max_batch_size=4, max_wait_ms=20)
+    results = await asyncio.gather(*[batcher.submit("x" * i) for i in range(10)])
+
+    assert results == list(range(10))
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+
+@pytest.mark.asyncio
+async def test_batch_errors_reach_every_caller():
+    calls = []
+
+    def score_batch(items):
+        calls.append(items)
+        if len(calls) == 1:
+            raise RuntimeError("out of memory")
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(score_batch, max_batch_size=4, max_wait_ms=1)
+    results = await asyncio.gather(*[batcher.submit(i) for i in range(3)], return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert await batcher.submit(21) == 42
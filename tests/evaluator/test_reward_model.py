@@ -0,0 +1,85 @@
+import asyncio
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+from src.evaluator.reward_model_evaluator import RewardModelEvaluator
+
+class BatchedModel:
+    """Scores a chat with the length of its response and returns every batch as an array, like a tensor would."""
+
+    def __init__(self):
+        self.batches = []
+
+    def get_scores(self, tokenizer, chats):
+        self.batches.append(chats)
+        return np.array([len(chat[1]["content"]) for chat in chats], dtype=np.float32)
+
+class SingleChatModel:
+    """Only scores one chat at a time."""
+
+    def __init__(self):
+        self.chats = []
+
+    def get_score(self, tokenizer, chat):
+        self.chats.append(chat)
+        return np.float32(len(chat[1]["content"]))
+
+def scored_responses(batches):
+    return [chat[1]["content"] for batch in batches for chat in batch]
+
+@pytest.mark.asyncio
+async def test_scores_are_cached_by_content():
+    model = BatchedModel()
+    evaluator = RewardModelEvaluator(model, device="cpu", max_wait_ms=1)
+
+    assert await evaluator.evaluate(["q", "q"], ["ab", "abcd"]) == 3.0
+    assert await evaluator.evaluate(["q"], ["abcd"]) == 4.0
+    # The same texts split differently are a different pair
+    assert await evaluator.get_score("qa", "bcd") == 3.0
+
+    assert sorted(scored_responses(model.batches)) == ["ab", "abcd", "bcd"]
+
+@pytest.mark.asyncio
+async def test_cache_evicts_least_recently_used():
+    model = BatchedModel()
+    evaluator = RewardModelEvaluator(model, device="cpu", max_wait_ms=1, cache_size=2)
+
+    await evaluator.get_score("q", "a")
+    await evaluator.get_score("q", "bb")
+    await evaluator.get_score("q", "a")
+    await evaluator.get_score("q", "ccc")
+    await evaluator.get_score("q", "a")
+    await evaluator.get_score("q", "bb")
+
+    assert scored_responses(model.batches) == ["a", "bb", "ccc", "bb"]
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_for_one_pair_share_a_forward_pass():
+    model = BatchedModel()
+    evaluator = RewardModelEvaluator(model, device="cpu", max_wait_ms=20)
+
+    scores = await asyncio.gather(*[evaluator.get_score("q", "same") for _ in range(5)], evaluator.get_score("q", "other"))
+
+    assert scores == [4.0] * 5 + [5.0]
+    assert scored_responses(model.batches) == ["same", "other"]
+    assert evaluator._pending == {}
+
+@pytest.mark.asyncio
+async def test_models_without_get_scores_are_scored_one_chat_at_a_time():
+    model = SingleChatModel()
+    evaluator = RewardModelEvaluator(model, device="cpu", max_wait_ms=20)
+
+    scores = await evaluator.score_methods([["q", "q"], ["q"]], [["ab", "abcd"], ["a"]])
+
+    assert scores == [3.0, 1.0]
+    assert all(isinstance(score, float) for score in scores)
+    assert sorted(chat[1]["content"] for chat in model.chats) == ["a", "ab", "abcd"]
+
+def test_score_batch_converts_arrays_to_floats():
+    evaluator = RewardModelEvaluator(BatchedModel(), device="cpu")
+
+    scores = evaluator.score_batch([[{"role": "user", "content": "q"}, {"role": "assistant", "content": "abc"}]])
+
+    assert scores == [3.0] and type(scores[0]) is float
@@ -1,5 +1,5 @@
 import pytest
-from src.generators import OpenAIGenerator, OpenRouterGenerator
+from src.generators import OpenAIGenerator, OpenRouterGenerator, BaseGenerator
 from src.evolvers.recurrent_evolver import RecurrentEvolver
 from src.utils import parse_steps
 
@@ -16,4 +16,22 @@ def test_recurrent_evolver():
     assert len(parsed_results) == 2
     assert parsed_results[0][-1]['step_name'] == "Finally Rewritten Instruction", f"Unexpected final step name for result 1: {parsed_results[0][-1]['step_name']}"
     assert parsed_results[1][-1]['step_name'] == "Finally Rewritten Instruction", f"Unexpected final step name for result 2: {parsed_results[1][-1]['step_name']}"
-    
\ No newline at end of file
+    
+class MultiSampleGenerator(BaseGenerator):
+    def __init__(self):
+        self.requests = []
+
+    def generate(self, prompt, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        raise NotImplementedError
+
+    async def agenerate_n(self, prompt, n=1, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        self.requests.append(n)
+        return [f"sample {i}" for i in range(n)]
+
+def test_recurrent_evolver_requests_samples_together():
+    generator = MultiSampleGenerator()
+    evolver = RecurrentEvolver(generator=generator)
+    results = evolver.evolve(instruction="What is 2 + 2?", n=5)
+
+    assert results == [f"sample {i}" for i in range(5)]
+    assert generator.requests == [5]
@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+from benchmarks.mock_server import MockChatServer
+from src.generators import AdaptiveConcurrencyGenerator, BaseGenerator, ResilientGenerator, create_generator
+
+class RateLimited(Exception):
+    status_code = 429
+
+class Backend(BaseGenerator):
+    """Answers after `delay` seconds; over `capacity` requests in flight it rate-limits, and past `saturation` it slows down."""
+
+    def __init__(self, delay=0.01, capacity=None, saturation=None):
+        self.delay = delay
+        self.capacity = capacity
+        self.saturation = saturation
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.rate_limited = 0
+
+    def generate(self, prompt, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        raise NotImplementedError
+
+    async def agenerate(self, prompt, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            if self.capacity is not None and self.in_flight > self.capacity:
+                self.rate_limited += 1
+                raise RateLimited("too many requests")
+            load = self.in_flight / self.saturation if self.saturation else 1
+            await asyncio.sleep(self.delay * max(1, load))
+            return prompt
+        finally:
+            self.in_flight -= 1
+
+async def run_workers(generator, workers, requests):
+    async def worker():
+        for _ in range(requests):
+            await generator.agenerate("prompt")
+    await asyncio.gather(*[worker() for _ in range(workers)])
+
+@pytest.mark.asyncio
+async def test_limit_grows_while_latency_is_flat():
+    backend = Backend(delay=0.02)
+    limiter = AdaptiveConcurrencyGenerator(backend, initial_limit=2, max_limit=32)
+
+    await run_workers(limiter, workers=64, requests=10)
+
+    assert limiter.limit == 32 and backend.peak_in_flight == 32
+    assert limiter.backoffs == {"overload": 0, "latency": 0}
+    assert limiter.in_flight == 0 and limiter.waiting == 0
+
+@pytest.mark.asyncio
+async def test_rate_limits_back_off_to_the_backend_capacity():
+    backend = Backend(capacity=12)
+    limiter = AdaptiveConcurrencyGenerator(backend, initial_limit=4)
+    resilient = ResilientGenerator(limiter, max_retries=20, base_delay=0.001)
+
+    await run_workers(resilient, workers=40, requests=25)
+
+    assert limiter.backoffs["overload"] > 0
+    # Hovers just around the capacity instead of growing towards max_limit
+    assert 6 <= limiter.limit <= 14
+    # Once the limit has settled, most requests go through on the first attempt
+    assert backend.rate_limited < 0.2 * 1000
+
+@pytest.mark.asyncio
+async def test_latency_spikes_back_off():
+    backend = Backend(delay=0.005, saturation=8)
+    limiter = AdaptiveConcurrencyGenerator(backend, initial_limit=4, latency_tolerance=2.0)
+
+    await run_workers(limiter, workers=64, requests=15)
+
+    assert limiter.backoffs["latency"] > 0
+    assert limiter.backoffs["overload"] == 0
+    # Latency doubles at 16 in flight; the limit saw-tooths around that instead of reaching max_limit
+    assert limiter.limit < 40 and limiter.peak_limit < 64
+
+@pytest.mark.asyncio
+async def test_cancelled_requests_release_their_slots():
+    backend = Backend(delay=10)
+    limiter = AdaptiveConcurrencyGenerator(backend, initial_limit=2)
+
+    tasks = [asyncio.ensure_future(limiter.agenerate("prompt")) for _ in range(5)]
+    await asyncio.sleep(0.01)
+    assert limiter.in_flight == 2 and limiter.waiting == 3
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert limiter.in_flight == 0 and limiter.waiting == 0
+    assert limiter.backoffs == {"overload": 0, "latency": 0}
+    backend.delay = 0
+    assert await limiter.agenerate("prompt") == "prompt"
+
+@pytest.mark.asyncio
+async def test_timeouts_back_off_once_per_round_trip():
+    backend = Backend(delay=10)
+    limiter = AdaptiveConcurrencyGenerator(backend, initial_limit=8, timeout=0.01)
+
+    results = await asyncio.gather(*[limiter.agenerate("prompt") for _ in range(8)], return_exceptions=True)
+
+    assert all(isinstance(result, asyncio.TimeoutError) for result in results)
+    # All eight were sent under the same limit, so only the first timeout counts
+    assert limiter.backoffs["overload"] == 1 and limiter.limit == pytest.approx(8 * 0.7)
+
+@pytest.mark.asyncio
+async def test_mock_server_capacity():
+    # The limiter sees the 429s of a real client against a server with a fixed number of slots
+    with MockChatServer(latency="const:0.01", capacity=6).run_in_thread() as server:
+        backend = create_generator("vllm", "mock", base_url=server.base_url, max_retries=0)
+        limiter = AdaptiveConcurrencyGenerator(backend, initial_limit=4)
+        resilient = ResilientGenerator(limiter, max_retries=20, base_delay=0.001)
+
+        await run_workers(resilient, workers=24, requests=10)
+
+    assert limiter.backoffs["overload"] > 0
+    assert limiter.limit < 20
+    # Without the limiter, most of the 24 concurrent requests would be rejected; the overshoot of slow
+    # start accounts for most of the 429s of this short run
+    assert server.errors < 0.25 * server.requests
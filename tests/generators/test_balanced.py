@@ -0,0 +1,93 @@
+import asyncio
+import pytest
+from src.generators import BaseGenerator, LoadBalancedGenerator, ResilientGenerator, route_by
+
+class Replica(BaseGenerator):
+    """Answers after `delay` seconds, or raises `error` when it is set."""
+
+    def __init__(self, name, delay=0.01, error=None):
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def generate(self, prompt, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        raise NotImplementedError
+
+    async def agenerate(self, prompt, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.name
+
+@pytest.mark.asyncio
+async def test_least_outstanding_requests_favour_fast_replicas():
+    fast, slow = Replica("fast", delay=0.005), Replica("slow", delay=0.05)
+    balancer = LoadBalancedGenerator([fast, slow], seed=0)
+
+    async def worker():
+        for _ in range(10):
+            await balancer.agenerate("prompt")
+
+    await asyncio.gather(*[worker() for _ in range(4)])
+
+    assert fast.calls + slow.calls == 40
+    assert fast.calls > 3 * slow.calls
+    assert all(endpoint["outstanding"] == 0 for endpoint in balancer.stats())
+
+@pytest.mark.asyncio
+async def test_failing_replica_is_ejected():
+    healthy, broken = Replica("healthy"), Replica("broken", error=ConnectionError("refused"))
+    balancer = LoadBalancedGenerator([healthy, broken], eject_after=2, eject_seconds=60, seed=0)
+    resilient = ResilientGenerator(balancer, max_retries=3, base_delay=0.001)
+
+    answers = [await resilient.agenerate("prompt") for _ in range(20)]
+
+    assert answers == ["healthy"] * 20
+    assert broken.calls == 2
+    stats = {endpoint["endpoint"]: endpoint for endpoint in balancer.stats()}
+    assert stats["endpoint-1"]["ejected"] and stats["endpoint-1"]["ejections"] == 1
+
+@pytest.mark.asyncio
+async def test_timeouts_eject_and_request_errors_do_not():
+    hanging, rejecting = Replica("hanging", delay=10), Replica("rejecting", delay=0, error=ValueError("bad request"))
+    balancer = LoadBalancedGenerator([hanging, rejecting], eject_after=1, timeout=0.01, seed=0)
+
+    for _ in range(4):
+        with pytest.raises((asyncio.TimeoutError, ValueError)):
+            await balancer.agenerate("prompt")
+
+    hanging_stats, rejecting_stats = balancer.stats()
+    assert hanging_stats["ejections"] == 1 and hanging_stats["failures"] == 1
+    assert rejecting_stats["ejections"] == 0 and rejecting_stats["failures"] == 0
+    # With every replica ejected, all of them are used again
+    hanging.delay, rejecting.error = 0, None
+    balancer.endpoints[1].ejected_until = balancer.endpoints[0].ejected_until
+    assert await balancer.agenerate("prompt") in ("hanging", "rejecting")
+
+@pytest.mark.asyncio
+async def test_pinned_instructions_stay_on_one_replica():
+    replicas = [Replica(f"replica-{i}") for i in range(4)]
+    balancer = LoadBalancedGenerator(replicas, pin=True, pin_min_load=8, seed=0)
+
+    async def pipeline(instruction):
+        with route_by(instruction):
+            # Concurrent calls of one instruction, like the optimizer's dev-set calls
+            return set(await asyncio.gather(*[balancer.agenerate("step") for _ in range(5)]))
+
+    used = [await pipeline(f"instruction {i}") for i in range(40)]
+
+    assert all(len(replicas_used) == 1 for replicas_used in used)
+    # Different instructions are spread over the fleet
+    assert len(set().union(*used)) == 4
+
+    # Under load, no replica takes more than its bounded share of the requests in flight
+    await asyncio.gather(*[pipeline(f"instruction {i % 3}") for i in range(12)])
+    assert max(endpoint["peak_outstanding"] for endpoint in balancer.stats()) <= 1.25 * 60 / 4 + 1
+
+    # A pinned replica that is ejected hands its instructions to the next one in their order
+    with route_by("instruction 0"):
+        pinned = await balancer.agenerate("step")
+        balancer.endpoints[[replica.name for replica in replicas].index(pinned)].ejected_until = float("inf")
+        assert await balancer.agenerate("step") != pinned
@@ -0,0 +1,93 @@
+import asyncio
+import pytest
+from src.generators.base_generator import BaseGenerator
+from src.generators.cached import CachedGenerator
+
+class CountingGenerator(BaseGenerator):
+    def __init__(self):
+        self.model = "counting"
+        self.calls = 0
+
+    def generate(self, prompt, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        self.calls += 1
+        return f"answer to {prompt}"
+
+    async def agenerate(self, prompt, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return f"answer to {prompt}"
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_requests_are_coalesced(tmp_path):
+    upstream = CountingGenerator()
+    generator = CachedGenerator(upstream, cache_dir=str(tmp_path))
+
+    results = await asyncio.gather(*[generator.agenerate("same prompt") for _ in range(5)])
+
+    assert results == ["answer to same prompt"] * 5
+    assert upstream.calls == 1
+
+@pytest.mark.asyncio
+async def test_cache_persists_across_instances(tmp_path):
+    upstream = CountingGenerator()
+    await CachedGenerator(upstream, cache_dir=str(tmp_path)).agenerate("prompt", temperature=0.2)
+
+    generator = CachedGenerator(upstream, cache_dir=str(tmp_path))
+    assert await generator.agenerate("prompt", temperature=0.2) == "answer to prompt"
+    assert upstream.calls == 1
+
+    await generator.agenerate("prompt", temperature=0.7)
+    assert upstream.calls == 2
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    upstream = CountingGenerator()
+    generator = CachedGenerator(upstream, cache_dir=str(tmp_path), max_bytes=60)
+
+    for prompt in ["first", "second", "third", "fourth"]:
+        generator.generate(prompt)
+
+    assert generator.get(generator.cache_key("first", "You are a helpful AI assistant.", 0.5)) is None
+    assert generator.get(generator.cache_key("fourth", "You are a helpful AI assistant.", 0.5)) == "answer to fourth"
+
+@pytest.mark.asyncio
+async def test_sample_sets_are_cached_together(tmp_path):
+    upstream = CountingGenerator()
+    generator = CachedGenerator(upstream, cache_dir=str(tmp_path))
+
+    first = await generator.agenerate_n("prompt", n=3)
+    second = await generator.agenerate_n("prompt", n=3)
+
+    assert first == second == ["answer to prompt"] * 3
+    assert upstream.calls == 3
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_cancel_waiting_callers(tmp_path):
+    upstream = CountingGenerator()
+    generator = CachedGenerator(upstream, cache_dir=str(tmp_path))
+
+    leader = asyncio.ensure_future(generator.agenerate("prompt"))
+    await asyncio.sleep(0.01)
+    follower = asyncio.ensure_future(generator.agenerate("prompt"))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    assert await follower == "answer to prompt"
+    assert leader.cancelled()
+    # The follower made the request again instead of failing with the leader
+    assert upstream.calls == 2
+
+def test_hits_write_access_times_in_batches(tmp_path):
+    upstream = CountingGenerator()
+    generator = CachedGenerator(upstream, cache_dir=str(tmp_path), max_bytes=60)
+    generator.generate("first")
+    generator.generate("second")
+    # Reading "first" makes "second" the least recently used entry, once the access time is written
+    generator.generate("first")
+    assert generator._accessed
+
+    generator.generate("third")
+    generator.generate("fourth")
+
+    assert generator.get(generator.cache_key("first", "You are a helpful AI assistant.", 0.5)) == "answer to first"
+    assert generator.get(generator.cache_key("second", "You are a helpful AI assistant.", 0.5)) is None
+    assert upstream.calls == 4
@@ -0,0 +1,44 @@
+import asyncio
+import pytest
+
+pytest.importorskip("openai")
+
+from benchmarks.mock_server import MockChatServer
+from src.generators import create_generator, shared_http_client
+
+@pytest.mark.asyncio
+async def test_generators_share_one_pool_per_endpoint():
+    first = create_generator("vllm", "mock", base_url="http://127.0.0.1:1/v1")
+    second = create_generator("vllm", "other-model", base_url="http://127.0.0.1:1/v1/")
+    other_endpoint = create_generator("vllm", "mock", base_url="http://127.0.0.1:2/v1")
+
+    assert first.aclient._client is second.aclient._client
+    assert first.aclient._client is not other_endpoint.aclient._client
+    assert shared_http_client("http://127.0.0.1:1/v1", max_connections=8) is not first.aclient._client
+
+@pytest.mark.asyncio
+async def test_openrouter_honors_base_url():
+    default = create_generator("openrouter", "mock", api_key="test")
+    proxied = create_generator("openrouter", "mock", base_url="http://127.0.0.1:3/v1", api_key="test")
+
+    assert str(default.aclient.base_url).startswith("https://openrouter.ai/api/v1")
+    assert str(proxied.aclient.base_url).startswith("http://127.0.0.1:3/v1")
+    assert proxied.aclient._client is shared_http_client("http://127.0.0.1:3/v1")
+
+def test_pools_are_not_shared_across_event_loops():
+    async def pool():
+        return shared_http_client("http://127.0.0.1:1/v1")
+
+    assert asyncio.run(pool()) is not asyncio.run(pool())
+
+@pytest.mark.asyncio
+async def test_openai_generator_is_async():
+    async with MockChatServer(latency="const:0.001") as server:
+        generator = create_generator("openai", "mock", base_url=server.base_url, api_key="test")
+
+        answers = await asyncio.gather(*[generator.agenerate("Say hello") for _ in range(5)])
+        samples = await generator.agenerate_n("Say hello", n=3)
+
+    assert all(isinstance(answer, str) and answer for answer in answers)
+    assert len(samples) == 3
+    assert server.requests == 6
@@ -0,0 +1,62 @@
+import pytest
+
+pytest.importorskip("openai")
+
+from benchmarks.mock_server import MockChatServer
+from src.evolvers.recurrent_evolver import INITIAL_EVOLVE_METHOD
+from src.generators import InstrumentedGenerator, create_generator, role_limits
+from src.generators.limits import parse_role_values
+from src.metrics import MetricsRegistry, role
+from src.utils import parse_steps
+
+def test_parse_role_values():
+    assert parse_role_values(["analyzer=256", "evolver=1024"], int) == {"analyzer": 256, "evolver": 1024}
+    assert parse_role_values(["analyzer=\\n\\n", "analyzer=###"], multiple=True) == {"analyzer": ["\n\n", "###"]}
+    assert parse_role_values(["evolver=Fin é 完\\n"]) == {"evolver": "Fin é 完\n"}
+    with pytest.raises(ValueError):
+        parse_role_values(["evolve=10"], int)
+    with pytest.raises(ValueError):
+        parse_role_values(["analyzer"], int)
+
+@pytest.mark.asyncio
+async def test_streamed_rewrites_stop_at_closing_fence():
+    prompt = INITIAL_EVOLVE_METHOD.replace("{{instruction}}", "Explain gravity")
+    async with MockChatServer(latency="const:0.001", trailing_words=50) as server:
+        full = create_generator("vllm", "mock", base_url=server.base_url)
+        backend = create_generator("vllm", "mock", base_url=server.base_url, limits=role_limits(stop_after_fence=True), stream=True)
+        metrics = MetricsRegistry()
+        streamed = InstrumentedGenerator(backend, metrics)
+        with role("evolver"):
+            complete = await full.agenerate(prompt)
+            samples = await streamed.agenerate_n(prompt, n=3)
+            single = await streamed.agenerate(prompt)
+        with role("dev_answer"):
+            # Roles without a closing fence are not cut
+            answer = await streamed.agenerate("Say hello")
+
+    assert "This rewrite makes the instruction more complex" in complete
+    assert len(samples) == 3
+    for text in samples + [single]:
+        assert text.endswith("```")
+        assert parse_steps(text)[-1]["step_name"] == "Finally Rewritten Instruction"
+    assert backend.early_stops == 2
+    assert len(answer.split()) == server.answer_words
+    # Streams closed early report no usage; their tokens are only estimated, and counted apart
+    evolver, dev_answer = metrics.snapshot()["roles"]["evolver"], metrics.snapshot()["roles"]["dev_answer"]
+    assert evolver["prompt_tokens"] == evolver["completion_tokens"] == 0 and evolver["estimated_completion_tokens"] > 0
+    assert dev_answer["completion_tokens"] > 0 and dev_answer["estimated_completion_tokens"] == 0
+
+@pytest.mark.asyncio
+async def test_max_tokens_and_stop_are_sent_per_role():
+    limits = role_limits(max_tokens={"dev_answer": 5}, stop={"analyzer": ["PASSED", "FAILED"]})
+    async with MockChatServer(latency="const:0.001") as server:
+        generator = create_generator("vllm", "mock", base_url=server.base_url, limits=limits)
+        with role("dev_answer"):
+            capped = await generator.agenerate("Say hello")
+        with role("analyzer"):
+            verdict = await generator.agenerate("Evolution Trajectory: x")
+        uncapped = await generator.agenerate("Say hello")
+
+    assert len(capped.split()) == 5
+    assert verdict.strip() == "###"
+    assert len(uncapped.split()) == server.answer_words
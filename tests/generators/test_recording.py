@@ -0,0 +1,33 @@
+import asyncio
+import pytest
+from src.checkpoint import read_jsonl
+from src.generators.base_generator import BaseGenerator
+from src.generators.recording import RecordingGenerator
+
+class EchoGenerator(BaseGenerator):
+    def generate(self, prompt, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        return prompt
+
+    async def agenerate(self, prompt, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        await asyncio.sleep(0.001)
+        return prompt
+
+@pytest.mark.asyncio
+async def test_prompts_are_appended_to_the_log(tmp_path):
+    path = str(tmp_path / "prompts.jsonl")
+    async with RecordingGenerator(EchoGenerator(), path) as recorder:
+        await asyncio.gather(*[recorder.agenerate(f"prompt {i}") for i in range(50)])
+        await recorder.agenerate_n("sampled", n=3, system_prompt="system")
+    # A later run appends to the same log
+    async with RecordingGenerator(EchoGenerator(), path) as recorder:
+        await recorder.agenerate("again")
+
+    records = list(read_jsonl(path))
+    assert [record["prompt"] for record in records] == [f"prompt {i}" for i in range(50)] + ["sampled", "again"]
+    assert records[50] == {"system_prompt": "system", "prompt": "sampled", "n": 3}
+
+@pytest.mark.asyncio
+async def test_requests_need_an_open_log(tmp_path):
+    recorder = RecordingGenerator(EchoGenerator(), str(tmp_path / "prompts.jsonl"))
+    with pytest.raises(RuntimeError):
+        await recorder.agenerate("prompt")
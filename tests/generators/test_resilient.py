@@ -0,0 +1,71 @@
+import asyncio
+import time
+import pytest
+from types import SimpleNamespace
+from src.generators import BaseGenerator, ResilientGenerator
+from src.generators.resilient import is_retryable, retry_after
+
+class StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+class ScriptedGenerator(BaseGenerator):
+    """Raises the scripted errors in order, then answers; `delays` sets the latency of each call."""
+
+    def __init__(self, errors=(), delays=()):
+        self.errors = list(errors)
+        self.delays = list(delays)
+        self.calls = 0
+
+    def generate(self, prompt, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        raise NotImplementedError
+
+    async def agenerate(self, prompt, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        call = self.calls
+        self.calls += 1
+        await asyncio.sleep(self.delays[call] if call < len(self.delays) else 0)
+        if self.errors:
+            raise self.errors.pop(0)
+        return f"answer {call}"
+
+def test_error_classification():
+    assert all(is_retryable(StatusError(status)) for status in (429, 500, 503, 408))
+    assert not any(is_retryable(StatusError(status)) for status in (400, 401, 404, 422))
+    assert is_retryable(asyncio.TimeoutError()) and not is_retryable(ValueError())
+    assert retry_after(StatusError(429, {"retry-after": "2"})) == 2.0
+    assert retry_after(StatusError(429, {"retry-after-ms": "150"})) == 0.15
+
+@pytest.mark.asyncio
+async def test_retries_transient_errors_only():
+    backend = ScriptedGenerator(errors=[StatusError(503), StatusError(429, {"retry-after": "0.05"})])
+    generator = ResilientGenerator(backend, max_retries=3, base_delay=0.001)
+
+    start = time.monotonic()
+    assert await generator.agenerate("prompt") == "answer 2"
+    assert time.monotonic() - start >= 0.05
+    assert generator.retries == 2
+
+    backend = ScriptedGenerator(errors=[StatusError(400)])
+    with pytest.raises(StatusError):
+        await ResilientGenerator(backend, base_delay=0.001).agenerate("prompt")
+    assert backend.calls == 1
+
+    backend = ScriptedGenerator(errors=[StatusError(500)] * 3)
+    with pytest.raises(StatusError):
+        await ResilientGenerator(backend, max_retries=2, base_delay=0.001).agenerate("prompt")
+    assert backend.calls == 3
+
+@pytest.mark.asyncio
+async def test_hedges_slow_requests():
+    # Five fast calls establish the latency distribution; the sixth stalls and is hedged
+    backend = ScriptedGenerator(delays=[0.01] * 5 + [5.0])
+    generator = ResilientGenerator(backend, hedge_percentile=90, hedge_min_samples=5)
+    for _ in range(5):
+        await generator.agenerate("prompt")
+
+    start = time.monotonic()
+    assert await generator.agenerate("prompt") == "answer 6"
+    assert time.monotonic() - start < 1.0
+    assert (generator.hedges, generator.hedge_wins) == (1, 1)
@@ -1,8 +1,10 @@
+import re
 import pytest
-from src.generators import OpenRouterGenerator
+from src.generators import OpenRouterGenerator, BaseGenerator
 from src.optimizers.evol_optimizer import EvolOptimizer
 from src.analyzers.trajectory_analyzer import TrajectoryAnalyzer
 from src.evolvers.recurrent_evolver import RecurrentEvolver, INITIAL_EVOLVE_METHOD
+from src.evaluator.base_evaluator import BaseEvaluator
 from src.evaluator.failure_detector_evaluator import FailureDetectorEvaluator
 from src.utils import parse_steps
 
@@ -24,4 +26,102 @@ async def test_wizard_optimizer():
 
     feedbacks = analyzer.analyze(INITIAL_EVOLVE_METHOD, evolved_instructions)
     
-    optimized_method, methods = await optimizer.optimize(INITIAL_EVOLVE_METHOD.format(instruction=init_instruction), feedback=feedbacks, evolver=evolver, development_set=dev_set)
\ No newline at end of file
+    optimized_method, methods = await optimizer.optimize(INITIAL_EVOLVE_METHOD.format(instruction=init_instruction), feedback=feedbacks, evolver=evolver, development_set=dev_set)
+
+class ScriptedGenerator(BaseGenerator):
+    def __init__(self):
+        self.calls = 0
+
+    def generate(self, prompt, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        raise NotImplementedError
+
+    async def agenerate(self, prompt, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        self.calls += 1
+        if "#Instruction#:" in prompt:
+            return "```Optimized Instruction\nStep 1:\n#Finally Rewritten Instruction#\nA harder instruction\n```"
+        return "An answer."
+
+    async def agenerate_n(self, prompt, n=1, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        self.calls += 1
+        variant = "A" if "### PASSED" in prompt.rsplit("Feedback:", 1)[1] else "B"
+        return [f"```Optimized Method\nStep 1:\n#Plan#\nPlan {variant}\n\nStep 2:\n#Finally Rewritten Instruction#\nRewrite\n```"] * n
+
+@pytest.mark.asyncio
+async def test_optimizer_dedups_candidates_and_reuses_dev_set_results():
+    generator = ScriptedGenerator()
+    evolver = RecurrentEvolver(generator)
+    optimizer = EvolOptimizer(generator, FailureDetectorEvaluator())
+    feedbacks = ["### PASSED"] * 3 + ["### FAILED - Reason: unchanged"] * 2
+
+    _, methods = await optimizer.optimize("current method", feedback=feedbacks, evolver=evolver, development_set=dev_set)
+    first_calls = generator.calls
+    await optimizer.optimize("another method", feedback=feedbacks, evolver=evolver, development_set=dev_set)
+
+    assert len(methods) == 5
+    # 2 sampling requests + 2 distinct methods x 2 dev items x (rewrite + answer)
+    assert first_calls == 2 + 2 * len(dev_set) * 2
+    assert generator.calls - first_calls == 2
+
+class NumberedGenerator(BaseGenerator):
+    # Candidate k rewrites every dev instruction to "Candidate k", which is answered with "Answer k"
+    def generate(self, prompt, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        raise NotImplementedError
+
+    async def agenerate(self, prompt, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        if "#Instruction#:" in prompt:
+            candidate = re.search(r"Plan (\d+)", prompt).group(1)
+            return f"```Optimized Instruction\nStep 1:\n#Finally Rewritten Instruction#\nCandidate {candidate}\n```"
+        candidate = re.search(r"Candidate (\d+)", prompt).group(1)
+        return f"Answer {candidate}"
+
+    async def agenerate_n(self, prompt, n=1, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        return [f"```Optimized Method\nStep 1:\n#Plan#\nPlan {k}\n\nStep 2:\n#Finally Rewritten Instruction#\nRewrite\n```" for k in range(n)]
+
+class CandidateScorer(BaseEvaluator):
+    # Scores candidate k with k and records the candidates and dev subset size of every round
+    def __init__(self, higher_is_better=True):
+        self.higher_is_better = higher_is_better
+        self.rounds = []
+
+    def evaluate(self, instructions, responses):
+        return sum(int(response.split()[-1]) for response in responses) / len(responses)
+
+    async def select_best_method(self, methods, instructions, responses):
+        scores = await self.score_methods(instructions, responses)
+        best = max(range(len(methods)), key=scores.__getitem__)
+        return methods[best], scores[best]
+
+    async def score_methods(self, instructions, responses):
+        candidates = [int(method_responses[0].split()[-1]) for method_responses in responses]
+        self.rounds.append((candidates, {len(method_responses) for method_responses in responses}))
+        return await super().score_methods(instructions, responses)
+
+class AsyncLengthEvaluator(BaseEvaluator):
+    # Implements only the methods evaluators had before score_methods existed
+    async def evaluate(self, instructions, responses):
+        return sum(len(response) for response in responses) / len(responses)
+
+    async def select_best_method(self, methods, instructions, responses):
+        raise NotImplementedError
+
+@pytest.mark.asyncio
+async def test_default_score_methods_uses_evaluate():
+    evaluator = AsyncLengthEvaluator()
+
+    assert await evaluator.score_methods([["q"], ["q", "q"]], [["abc"], ["a", "abc"]]) == [3.0, 2.0]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("higher_is_better, survivors", [(True, [[4, 5, 6, 7], [6, 7]]), (False, [[0, 1, 2, 3], [0, 1]])])
+async def test_successive_halving_keeps_the_best_fraction_on_growing_subsets(higher_is_better, survivors):
+    generator = NumberedGenerator()
+    evaluator = CandidateScorer(higher_is_better=higher_is_better)
+    optimizer = EvolOptimizer(generator, evaluator, successive_halving=True, halving_keep_fraction=0.5, halving_min_dev_size=2)
+    dev_instructions = [f"Dev instruction {i}" for i in range(8)]
+
+    best, methods = await optimizer.optimize("current method", feedback=["### PASSED"] * 8, evolver=RecurrentEvolver(generator), development_set=dev_instructions)
+
+    assert len(methods) == 8
+    # 8 candidates on 2 dev instructions, the better half on 4, the better half of those on all 8
+    assert [candidates for candidates, _ in evaluator.rounds] == [list(range(8))] + survivors
+    assert [sizes for _, sizes in evaluator.rounds] == [{2}, {4}, {8}]
+    assert f"Plan {survivors[-1][-1 if higher_is_better else 0]}" in best
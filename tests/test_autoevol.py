@@ -0,0 +1,77 @@
+import asyncio
+import time
+import pytest
+from src.autoevol import AutoEvol
+from src.utils import iterate_in_thread
+
+class SlowAutoEvol(AutoEvol):
+    def __init__(self, delays):
+        super().__init__({})
+        self.delays = delays
+        self.in_flight = 0
+        self.max_seen = 0
+
+    async def process_instruction(self, instruction, num_methods, evolve_epoch=2):
+        self.in_flight += 1
+        self.max_seen = max(self.max_seen, self.in_flight)
+        start = time.monotonic()
+        await asyncio.sleep(self.delays[instruction])
+        self.in_flight -= 1
+        return {"original_instruction": instruction, "elapsed": time.monotonic() - start}
+
+@pytest.mark.asyncio
+async def test_stream_does_not_wait_for_stragglers():
+    delays = {"slow": 0.3, **{f"fast-{i}": 0.01 for i in range(10)}}
+    auto_evol = SlowAutoEvol(delays)
+
+    order = [result["original_instruction"] async for result in auto_evol.stream(list(delays), max_in_flight=3)]
+
+    assert sorted(order) == sorted(delays)
+    assert order[-1] == "slow"
+    assert auto_evol.max_seen == 3
+
+@pytest.mark.asyncio
+async def test_slow_source_does_not_delay_calls_in_flight():
+    delays = {"a": 0.01, "b": 0.1, "c": 0.01}
+
+    def slow_source():
+        yield "a"
+        yield "b"
+        # e.g. a remote shard read or filling a shuffle buffer
+        time.sleep(0.5)
+        yield "c"
+
+    auto_evol = SlowAutoEvol(delays)
+    results = {result["original_instruction"]: result async for result in auto_evol.stream(iterate_in_thread(slow_source()), max_in_flight=2)}
+
+    assert sorted(results) == ["a", "b", "c"]
+    # Read on the event loop, the blocked source would hold "b" back for the whole 0.5 s
+    assert results["b"]["elapsed"] < 0.3
+
+@pytest.mark.asyncio
+async def test_run_keeps_input_order():
+    delays = {"a": 0.05, "b": 0.01, "c": 0.03}
+    auto_evol = SlowAutoEvol(delays)
+
+    results = await auto_evol.run(list(delays), batch_size=2, max_concurrent_batches=1)
+
+    assert [result["original_instruction"] for result in results] == ["a", "b", "c"]
+
+class FailingAutoEvol(AutoEvol):
+    def __init__(self):
+        super().__init__({})
+
+    async def process_instruction(self, instruction, num_methods, evolve_epoch=2):
+        if instruction == "bad":
+            raise RuntimeError("backend down")
+        return {"original_instruction": instruction}
+
+@pytest.mark.asyncio
+async def test_failed_instructions_are_skipped():
+    auto_evol = FailingAutoEvol()
+
+    streamed = [result["original_instruction"] async for result in auto_evol.stream(["a", "bad", "b"], max_in_flight=2)]
+    results = await auto_evol.run(["a", "bad", "b"], batch_size=2, max_concurrent_batches=1)
+
+    assert sorted(streamed) == ["a", "b"]
+    assert [result and result["original_instruction"] for result in results] == ["a", None, "b"]
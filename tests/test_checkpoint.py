@@ -0,0 +1,36 @@
+import json
+import pytest
+from src.checkpoint import JsonlWriter, load_completed, read_jsonl
+
+@pytest.mark.asyncio
+async def test_writer_appends_records(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    async with JsonlWriter(path) as writer:
+        for i in range(5):
+            writer.write({"original_instruction": f"instruction {i}"})
+    async with JsonlWriter(path) as writer:
+        writer.write({"original_instruction": "instruction 5"})
+
+    assert [record["original_instruction"] for record in read_jsonl(path)] == [f"instruction {i}" for i in range(6)]
+
+@pytest.mark.asyncio
+async def test_resume_after_truncated_write(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text(json.dumps({"original_instruction": "done"}) + "\n" + '{"original_instruction": "half wri')
+
+    assert load_completed(str(path)) == {"done"}
+
+    async with JsonlWriter(str(path)) as writer:
+        writer.write({"original_instruction": "next"})
+
+    assert [record["original_instruction"] for record in read_jsonl(str(path))] == ["done", "next"]
+
+@pytest.mark.asyncio
+async def test_flush_waits_for_queued_records(tmp_path):
+    path = str(tmp_path / "methods.jsonl")
+    async with JsonlWriter(path) as writer:
+        writer.write_many({"method_id": i} for i in range(3))
+        await writer.flush()
+        assert [record["method_id"] for record in read_jsonl(path)] == [0, 1, 2]
+        # Nothing queued: returns at once
+        await writer.flush()
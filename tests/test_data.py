@@ -0,0 +1,28 @@
+import json
+import operator
+import pytest
+from src.data import first_human_turn, load_instructions
+
+def test_first_human_turn():
+    assert first_human_turn([{"from": "human", "value": "hi"}, {"from": "gpt", "value": "hello"}]) == "hi"
+    assert first_human_turn([{"from": "gpt", "value": "hello"}, {"from": "human", "value": "hi"}]) == "hi"
+    assert first_human_turn([{"from": "system", "value": "be nice"}, {"from": "human", "value": "hi"}]) is None
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_load_local_jsonl(tmp_path, streaming):
+    pytest.importorskip("datasets")
+    path = tmp_path / "data.jsonl"
+    with open(path, "w") as f:
+        for i in range(30):
+            conversations = [{"from": "human", "value": f"question {i}"}, {"from": "gpt", "value": "answer"}]
+            if i % 10 == 0:
+                conversations.insert(0, {"from": "system", "value": "system prompt"})
+            f.write(json.dumps({"conversations": conversations, "id": i}) + "\n")
+
+    train_set, dev_set = load_instructions(str(path), dev_set_size=4, streaming=streaming)
+    train_instructions = list(train_set)
+
+    assert len(dev_set) == 4
+    assert len(train_instructions) == 23
+    assert set(dev_set).isdisjoint(train_instructions)
+    assert operator.length_hint(train_set, -1) == (-1 if streaming else 23)
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from src.dedup import MinHasher, NearDuplicateIndex, deduplicate, lsh_params
+
+WORDS = [f"word{i}" for i in range(2000)]
+
+def random_texts(count, length=40, seed=0):
+    rng = np.random.default_rng(seed)
+    return [" ".join(rng.choice(WORDS, size=length)) for _ in range(count)]
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b)
+
+def test_signatures_estimate_jaccard():
+    hasher = MinHasher(num_perm=256, shingle_size=5)
+    base = random_texts(1, length=100)[0].split()
+    variants = [" ".join(base[:100 - cut] + ["other"] * cut) for cut in (0, 10, 30, 60)]
+    signatures = hasher.signatures([" ".join(base)] + variants)
+
+    shingles = [{text[i:i + 5] for i in range(len(text) - 4)} for text in [" ".join(base)] + variants]
+    for k in range(1, len(signatures)):
+        estimate = np.mean(signatures[0] == signatures[k])
+        assert abs(estimate - jaccard(shingles[0], shingles[k])) < 0.12
+
+def test_signatures_of_a_batch_match_single_texts():
+    hasher = MinHasher(num_perm=32, shingle_size=4)
+    texts = ["", "ab", "Hello, world!", "hello world"] + random_texts(5)
+    batch = hasher.signatures(texts)
+
+    for k, text in enumerate(texts):
+        assert (hasher.signatures([text])[0] == batch[k]).all()
+    # Case, punctuation and whitespace are normalized away
+    assert (batch[2] == batch[3]).all()
+
+def test_lsh_params_follow_threshold():
+    low, high = lsh_params(0.5, 128), lsh_params(0.9, 128)
+    assert low[0] * low[1] <= 128 and high[0] * high[1] <= 128
+    # A higher threshold needs more rows per band
+    assert high[1] > low[1]
+
+def test_index_clusters_near_duplicates():
+    texts = random_texts(200)
+    words = texts[3].split()
+    words[10] = "changed"
+    near = " ".join(words).upper() + "!!"
+    index = NearDuplicateIndex(threshold=0.8)
+
+    clusters = index.add(texts[:100])
+    clusters += index.add([near, texts[3]] + texts[100:])
+
+    assert clusters[:100] == list(range(100))
+    assert clusters[100:102] == [3, 3]
+    assert clusters[102:] == list(range(102, 202))
+    stats = index.stats()
+    assert stats["num_texts"] == 202
+    assert stats["num_duplicates"] == 2
+    assert stats["num_duplicate_clusters"] == 1
+    assert stats["largest_cluster"] == 3
+    assert stats["cluster_size_histogram"] == {3: 1}
+
+def test_deduplicate_modes():
+    texts = random_texts(50)
+    items = [{"id": k, "text": text} for k, text in enumerate(texts + [texts[0] + ".", texts[7].lower()])]
+
+    keep_one = list(deduplicate(iter(items), NearDuplicateIndex(), key=lambda item: item["text"], batch_size=8))
+    assert [item["id"] for item in keep_one] == list(range(50))
+
+    index = NearDuplicateIndex()
+    dropped = list(deduplicate(items, index, mode="drop", key=lambda item: item["text"], batch_size=8))
+    assert [item["id"] for item in dropped] == [k for k in range(50) if k not in (0, 7)]
+    assert index.stats()["texts_in_duplicate_clusters"] == 4
+
+    with pytest.raises(ValueError):
+        list(deduplicate(iter(items), NearDuplicateIndex(), mode="drop"))
+    with pytest.raises(ValueError):
+        list(deduplicate(items, NearDuplicateIndex(), mode="first"))
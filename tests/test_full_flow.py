@@ -1,6 +1,6 @@
 import asyncio
 from typing import List
-from src.generators import OpenRouterGenerator
+from src.generators import create_generator
 from src.optimizers.evol_optimizer import EvolOptimizer
 from src.analyzers.trajectory_analyzer import TrajectoryAnalyzer
 from src.evolvers.recurrent_evolver import RecurrentEvolver, INITIAL_EVOLVE_METHOD
@@ -41,10 +41,12 @@ async def process_instruction(instruction: str, components: dict) -> List[str]:
 async def process_dataset(dataset: List[str], dev_set: List[str]) -> List[List[str]]:
     print(f"Starting dataset processing. Dataset size: {len(dataset)}")
     
+    # One generator, and so one connection pool, for every component
+    generator = create_generator('openrouter', 'openai/gpt-4o')
     components = {
-        'generator': OpenRouterGenerator(model='openai/gpt-4o'),
-        'evolver': RecurrentEvolver(OpenRouterGenerator(model='openai/gpt-4o')),
-        'analyzer': TrajectoryAnalyzer(OpenRouterGenerator(model='openai/gpt-4o')),
+        'generator': generator,
+        'evolver': RecurrentEvolver(generator),
+        'analyzer': TrajectoryAnalyzer(generator),
         'detector': FailureDetectorEvaluator(),
         'dev_set': dev_set
     }
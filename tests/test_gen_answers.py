@@ -0,0 +1,69 @@
+import json
+import pytest
+
+pytest.importorskip("openai")
+
+from benchmarks.mock_server import MockChatServer
+from gen_answers import process_data
+from src.checkpoint import read_jsonl
+
+def write_dataset(path, instructions):
+    with open(path, "w") as file:
+        for instruction in instructions:
+            file.write(json.dumps({"conversations": [{"from": "human", "value": instruction}, {"from": "gpt", "value": ""}]}) + "\n")
+
+def answered(path):
+    return [record["conversations"][0]["value"] for record in read_jsonl(str(path))]
+
+@pytest.mark.asyncio
+async def test_answers_are_written_in_input_order(tmp_path, monkeypatch):
+    instructions = [f"Question {i}" for i in range(20)]
+    write_dataset(tmp_path / "data.jsonl", instructions)
+    output = tmp_path / "answers.jsonl"
+
+    # Random latencies finish the requests out of order
+    async with MockChatServer(latency="uniform:0.001,0.02", seed=3) as server:
+        monkeypatch.setenv("VLLM_BACKEND", server.base_url)
+        await process_data("mock", "vllm", str(tmp_path / "data.jsonl"), 8, str(output))
+
+    assert answered(output) == instructions
+    assert all(record["conversations"][1]["value"] for record in read_jsonl(str(output)))
+
+@pytest.mark.asyncio
+async def test_resume_retries_only_failed_and_missing_instructions(tmp_path, monkeypatch):
+    instructions = [f"Question {i}" for i in range(20)]
+    write_dataset(tmp_path / "data.jsonl", instructions)
+    output = tmp_path / "answers.jsonl"
+
+    async with MockChatServer(latency="uniform:0.001,0.01", error_rate=0.3, seed=5) as server:
+        monkeypatch.setenv("VLLM_BACKEND", server.base_url)
+        await process_data("mock", "vllm", str(tmp_path / "data.jsonl"), 8, str(output), max_retries=0)
+        first_run = answered(output)
+        # Failed requests are left out, and the rest keep the input order
+        assert server.errors > 0 and len(first_run) == 20 - server.errors
+        assert first_run == [instruction for instruction in instructions if instruction in first_run]
+
+        server.error_rate = 0.0
+        server.reset_stats()
+        await process_data("mock", "vllm", str(tmp_path / "data.jsonl"), 8, str(output), resume=True)
+
+        # Only the failed instructions are sent again, and appended after the earlier answers
+        assert server.requests == 20 - len(first_run)
+    resumed = answered(output)
+    assert resumed[:len(first_run)] == first_run
+    assert sorted(resumed) == sorted(instructions)
+
+@pytest.mark.asyncio
+async def test_adaptive_concurrency_with_a_small_connection_pool(tmp_path, monkeypatch):
+    instructions = [f"Question {i}" for i in range(10)]
+    write_dataset(tmp_path / "data.jsonl", instructions)
+    output = tmp_path / "answers.jsonl"
+
+    async with MockChatServer(latency="uniform:0.001,0.01", seed=7) as server:
+        monkeypatch.setenv("VLLM_BACKEND", server.base_url)
+        # The initial limit of 16 is clamped to the pool size
+        metrics = await process_data("mock", "vllm", str(tmp_path / "data.jsonl"), 8, str(output), max_connections=4, adaptive_concurrency=True)
+
+    assert answered(output) == instructions
+    assert metrics.snapshot()["gauges"]["concurrency_limit"] <= 4
+    assert server.peak_in_flight <= 4
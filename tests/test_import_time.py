@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["torch", "transformers", "datasets", "openai"]
+
+def import_in_subprocess(statement):
+    # -X importtime reports "self | cumulative | module" in microseconds for every import on stderr
+    code = f"{statement}\nimport sys\nprint(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, total, module = line.split("|")
+            if total.strip().isdigit():
+                cumulative[module.strip()] = int(total)
+    loaded = [m for m in result.stdout.strip().split(",") if m]
+    return loaded, cumulative
+
+def test_package_import_does_not_load_backends():
+    loaded, cumulative = import_in_subprocess(
+        "import src\n"
+        "from src.evaluator import FailureDetectorEvaluator\n"
+        "from src.optimizers import EvolOptimizer\n"
+        "from src.analyzers import TrajectoryAnalyzer\n"
+        "from src.evolvers import RecurrentEvolver"
+    )
+    assert loaded == []
+    # Generous bound; importing the backends eagerly costs several times this
+    assert cumulative["src"] < 500_000
+
+def test_entry_scripts_do_not_load_optional_backends():
+    loaded, _ = import_in_subprocess("import run_evol, gen_answers")
+
+    assert "torch" not in loaded
+    assert "transformers" not in loaded
+    assert "datasets" not in loaded
@@ -0,0 +1,58 @@
+import asyncio
+import json
+import pytest
+from types import SimpleNamespace
+from src.generators import BaseGenerator, InstrumentedGenerator
+from src.metrics import MetricsRegistry, record_failure, record_usage, role
+
+class UsageGenerator(BaseGenerator):
+    def generate(self, prompt, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        raise NotImplementedError
+
+    async def agenerate(self, prompt, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        await asyncio.sleep(0.01)
+        if prompt == "raise":
+            raise RuntimeError("backend down")
+        if prompt == "swallow":
+            record_failure()
+            return "error"
+        record_usage(SimpleNamespace(prompt_tokens=len(prompt.split()), completion_tokens=3))
+        return "ok"
+
+@pytest.mark.asyncio
+async def test_calls_are_attributed_to_roles(tmp_path):
+    metrics = MetricsRegistry()
+    generator = InstrumentedGenerator(UsageGenerator(), metrics)
+
+    with role("evolver"):
+        await asyncio.gather(*[generator.agenerate("two words") for _ in range(4)])
+        # Fan-out tasks inherit the role and all report into the same call
+        await generator.agenerate_n("two words", n=3)
+    with role("analyzer"):
+        await generator.agenerate("swallow")
+        with pytest.raises(RuntimeError):
+            await generator.agenerate("raise")
+    await generator.agenerate("one")
+
+    snapshot = metrics.snapshot()
+    evolver, analyzer = snapshot["roles"]["evolver"], snapshot["roles"]["analyzer"]
+    assert (evolver["requests"], evolver["samples"], evolver["errors"]) == (5, 7, 0)
+    assert (evolver["prompt_tokens"], evolver["completion_tokens"]) == (14, 21)
+    assert evolver["peak_in_flight"] == 4 and evolver["in_flight"] == 0
+    assert sum(evolver["latency_histogram"].values()) == 5
+    assert (analyzer["requests"], analyzer["errors"]) == (2, 2)
+    assert snapshot["roles"]["other"]["requests"] == 1
+    assert snapshot["requests"] == 8 and snapshot["peak_in_flight"] == 4
+    assert "evolver" in metrics.summary()
+
+    path = tmp_path / "metrics.json"
+    metrics.dump(str(path))
+    assert json.loads(path.read_text())["completion_tokens"] == 24
+
+def test_gauges_report_current_values():
+    metrics = MetricsRegistry()
+    limit = {"value": 16}
+    metrics.gauge("concurrency_limit", lambda: limit["value"])
+    assert metrics.snapshot()["gauges"] == {"concurrency_limit": 16}
+    limit["value"] = 11.2
+    assert "concurrency_limit=11.2" in metrics.summary()
@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip("openai")
+
+from benchmarks.mock_server import MockChatServer
+from src import AutoEvol
+from src.analyzers import TrajectoryAnalyzer
+from src.evaluator import FailureDetectorEvaluator
+from src.evolvers import RecurrentEvolver
+from src.generators import VLLMGenerator
+from src.optimizers.evol_optimizer import EvolOptimizer
+
+@pytest.mark.asyncio
+async def test_full_flow_against_mock_server():
+    async with MockChatServer(latency="uniform:0.001,0.005", seed=1) as server:
+        generator = VLLMGenerator(model="mock", base_url=server.base_url)
+        evaluator = FailureDetectorEvaluator()
+        auto_evol = AutoEvol({
+            'generator': generator,
+            'evolver': RecurrentEvolver(generator),
+            'analyzer': TrajectoryAnalyzer(generator),
+            'evaluator': evaluator,
+            'optimizer': EvolOptimizer(generator, evaluator),
+            'dev_set': ["Write a python function to perform bubble sort", "Describe the process of photosynthesis"],
+        })
+        dataset = ["Write a function to calculate the factorial of a number", "Explain the concept of recursion in programming", "Design a simple to-do list application"]
+
+        results = await auto_evol.run(dataset, batch_size=2, num_methods=3, max_concurrent_batches=1, evolve_epoch=2)
+
+    assert [result["original_instruction"] for result in results] == dataset
+    for instruction, result in zip(dataset, results):
+        assert len(result["stages"]) == 2
+        # The mock rewrites by appending to the instruction, so a parsed rewrite still starts with it
+        assert result["final_instruction"].startswith(instruction) and result["final_instruction"] != instruction
+    assert server.errors == 0
+    assert {"evolve", "analyze", "optimize", "answer"} <= set(server.requests_by_kind)
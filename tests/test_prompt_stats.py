@@ -0,0 +1,23 @@
+from src.prompt_stats import shared_prefix_stats
+from src.evolvers.recurrent_evolver import RecurrentEvolver
+
+def test_identical_prefix_is_counted_once():
+    shared = "word " * 64
+    stats = shared_prefix_stats([("system", shared + "first"), ("system", shared + "second")], block_size=4)
+
+    assert stats["num_prompts"] == 2
+    assert stats["cached_tokens"] > 0
+    assert 0.4 < stats["shared_prefix_fraction"] < 0.5
+
+def test_methods_rendered_for_different_instructions_share_a_prefix():
+    steps = [
+        {"step_name": "Methods List", "step_instruction": "List ways to make the instruction more complex."},
+        {"step_name": "Plan", "step_instruction": "Pick several methods from the list."},
+        {"step_name": "Finally Rewritten Instruction", "step_instruction": "Write the final instruction."},
+    ]
+    evolver = RecurrentEvolver(generator=None)
+    prompts = [("You are a helpful AI assistant.", evolver.build_new_method(steps, instruction)) for instruction in ["Write a poem.", "Sort a list in Python."]]
+
+    stats = shared_prefix_stats(prompts, block_size=1)
+
+    assert stats["cached_tokens"] / (stats["total_tokens"] / 2) > 0.9
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from src.autoevol import AutoEvol
+from src.evolvers import RecurrentEvolver
+from src.generators.base_generator import BaseGenerator
+from src.records import MethodTable, expand_record, final_step_instruction, methods_path
+
+OPTIMIZED_STEPS = "Step 1:\n#Methods List#\nList ways to add constraints\n\nStep 2:\n#Finally Rewritten Instruction#\nWrite the rewrite"
+
+class RewritingGenerator(BaseGenerator):
+    # Deterministic evolver and final rewrite: appends " (harder)" to the instruction at the end of the prompt
+    def generate(self, prompt, system_prompt=None, temperature=None):
+        instruction = prompt.rsplit("#Instruction#:", 1)[-1].strip()
+        return f"```Optimized Instruction\nStep 1:\n#Methods List#\nadd a constraint\nStep 2:\n#Finally Rewritten Instruction#\n{instruction} (harder)\n```"
+
+    async def agenerate(self, prompt, system_prompt=None, temperature=None):
+        return self.generate(prompt)
+
+class PassingAnalyzer:
+    async def analyze_async(self, instruction, evolved_instructions):
+        return ["### PASSED"] * len(evolved_instructions)
+
+class FixedOptimizer:
+    async def optimize(self, method, feedback, evolver, development_set):
+        return f"```Optimized Method\n{OPTIMIZED_STEPS}\n```", []
+
+def auto_evol(verbosity):
+    generator = RewritingGenerator()
+    return AutoEvol({
+        'generator': generator,
+        'evolver': RecurrentEvolver(generator),
+        'analyzer': PassingAnalyzer(),
+        'optimizer': FixedOptimizer(),
+        'dev_set': [],
+    }, verbosity=verbosity)
+
+def without_times(record):
+    record = {name: value for name, value in record.items() if name != "total_time"}
+    record["stages"] = [{name: value for name, value in stage.items() if name != "stage_time"} for stage in record["stages"]]
+    return record
+
+@pytest.mark.asyncio
+async def test_compact_records_expand_to_full_records():
+    dataset = ["Explain gravity", "Sort a list"]
+    full = await auto_evol("full").run(dataset, num_methods=3, evolve_epoch=3)
+    compact_evol = auto_evol("compact")
+    compact = await compact_evol.run(dataset, num_methods=3, evolve_epoch=3)
+    minimal_evol = auto_evol("minimal")
+    minimal = await minimal_evol.run(dataset, num_methods=3, evolve_epoch=3)
+
+    # The initial template and the one optimized method are shared by every stage of every instruction
+    assert len(compact_evol.methods) == 2
+    assert compact[0]["stages"][1]["method"] == compact[0]["stages"][0]["optimized_method"] == compact[1]["stages"][2]["method"]
+    for full_record, compact_record, minimal_record in zip(full, compact, minimal):
+        assert compact_record["final_instruction"] == minimal_record["final_instruction"] == full_record["final_instruction"]
+        assert "evolved_instructions" not in minimal_record["stages"][0]
+        assert len(json.dumps(minimal_record)) < len(json.dumps(compact_record)) < len(json.dumps(full_record)) / 4
+
+        expected = without_times(full_record)
+        for stage in expected["stages"]:
+            stage["evolved_instructions"] = [final_step_instruction(response) for response in stage["evolved_instructions"]]
+        assert without_times(expand_record(compact_record, compact_evol.methods)) == expected
+
+def test_method_table_writes_each_method_once(tmp_path):
+    table = MethodTable(retain=False)
+    first = table.add({"template": "Rewrite {{instruction}}"})
+    table.add({"steps": [{"step_name": "Plan", "step_instruction": "Make a plan"}]})
+    assert table.add({"template": "Rewrite {{instruction}}"}) == first
+    written = table.pending()
+
+    assert [record["method_id"] for record in written] == [first, written[1]["method_id"]]
+    assert table.methods == {}
+    table.add({"template": "Rewrite {{instruction}}"})
+    assert table.pending() == []
+
+    path = methods_path(str(tmp_path / "evolved.jsonl"))
+    assert path == str(tmp_path / "evolved.methods.jsonl")
+    with open(path, "w") as f:
+        f.writelines(json.dumps(record) + "\n" for record in written)
+    reloaded = MethodTable.from_file(path)
+    assert reloaded.get(first) == {"template": "Rewrite {{instruction}}"}
+    assert len(reloaded) == 2 and reloaded.pending() == []
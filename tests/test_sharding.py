@@ -0,0 +1,35 @@
+from src.sharding import find_shard_paths, merge_records, shard_instructions, shard_of, shard_path
+
+def test_shards_partition_instructions():
+    instructions = [f"instruction {i}" for i in range(200)]
+    shards = [list(shard_instructions(instructions, 4, index)) for index in range(4)]
+
+    assert sorted(sum(shards, [])) == sorted(instructions)
+    assert all(shards)
+    # Independent of order: the shard only depends on the instruction text
+    assert list(shard_instructions(reversed(instructions), 4, 1)) == shards[1][::-1]
+
+def test_shard_paths_are_found(tmp_path):
+    output_file = str(tmp_path / "results.jsonl")
+    for index in (0, 2):
+        open(shard_path(output_file, 3, index), "w").close()
+
+    assert shard_path(output_file, 1, 0) == output_file
+    assert find_shard_paths(output_file) == {3: {0: shard_path(output_file, 3, 0), 2: shard_path(output_file, 3, 2)}}
+
+def test_merge_reports_problems():
+    instructions = [f"instruction {i}" for i in range(20)]
+    records_by_shard = {index: [{"original_instruction": instruction} for instruction in shard_instructions(instructions, 2, index)]
+                        for index in range(2)}
+    records_by_shard[0].append(records_by_shard[1][0])
+    dropped = records_by_shard[1].pop()["original_instruction"]
+
+    report = merge_records(records_by_shard, 2, expected=instructions + ["never run"])
+
+    assert len(report["records"]) == 19
+    assert report["missing_shards"] == []
+    assert report["duplicates"] == [records_by_shard[1][0]["original_instruction"]]
+    assert report["misplaced"] == [records_by_shard[1][0]["original_instruction"]]
+    assert report["missing"] == sorted([dropped, "never run"])
+    assert report["unexpected"] == []
+    assert merge_records({0: []}, 2)["missing_shards"] == [1]
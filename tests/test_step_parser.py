@@ -0,0 +1,71 @@
+import random
+
+from src.step_parser import StepParser
+from src.utils import parse_steps, parse_steps_regex
+
+METHOD = """```Optimized Instruction
+Step 1:
+#Methods List#
+Add constraints.
+
+Step 2:
+#Plan#
+Use the methods.
+
+Step 3:
+#Finally Rewritten Instruction#
+Explain gravity to a child using {example}.
+```"""
+
+# Pieces that exercise the corner cases of parse_steps: markers split by chunks, names spanning
+# markers, empty names, runs of backticks of every length and Unicode digits
+PIECES = ["Step ", "Step 1:", "Step 12:", "Step", "St", "1", "23", ":", "#", "##", "#Plan#", "#Finally Rewritten Instruction#",
+          "`", "```", "````", "\n", " ", "abc", "\t", "```python\n", "\n```\n", "٣"]
+
+def feed_in_chunks(parser, text, rng):
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 6)
+        parser.feed(text[position:position + size])
+        position += size
+
+def test_matches_regex_parser_on_random_text():
+    rng = random.Random(0)
+    for _ in range(3000):
+        text = "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 60)))
+        expected = parse_steps_regex(text)
+        assert parse_steps(text) == expected, text
+        parser = StepParser()
+        feed_in_chunks(parser, text, rng)
+        assert parser.steps() == expected, text
+        if parser.complete:
+            # Cutting at `end` keeps a complete final step
+            assert parse_steps_regex(text[:parser.end])[-1]["step_name"] == "Finally Rewritten Instruction", text
+
+def test_signals_when_final_step_is_complete():
+    text = METHOD.format(example="a ball") + "\n\nThis rewrite adds an example."
+    parser = StepParser()
+    completed_at = None
+    for position, char in enumerate(text):
+        if parser.feed(char) and completed_at is None:
+            completed_at = position
+    # The fence's line has to end before it is known to close the block
+    assert completed_at == text.index("```\n\n") + 3
+    assert parser.end == text.index("```\n\n") + 3
+    assert parse_steps(text[:parser.end]) == parse_steps(text)
+
+def test_code_blocks_inside_final_step_do_not_complete_it():
+    text = METHOD.format(example="this code:\n```python\nprint(1)\n```\nand a diagram") + "\nCommentary"
+    parser = StepParser()
+    rng = random.Random(1)
+    feed_in_chunks(parser, text, rng)
+
+    assert parser.complete
+    assert text[:parser.end].endswith("and a diagram.\n```")
+    assert "print(1)" in parse_steps(text[:parser.end])[-1]["step_instruction"]
+
+def test_unfinished_method_is_not_complete():
+    parser = StepParser()
+    parser.feed("```Optimized Method\nStep 1:\n#Plan#\nfoo\n```\n")
+    assert not parser.complete
+    assert parser.steps() == [{"step_number": 1, "step_name": "Plan", "step_instruction": "foo"}]
@@ -0,0 +1,48 @@
+import asyncio
+import json
+import pytest
+from src.generators import BaseGenerator, TracedGenerator
+from src.tracing import Tracer, span
+
+class EchoGenerator(BaseGenerator):
+    def generate(self, prompt, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        return prompt
+
+    async def agenerate(self, prompt, system_prompt="You are a helpful AI assistant.", temperature=0.5):
+        await asyncio.sleep(0.01)
+        return prompt
+
+async def traced_instruction(tracer, generator, instruction):
+    with tracer.trace("instruction", instruction=instruction):
+        with span("evolve"):
+            await asyncio.gather(*[generator.agenerate(instruction) for _ in range(3)])
+        with span("final_rewrite"):
+            await generator.agenerate(instruction)
+
+@pytest.mark.asyncio
+async def test_concurrent_traces_export_nested_spans(tmp_path):
+    tracer = Tracer()
+    generator = TracedGenerator(EchoGenerator())
+
+    await asyncio.gather(*[traced_instruction(tracer, generator, f"instruction {i}") for i in range(2)])
+    path = tmp_path / "trace.json"
+    tracer.export(str(path))
+
+    events = json.loads(path.read_text())["traceEvents"]
+    spans = [event for event in events if event["ph"] in "be"]
+    assert len(spans) == 2 * 2 * (1 + 2 + 4)
+    for trace_id in {event["id"] for event in spans}:
+        track = [event for event in spans if event["id"] == trace_id]
+        assert [event["name"] for event in track if event["ph"] == "b"][:2] == ["instruction", "evolve"]
+        assert track[-1]["name"] == "instruction" and track[-1]["ph"] == "e"
+        # Every span ends inside its trace's root span
+        assert all(track[0]["ts"] <= event["ts"] <= track[-1]["ts"] for event in track)
+
+@pytest.mark.asyncio
+async def test_unsampled_traces_record_nothing():
+    tracer = Tracer(sample_rate=0.0)
+    await traced_instruction(tracer, TracedGenerator(EchoGenerator()), "instruction")
+    with span("outside any trace"):
+        pass
+
+    assert tracer.spans == [] and tracer.traces_sampled == 0